@@ -0,0 +1,91 @@
+"""
+    Benchmark of the aggregation of reviews into reviews opened/closed per day and
+    active developers per month.
+
+    It compares the original per-change loop of filter_data (timestamps parsed with
+    datetime), ReviewAggregator (pure Python) and ColumnarAggregator (NumPy) on
+    synthetic reviews, counting the developers exactly and with HyperLogLog sketches
+    of 1% error. Run it from the root of the repository:
+
+        python benchmarks/bench_aggregation.py 1000000
+"""
+import argparse
+from datetime import datetime
+from common import timed
+from gda.aggregate import ColumnarAggregator, ReviewAggregator, np
+from stub_gerrit import make_changes
+
+
+def legacy_filter(reviews_lst):
+    """
+    Summary: The per-change loop filter_data used before the aggregators, kept here as
+                the reference of the benchmark.
+    """
+    reviews_opened = {}
+    reviews_closed = {}
+    active_developers = {}
+    for change in reviews_lst:
+        timestamp_str = change['updated'][:10]
+        if timestamp_str not in reviews_opened:
+            reviews_opened[timestamp_str] = 0
+        if timestamp_str not in reviews_closed:
+            reviews_closed[timestamp_str] = 0
+        if change.get('status') == 'NEW':
+            reviews_opened[timestamp_str] += 1
+        elif change.get('status') in ['MERGED', 'ABANDONED']:
+            reviews_closed[timestamp_str] += 1
+        timestamp_str = change['updated'][:19]
+        timestamp = int(datetime.fromisoformat(timestamp_str).timestamp())
+        year_month = datetime.fromtimestamp(timestamp).strftime('%Y-%m')
+        for key in ('owner', 'submitter'):
+            if key in change and change[key].get('_account_id') is not None:
+                active_developers.setdefault(year_month, set()).add(change[key]['_account_id'])
+    developers_per_month = {month: len(devs) for month, devs in active_developers.items()}
+    return [reviews_opened, reviews_closed, developers_per_month]
+
+
+def run_aggregator(aggregator_class, changes, page_size=500, developer_error=None):
+    """
+    Summary: This function feeds the reviews to an aggregator page by page, the same
+                way CodeReviewData.analyze() does.
+    Returns:
+        (returned_data, result_time) (tuple): The data of result() and the time spent in it.
+    """
+    aggregator = aggregator_class(developer_error)
+    for start in range(0, len(changes), page_size):
+        aggregator.add(changes[start:start + page_size])
+    return timed(aggregator.result)
+
+
+def main(number):
+    changes = make_changes(number, days=365, accounts=5000)
+    expected, legacy_time = timed(legacy_filter, changes)
+    print(f"{number} changes")
+    print(f"  legacy filter_data loop : {legacy_time:8.3f} s  "
+          f"({number / legacy_time:12,.0f} changes/s)")
+    candidates = [("ReviewAggregator", ReviewAggregator)]
+    if np is not None:
+        candidates.append(("ColumnarAggregator", ColumnarAggregator))
+    for name, aggregator_class in candidates:
+        (result, result_time), elapsed = timed(run_aggregator, aggregator_class, changes)
+        # Same counts as the reference; the aggregators order the keys newest first.
+        assert [dict(sorted(data.items())) for data in result] == \
+               [dict(sorted(data.items())) for data in expected]
+        print(f"  {name:<24}: {elapsed:8.3f} s  ({number / elapsed:12,.0f} changes/s, "
+              f"x{legacy_time / elapsed:.1f}, result() {result_time:.3f} s)")
+
+    # The developers counted with HyperLogLog, the largest error of all the months.
+    for name, aggregator_class in candidates:
+        (result, result_time), elapsed = timed(run_aggregator, aggregator_class, changes,
+                                               500, 0.01)
+        assert result[:2] == [dict(sorted(data.items(), reverse=True)) for data in expected[:2]]
+        error = max(abs(result[2][month] - count) / count for month, count in expected[2].items())
+        print(f"  {name + ' (1%)':<24}: {elapsed:8.3f} s  ({number / elapsed:12,.0f} changes/s, "
+              f"x{legacy_time / elapsed:.1f}, largest error {error:.2%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("number", type=int, nargs="?", default=1000000,
+                        help="number of synthetic reviews (default: %(default)s)")
+    main(parser.parse_args().number)
@@ -0,0 +1,137 @@
+"""
+    Benchmark of the decoding of Gerrit REST API pages.
+
+    It compares the original decoding (body decoded to a str, prefix sliced off, json.loads)
+    with the PageDecoder backends installed, with all the fields and with only the
+    fields the graphs use (which makes the store and the cache smaller, not the decoding
+    faster). By default it decodes synthetic pages that look like the default ChangeInfo
+    answers of Gerrit; pass a directory of recorded answers (raw bodies, one page per
+    *.json file) to use them instead:
+
+        python benchmarks/bench_decode.py
+        python benchmarks/bench_decode.py benchmarks/fixtures/pages
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import random
+from common import timed
+from gda.decoding import AGGREGATION_FIELDS, BACKENDS, PageDecoder
+
+
+def make_page(number, offset=0, seed=0):
+    """
+    Summary: This function creates the body of a synthetic Gerrit answer with the
+                fields Gerrit returns by default for every review.
+    Args:
+        number (int): The number of reviews in the page.
+        offset (int, optional): Defaults to 0. The number of the first review.
+        seed (int, optional): Defaults to 0. The seed of the random generator.
+    Returns:
+        body (bytes)
+    """
+    rng = random.Random(seed)
+    changes = []
+    for number_ in range(offset, offset + number):
+        status = rng.choice(["NEW", "MERGED", "ABANDONED"])
+        change = {
+            "id": f"openstack%2Fnova~master~I{number_:040x}",
+            "triplet_id": f"openstack%2Fnova~master~I{number_:040x}",
+            "project": "openstack/nova",
+            "branch": "master",
+            "topic": f"bug/{rng.randrange(10 ** 6)}",
+            "hashtags": [],
+            "change_id": f"I{number_:040x}",
+            "subject": "Fix the handling of " + " ".join(rng.choice(["volume", "instance", "port",
+                                                                      "quota", "flavor", "image"])
+                                                           for _ in range(6)),
+            "status": status,
+            "created": "2022-03-01 10:11:12.000000000",
+            "updated": "2022-03-02 13:14:15.000000000",
+            "submit_type": "MERGE_IF_NECESSARY",
+            "insertions": rng.randrange(1000),
+            "deletions": rng.randrange(1000),
+            "total_comment_count": rng.randrange(50),
+            "unresolved_comment_count": rng.randrange(5),
+            "has_review_started": True,
+            "meta_rev_id": f"{rng.getrandbits(160):040x}",
+            "_number": number_,
+            "owner": {"_account_id": rng.randrange(1000000, 1010000)},
+            "requirements": [],
+            "submit_records": [{"status": "NOT_READY",
+                                "labels": [{"label": "Verified", "status": "NEED"},
+                                           {"label": "Code-Review", "status": "NEED"},
+                                           {"label": "Workflow", "status": "NEED"}]}],
+        }
+        if status == "MERGED":
+            change["submitted"] = "2022-03-02 13:14:15.000000000"
+            change["submitter"] = {"_account_id": rng.randrange(1000000, 1000500)}
+        changes.append(change)
+    return (")]}'\n" + json.dumps(changes)).encode("utf-8")
+
+
+def legacy_decode(body):
+    return json.loads(body.decode('utf-8')[4:])
+
+
+def measure(decode, pages, repeat=5):
+    """
+    Summary: This function decodes every page, one at a time like the crawler does.
+                The garbage collector is disabled while timing, so the decoded pages
+                do not slow down the next backend.
+    Returns:
+        best (float): The fastest of the runs, in seconds.
+    """
+    def decode_pages():
+        for page in pages:
+            decode(page)
+
+    gc.disable()
+    try:
+        return timed(decode_pages, repeat=repeat)[1]
+    finally:
+        gc.enable()
+
+
+def main(pages):
+    total_bytes = sum(len(page) for page in pages)
+    expected = [legacy_decode(page) for page in pages]
+    changes = sum(len(page) for page in expected)
+    print(f"{len(pages)} pages, {changes} changes, {total_bytes / 1e6:.1f} MB")
+
+    candidates = [("legacy str decode + json.loads", legacy_decode)]
+    for backend in BACKENDS:
+        for fields, label in ((None, "all fields"), (AGGREGATION_FIELDS, "graph fields")):
+            try:
+                decoder = PageDecoder(backend, fields)
+            except ValueError:
+                continue
+            candidates.append((f"PageDecoder {backend}, {label}", decoder.decode))
+
+    legacy_time = None
+    for name, decode in candidates:
+        assert [len(decode(page)) for page in pages] == [len(page) for page in expected]
+        elapsed = measure(decode, pages)
+        legacy_time = legacy_time or elapsed
+        print(f"  {name:<40}: {elapsed:7.3f} s  ({total_bytes / elapsed / 1e6:7.1f} MB/s, "
+              f"x{legacy_time / elapsed:.1f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("pages", nargs="?",
+                        help="directory of recorded answers, one page per *.json file "
+                             "(default: synthetic pages)")
+    args = parser.parse_args()
+    if args.pages:
+        recorded = []
+        for path in sorted(glob.glob(os.path.join(args.pages, "*.json"))):
+            with open(path, "rb") as infile:
+                recorded.append(infile.read())
+        if not recorded:
+            parser.error(f"no *.json file in {args.pages}")
+        main(recorded)
+    else:
+        main([make_page(500, offset=500 * page, seed=page) for page in range(40)])
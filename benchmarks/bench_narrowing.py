@@ -0,0 +1,82 @@
+"""
+    Benchmark of the bytes transferred by an analysis against the local stub Gerrit
+    server (stub_gerrit.py), when the queries are narrowed to the graphs asked for
+    (status:open, status:closed), with the SKIP_DIFFSTAT option, and with one query
+    per project. The graphs asked for are checked to be the same as with the full
+    crawl:
+
+        python benchmarks/bench_narrowing.py
+        python benchmarks/bench_narrowing.py --reviews 200000 --fixture benchmarks/fixtures/OpenStack.ndjson.gz
+"""
+import argparse
+from common import period, timed
+from gda.crawler import GRAPHS, CodeReviewData
+from gda.http import GerritClient
+from gda.latency import LATENCY_GRAPHS
+from stub_gerrit import StubGerrit, load_fixture, make_changes, resize_changes
+
+# (name, graphs, options, split by project)
+CASES = [("every review", GRAPHS, (), False),
+         ("SKIP_DIFFSTAT", GRAPHS, ("SKIP_DIFFSTAT",), False),
+         ("closed: status:closed", ("closed",), ("SKIP_DIFFSTAT",), False),
+         ("opened: status:open", ("opened",), ("SKIP_DIFFSTAT",), False),
+         ("latency: status:closed", ("merge_time", "turnaround", "throughput"),
+          ("SKIP_DIFFSTAT",), False),
+         ("one query per project", GRAPHS, ("SKIP_DIFFSTAT",), True)]
+
+
+def same_graphs(result, reference, graphs):
+    """
+    Summary: This function compares the graphs asked for of two results. The days
+                without reviews of a narrowed crawl are missing instead of 0.
+    """
+    for index, graph in enumerate(GRAPHS[:3]):
+        if graph in graphs:
+            counts = {key: value for key, value in result[index].items() if value}
+            expected = {key: value for key, value in reference[index].items() if value}
+            if counts != expected:
+                return False
+    # The latency metrics, e.g. "merge_time" in result[3]["time_to_merge"].
+    for graph, key in zip(LATENCY_GRAPHS, ("time_to_merge", "turnaround", "backlog", "throughput")):
+        if graph in graphs and result[3][key] != reference[3][key]:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--reviews", type=int, default=50000)
+    parser.add_argument("--fixture", help="reviews recorded by record_fixture.py")
+    parser.add_argument("--page-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.fixture:
+        changes = resize_changes(load_fixture(args.fixture), args.reviews)
+    else:
+        changes = make_changes(args.reviews, days=180)
+    projects = sorted({change["project"] for change in changes})
+    start_date, end_date = period(changes)
+    print(f"{len(changes)} reviews from {start_date} to {end_date}, {len(projects)} projects")
+    print(f"{'':<24} {'requests':>8} {'received':>10} {'decoded':>10} {'bytes/review':>13} "
+          f"{'time':>7}")
+
+    reference = None
+    with StubGerrit(changes, page_size=args.page_size) as server:
+        for name, graphs, options, split in CASES:
+            platform = server.platform()
+            platform.options = options
+            platform.projects = tuple(projects) if split else ()
+            client = GerritClient(requests_per_second=0)
+            reviews = CodeReviewData(client=client, platforms={"Stub": platform}, graphs=graphs)
+            result, seconds = timed(reviews.analyze, start_date, end_date, "Stub")
+            stats = client.stats.summary()
+            if reference is None:
+                reference = result
+            status = "" if same_graphs(result, reference, graphs) else "  DIFFERENT RESULT"
+            print(f"{name:<24} {stats['requests']:>8} {stats['wire_bytes'] / 1e6:>7.2f} MB "
+                  f"{stats['body_bytes'] / 1e6:>7.2f} MB {stats['wire_bytes'] / len(changes):>13.1f} "
+                  f"{seconds:>5.2f} s{status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+    Benchmark of the drawing of the graphs (gda.charts) against the number of days
+    plotted. For every size, the four graphs are created and drawn with the Agg
+    backend, then panned over a tenth of the time period (the level of detail of
+    every frame is computed again), then exported as PDF files one after the other
+    and by a pool of processes. The old way of plotting the days, as categorical
+    "YYYY-MM-DD" strings with the style applied before every graph, is measured too
+    for the smaller sizes:
+
+        python benchmarks/bench_render.py
+        python benchmarks/bench_render.py --days 365 3650 36500 --categorical-max 3650
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+import numpy as np
+from matplotlib import style
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from common import timed
+from gda.charts import create_figures, export_charts
+
+
+def make_data(days, seed=0):
+    """
+    Summary: This function creates the data of an analysis of the given number of days,
+                newest first like the data returned by CodeReviewData.analyze().
+    """
+    rng = np.random.default_rng(seed)
+    first = date(2000, 1, 1)
+    keys = [(first + timedelta(days=day)).isoformat() for day in range(days)][::-1]
+    rev_opened = dict(zip(keys, rng.poisson(40, days).tolist()))
+    rev_closed = dict(zip(keys, rng.poisson(35, days).tolist()))
+    months = sorted({key[:7] for key in keys}, reverse=True)[:12]
+    dev_per_month = dict(zip(months, rng.integers(50, 500, len(months)).tolist()))
+    return rev_opened, rev_closed, dev_per_month
+
+
+def draw_categorical(rev_opened, rev_closed):
+    """
+    Summary: This function draws the three plots the way they were drawn before: the
+                days as categorical strings, every label shown and rotated.
+    """
+    days = list(rev_opened)[::-1]
+    opened = list(rev_opened.values())[::-1]
+    closed = list(rev_closed.values())[::-1]
+    for series in ([opened, closed], [opened], [closed]):
+        style.use('classic')
+        fig = Figure(figsize=(12, 6), dpi=100)
+        ax = fig.add_subplot(111)
+        for values in series:
+            ax.plot(days, values)
+        ax.tick_params(axis='x', labelrotation=90)
+        FigureCanvasAgg(fig).draw()
+
+
+def draw(rev_opened, rev_closed, dev_per_month):
+    for fig in create_figures(rev_opened, rev_closed, dev_per_month):
+        FigureCanvasAgg(fig).draw()
+
+
+def pan(fig, frames=20):
+    """
+    Summary: This function pans a graph over a tenth of its dates, one frame at a time,
+                and returns the seconds per frame.
+    """
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.axes[0]
+    low, high = ax.get_xlim()
+    width = (high - low) / 10
+    start = time.perf_counter()
+    for frame in range(frames):
+        ax.set_xlim(low + frame * width / frames, low + frame * width / frames + width)
+        canvas.draw()
+    return (time.perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[90, 365, 1825, 3650, 36500, 365000])
+    parser.add_argument("--categorical-max", type=int, default=3650,
+                        help="largest number of days drawn as categorical strings")
+    parser.add_argument("--processes", type=int, default=4,
+                        help="processes of the parallel export (default: %(default)s)")
+    args = parser.parse_args()
+
+    print(f"{'days':>8} {'categorical':>12} {'date axis':>10} {'pan frame':>10} {'export PDF':>11} "
+          f"{'parallel':>9}   ({os.cpu_count()} CPUs, {args.processes} processes)")
+    with ProcessPoolExecutor(max_workers=args.processes) as executor, \
+            tempfile.TemporaryDirectory() as directory:
+        # The processes import matplotlib before the first measure.
+        export_charts(*make_data(30), directory=directory, executor=executor)
+        for days in args.days:
+            data = make_data(days)
+            categorical = "-"
+            if days <= args.categorical_max:
+                categorical = f"{timed(draw_categorical, *data[:2])[1]:.3f} s"
+            _, drawn = timed(draw, *data, repeat=3)
+            frame = pan(create_figures(*data)[0])
+            _, exported = timed(lambda: export_charts(*data, directory=directory), repeat=3)
+            _, parallel = timed(lambda: export_charts(*data, directory=directory, executor=executor),
+                                repeat=3)
+            print(f"{days:>8} {categorical:>12} {drawn:>8.3f} s {frame * 1000:>7.1f} ms "
+                  f"{exported:>9.3f} s {parallel:>7.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+    Benchmark of the rollup tables of the cache (gda.cache). Synthetic reviews are
+    stored in a temporary cache page by page, the same way the crawler stores them,
+    then the filtered data of the whole time period is computed twice: by reading and
+    filtering every cached review, and by reading the rollup tables. The results are
+    checked to be the same. Finally some reviews are stored again in a newer version,
+    as a refresh of the cache does, and the rollups are checked again.
+
+        python benchmarks/bench_rollups.py 1000000
+"""
+import argparse
+import copy
+import os
+import random
+import tempfile
+from common import timed
+from gda.aggregate import make_aggregator
+from gda.cache import ChangeCache
+from stub_gerrit import make_changes
+
+
+def recompute(cache, start_date, end_date):
+    aggregator = make_aggregator()
+    for page in cache.iter_load("Bench", start_date, end_date):
+        aggregator.add(page)
+    return aggregator.result()
+
+
+def main(number):
+    days = 3 * 365
+    changes = make_changes(number, days=days, accounts=5000)
+    start_date, end_date = "2022-01-01", "2025-01-01"
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ChangeCache(os.path.join(directory, "cache.db"))
+        _, seconds = timed(lambda: [cache.store("Bench", changes[index:index + 500])
+                                    for index in range(0, number, 500)])
+        print(f"{number} reviews over {days} days, stored in {seconds:.1f} s "
+              f"({number / seconds:,.0f} reviews/s with the rollups)")
+
+        expected, recompute_time = timed(recompute, cache, start_date, end_date)
+        result, rollup_time = timed(cache.rollup, "Bench", start_date, end_date)
+        assert result == expected
+        print(f"  filter the cached reviews : {recompute_time * 1000:10.1f} ms")
+        print(f"  read the rollups          : {rollup_time * 1000:10.1f} ms  "
+              f"(x{recompute_time / rollup_time:,.0f})")
+
+        # A refresh: 5% of the reviews are merged or abandoned a few days later.
+        rng = random.Random(1)
+        updated = []
+        for change in rng.sample(changes, number // 20):
+            change = copy.deepcopy(change)
+            change["status"] = rng.choice(["MERGED", "ABANDONED"])
+            day = int(change["updated"][8:10])
+            change["updated"] = change["updated"][:8] + f"{min(28, day + 3):02d}" + change["updated"][10:]
+            updated.append(change)
+        _, seconds = timed(lambda: [cache.store("Bench", updated[index:index + 500])
+                                    for index in range(0, len(updated), 500)])
+        print(f"  store {len(updated)} newer versions : {seconds:.1f} s")
+        assert cache.rollup("Bench", start_date, end_date) == recompute(cache, start_date, end_date)
+        print("  rollups still equal to the filtered reviews")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("number", type=int, nargs="?", default=200000,
+                        help="number of synthetic reviews (default: %(default)s)")
+    main(parser.parse_args().number)
@@ -0,0 +1,73 @@
+"""
+    Benchmark of the sharded analysis (gda.sharding) against the local stub Gerrit
+    server (stub_gerrit.py). The same time period is analyzed by one process with
+    CodeReviewData.analyze() and by 1, 2, 4, ... processes with analyze_sharded(),
+    and the results are checked to be the same.
+
+    By default one year of synthetic reviews is served. Reviews recorded by the
+    application (the review store, see gda.storage) can be replayed instead:
+
+        python benchmarks/bench_sharding.py
+        python benchmarks/bench_sharding.py --reviews 500000 --latency 0.02
+        python benchmarks/bench_sharding.py --store Storage/reviews --platform Android
+
+    Every configuration is run twice and the faster run is reported; the first run
+    also lets the stub server compute its answers.
+"""
+import argparse
+import os
+from common import period, timed
+from gda.crawler import CodeReviewData
+from gda.http import GerritClient
+from gda.sharding import analyze_sharded
+from gda.storage import ReviewStore
+from stub_gerrit import StubGerrit, make_changes, sort_changes
+
+
+def load_changes(args):
+    """
+    Summary: This function returns the reviews served by the stub server, newest first.
+    """
+    if args.store:
+        return sort_changes([change for page in ReviewStore(args.store).iter_pages(args.platform)
+                             for change in page])
+    return make_changes(args.reviews, days=365, accounts=2000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--reviews", type=int, default=200000,
+                        help="number of synthetic reviews (default: %(default)s)")
+    parser.add_argument("--store", help="replay the reviews of this review store instead")
+    parser.add_argument("--platform", default="Android", help="platform of the review store")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the stub server waits before every answer")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    changes = load_changes(args)
+    if not changes:
+        parser.error("no reviews to serve")
+    start_date, end_date = period(changes)
+    print(f"{len(changes)} reviews from {start_date} to {end_date}, {os.cpu_count()} CPUs")
+
+    with StubGerrit(changes, page_size=args.page_size, latency=args.latency) as server:
+        reviews = CodeReviewData(client=GerritClient(requests_per_second=0),
+                                 platforms={"Stub": server.platform()})
+        reference, seconds = timed(reviews.analyze, start_date, end_date, "Stub", repeat=2)
+        print(f"{'analyze()':<24} {seconds:>7.2f} s {len(changes) / seconds:>10,.0f} reviews/s")
+        baseline = seconds
+
+        processes = 1
+        while processes <= args.max_processes:
+            result, seconds = timed(analyze_sharded, reviews, start_date, end_date, "Stub",
+                                    processes, repeat=2)
+            status = "same result" if result == reference else "DIFFERENT RESULT"
+            print(f"{f'analyze_sharded({processes})':<24} {seconds:>7.2f} s "
+                  f"{len(changes) / seconds:>10,.0f} reviews/s  x{baseline / seconds:.2f}  {status}")
+            processes *= 2
+
+
+if __name__ == "__main__":
+    main()
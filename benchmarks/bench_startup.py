@@ -0,0 +1,40 @@
+"""
+    Benchmark of the startup time of the headless command line interface compared to
+    the Tkinter application. Every import is timed in a fresh interpreter. Run it from
+    the root of the repository:
+
+        python benchmarks/bench_startup.py
+        python benchmarks/bench_startup.py 10
+"""
+import argparse
+import subprocess
+import sys
+from common import ROOT, timed
+
+# (name, code run in a fresh interpreter)
+CASES = [("python (no imports)", "pass"),
+         ("headless: import gda.cli", "import gda.cli, sys; assert 'tkinter' not in sys.modules "
+                                      "and 'matplotlib' not in sys.modules"),
+         ("GUI: import main", "import main")]
+
+
+def measure(code, repeat):
+    """
+    Summary: This function runs the code in a fresh interpreter several times.
+    Returns:
+        best (float): The fastest run in seconds.
+    """
+    return timed(lambda: subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True),
+                 repeat=repeat)[1]
+
+
+def main(repeat):
+    for name, code in CASES:
+        print(f"{name:<26}: {measure(code, repeat) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("repeat", type=int, nargs="?", default=5,
+                        help="runs of every import, the fastest is shown (default: %(default)s)")
+    main(parser.parse_args().repeat)
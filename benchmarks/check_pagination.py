@@ -0,0 +1,98 @@
+"""
+    Check of the pagination of the crawler against the local stub Gerrit server
+    (stub_gerrit.py). For every scenario it checks that:
+
+    - every review of the time period is returned exactly once (exact counts),
+    - the server never sent the same review twice (no overlap between pages or windows),
+    - the number of requests is the minimum: one request per full page of every window.
+
+    The scenarios cover reviews sharing the same timestamp across several pages, a
+    server returning smaller pages than asked for and a very long window.
+
+        python benchmarks/check_pagination.py
+
+    It exits with status 1 if a check fails.
+"""
+import math
+import sys
+from collections import Counter
+# Puts the root of the repository on sys.path.
+import common  # noqa: F401
+from gda.crawler import CodeReviewData, split_date_range
+from gda.http import GerritClient
+from stub_gerrit import StubGerrit, make_changes
+
+
+def with_ties(changes, timestamp, number):
+    """
+    Summary: This function gives the same updated timestamp to the first reviews after
+                timestamp, so that they do not fit into one page.
+    """
+    tied = [change for change in changes if change["updated"] >= timestamp][-number:]
+    for change in tied:
+        change["updated"] = timestamp
+    changes.sort(key=lambda change: (change["updated"], change["_number"]), reverse=True)
+    return changes
+
+
+SCENARIOS = [
+    # name, reviews, server page size, page size asked for, time period, window days
+    ("ties across pages", with_ties(make_changes(3000, days=30, seed=1),
+                                    "2022-01-10 12:00:00.000000000", 45),
+     10, 10, ("2022-01-01", "2022-01-31"), 7),
+    ("server caps the page", make_changes(5000, days=60, seed=2),
+     300, 1000, ("2022-01-01", "2022-03-02"), 7),
+    ("ten year window", make_changes(5000, days=3650, seed=3),
+     100, 100, ("2022-01-01", "2031-12-30"), 3650),
+]
+
+
+def check(name, changes, server_page, page_size, period, window_days):
+    """
+    Summary: This function crawls one scenario and checks the requests and the reviews.
+    Returns:
+        errors (list): A description of every failed check.
+    """
+    errors = []
+    with StubGerrit(changes, page_size=server_page) as server:
+        reviews = CodeReviewData(concurrency=4, window_days=window_days,
+                                 client=GerritClient(requests_per_second=0),
+                                 platforms={"Stub": server.platform(page_size=page_size)})
+        crawled = reviews.get_reviews(period[0], period[1], "Stub")
+        log = server.log
+
+    expected = [change["id"] for change in changes if period[0] <= change["updated"] < period[1]]
+    if crawled == 0:
+        return [f"{name}: the crawl failed"]
+    if sorted(change["id"] for change in crawled) != sorted(expected):
+        errors.append(f"{name}: {len(crawled)} reviews crawled, {len(expected)} expected")
+    sent = Counter(change_id for answer in log for change_id in answer["ids"])
+    twice = [change_id for change_id, count in sent.items() if count > 1]
+    if twice:
+        errors.append(f"{name}: {len(twice)} reviews were sent more than once")
+
+    per_page = min(server_page, page_size)
+    minimum = 0
+    for window_start, window_end in split_date_range(period[0], period[1], window_days):
+        count = sum(window_start <= change["updated"] < window_end for change in changes)
+        minimum += max(1, math.ceil(count / per_page))
+    if len(log) != minimum:
+        errors.append(f"{name}: {len(log)} requests sent, {minimum} needed")
+
+    print(f"{name:<22} {len(expected):>6} reviews  {len(log):>4} requests "
+          f"(minimum {minimum:>4})  {sum(answer['bytes'] for answer in log) / 1e3:>8.1f} kB  "
+          f"{'OK' if not errors else 'FAILED'}")
+    return errors
+
+
+def main():
+    errors = []
+    for scenario in SCENARIOS:
+        errors.extend(check(*scenario))
+    for error in errors:
+        print(error)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
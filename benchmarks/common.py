@@ -0,0 +1,44 @@
+"""
+    Helpers shared by the benchmarks and checks in this directory. Importing this
+    module puts the root of the repository on sys.path, so the scripts can import gda
+    when they are run from anywhere:
+
+        from common import timed
+        from gda.crawler import CodeReviewData
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def timed(function, *args, repeat=1):
+    """
+    Summary: This function runs a function repeat times.
+    Args:
+        function (callable): Called with args.
+        repeat (int, optional): Defaults to 1. The number of runs.
+    Returns:
+        (result, seconds) (tuple): The result of the last run and the fastest time.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def period(changes):
+    """
+    Summary: This function returns the time period of the reviews (start, end), the
+                end being the day after the newest review.
+    Args:
+        changes (list): The reviews, newest first.
+    """
+    end = datetime.strptime(changes[0]["updated"][:10], "%Y-%m-%d") + timedelta(days=1)
+    return changes[-1]["updated"][:10], end.strftime("%Y-%m-%d")
@@ -0,0 +1,58 @@
+"""
+    Records the reviews of a real Gerrit server once, to benchmark the application
+    offline against the stub server (stub_gerrit.py) with real data. The reviews are
+    crawled with the crawler of the application and written to a fixture file, one
+    review per line of compressed JSON:
+
+        python benchmarks/record_fixture.py --platform OpenStack --from 2022-01-01 --to 2022-02-01
+        python benchmarks/suite.py --fixture benchmarks/fixtures/OpenStack.ndjson.gz
+
+    The platforms are read from platforms.json (see gda.platforms), or from --platforms.
+"""
+import argparse
+import os
+import sys
+import time
+# Puts the root of the repository on sys.path.
+import common  # noqa: F401
+from gda.cli import parse_date
+from gda.crawler import CodeReviewData
+from gda.errors import CrawlError
+from gda.platforms import load_platforms
+from stub_gerrit import save_fixture, sort_changes
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--platform", required=True, help="platform to record")
+    parser.add_argument("--from", dest="start_date", type=parse_date, required=True)
+    parser.add_argument("--to", dest="end_date", type=parse_date, required=True)
+    parser.add_argument("--platforms", dest="platforms_config",
+                        help="JSON config file of the Gerrit servers")
+    parser.add_argument("--output", help="fixture file (default: "
+                                         "benchmarks/fixtures/<platform>.ndjson.gz)")
+    args = parser.parse_args()
+
+    platforms = load_platforms(args.platforms_config)
+    server = platforms.get(args.platform)
+    if server is None:
+        parser.error(f"unknown platform {args.platform}; choose from {', '.join(platforms)}")
+    output = args.output or os.path.join(FIXTURES, f"{args.platform}.ndjson.gz")
+
+    reviews = CodeReviewData(platforms=platforms)
+    start = time.perf_counter()
+    try:
+        changes = [change for page in reviews.iter_crawl(args.start_date, args.end_date, server)
+                   for change in page]
+    except CrawlError as error:
+        sys.exit(f"APIError: {error}")
+    save_fixture(output, sort_changes(changes))
+    stats = reviews.client.stats.summary()
+    print(f"{len(changes)} reviews recorded to {output} in {time.perf_counter() - start:.1f} s "
+          f"({stats['requests']} requests, {stats['wire_bytes'] / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
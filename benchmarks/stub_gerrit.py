@@ -0,0 +1,322 @@
+"""
+    A local stub of the Gerrit REST API changes endpoint, used by the benchmarks and
+    checks in this directory. It answers /changes/ queries the way Gerrit does:
+
+    - after: and before: are inclusive and accept "YYYY-MM-DD[ HH:MM:SS[.mmm]]",
+    - status: and project: narrow the search, other terms are ignored,
+    - the o=SKIP_DIFFSTAT option leaves out insertions and deletions,
+    - the reviews are sorted by updated, newest first, then by number,
+    - n= is capped by the page size of the server, S= skips reviews,
+    - the last review of a page has "_more_changes": true if there are more,
+    - the answer starts with the )]}' prefix and is gzipped if asked for.
+
+    Every answer is recorded (query, reviews sent, bytes sent) so that a check can
+    count what the crawler transferred. The reviews do not change while the server
+    runs, so every answer is computed once and then served from memory.
+
+        with StubGerrit(make_changes(10000), page_size=500, latency=0.05) as server:
+            CodeReviewData(platforms={"Stub": server.platform()}).get_reviews(...)
+
+    Reviews recorded from a real Gerrit server with record_fixture.py are served with
+    load_fixture(). The server can also run on its own, e.g. for the GUI or the
+    command line interface (add it to a platforms config):
+
+        python benchmarks/stub_gerrit.py --fixture benchmarks/fixtures/OpenStack.ndjson.gz \
+                                         --port 8080 --latency 0.05 --page-size 500
+"""
+import argparse
+import bisect
+import copy
+import gzip
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+# Puts the root of the repository on sys.path.
+import common  # noqa: F401
+from gda.platforms import Platform
+from gda.storage import dumps, loads
+
+
+TERM = re.compile(r'(-?)(\w+):(?:"([^"]*)"|(\S+))')
+
+
+def make_changes(number, start="2022-01-01", days=90, projects=5, accounts=200, seed=0):
+    """
+    Summary: This function creates synthetic reviews with the fields Gerrit returns
+                by default. The timestamps have whole seconds like Gerrit's, so some
+                reviews share their updated timestamp.
+    Args:
+        number (int): The number of reviews.
+        start (str, optional): Defaults to "2022-01-01". The first day of the reviews.
+        days (int, optional): Defaults to 90. The number of days the reviews are spread over.
+        projects (int, optional): Defaults to 5. The number of projects.
+        accounts (int, optional): Defaults to 200. The number of developers.
+        seed (int, optional): Defaults to 0. The seed of the random generator.
+    Returns:
+        changes (list): The reviews, newest first.
+    """
+    rng = random.Random(seed)
+    first = datetime.strptime(start, "%Y-%m-%d")
+    changes = []
+    for number_ in range(1, number + 1):
+        updated = first + timedelta(seconds=rng.randrange(days * 86400))
+        created = updated - timedelta(seconds=rng.randrange(30 * 86400))
+        status = rng.choice(["NEW", "MERGED", "MERGED", "ABANDONED"])
+        project = f"project-{rng.randrange(projects)}"
+        change = {
+            "id": f"{project}~master~I{number_:040x}",
+            "project": project,
+            "branch": "master",
+            "change_id": f"I{number_:040x}",
+            "subject": f"Change number {number_}",
+            "status": status,
+            "created": created.strftime("%Y-%m-%d %H:%M:%S.000000000"),
+            "updated": updated.strftime("%Y-%m-%d %H:%M:%S.000000000"),
+            "insertions": rng.randrange(500),
+            "deletions": rng.randrange(200),
+            "_number": number_,
+            "owner": {"_account_id": 1000000 + rng.randrange(accounts)},
+        }
+        if status == "MERGED":
+            change["submitted"] = change["updated"]
+            change["submitter"] = {"_account_id": 1000000 + rng.randrange(accounts)}
+        changes.append(change)
+    return sort_changes(changes)
+
+
+def sort_changes(changes):
+    """
+    Summary: This function sorts reviews in Gerrit's order, newest first.
+    """
+    changes.sort(key=lambda change: (change["updated"], change.get("_number", 0)), reverse=True)
+    return changes
+
+
+def save_fixture(path, changes):
+    """
+    Summary: This function writes reviews to a fixture file, one review per line of
+                compressed JSON, like the files of the review store.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with gzip.open(path, "wb", compresslevel=6) as outfile:
+        for change in changes:
+            outfile.write(dumps(change))
+
+
+def load_fixture(path):
+    """
+    Summary: This function reads the reviews of a fixture file.
+    Returns:
+        changes (list): The reviews, newest first.
+    """
+    with gzip.open(path, "rb") as infile:
+        return sort_changes([loads(line) for line in infile if line.strip()])
+
+
+def resize_changes(changes, number):
+    """
+    Summary: This function returns number reviews made from the reviews given, e.g. to
+                benchmark 1M reviews with a smaller recording. The reviews are repeated
+                with new ids and numbers and keep their timestamps, statuses and owners.
+    Args:
+        changes (list): The reviews.
+        number (int): The number of reviews returned.
+    Returns:
+        changes (list): The reviews, newest first.
+    """
+    if number <= len(changes):
+        return sort_changes(list(changes[:number]))
+    resized = []
+    for index in range(number):
+        change = changes[index % len(changes)]
+        copy_number = index // len(changes)
+        if copy_number:
+            change = copy.copy(change)
+            change["id"] = f"{change['id']}-{copy_number}"
+            change["_number"] = change.get("_number", 0) + copy_number * 10 ** 9
+        resized.append(change)
+    return sort_changes(resized)
+
+
+def parse_time(value):
+    """
+    Summary: This function turns a time of a query into a string that can be compared
+                with the updated field of the reviews.
+    """
+    date, _, clock = value.partition(" ")
+    clock = clock or "00:00:00"
+    seconds, _, fraction = clock.partition(".")
+    return f"{date} {seconds}.{fraction.ljust(9, '0')}"
+
+
+class StubGerrit:
+    """
+        This class runs the stub server in a background thread. It is a context manager,
+        the server is stopped when the block ends.
+    """
+    def __init__(self, changes, page_size=500, latency=0.0, port=0):
+        """
+        Args:
+            changes (list): The reviews served, newest first (see make_changes()).
+            page_size (int, optional): Defaults to 500. The largest page the server returns.
+            latency (float, optional): Defaults to 0.0. Seconds every answer is delayed.
+            port (int, optional): Defaults to 0. The port of the server; 0 for any free port.
+        """
+        self.changes = changes
+        self.page_size = page_size
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.log = []
+        self.answers = {}
+        # The updated timestamps, oldest first, to find a time period by bisection.
+        self.ascending = [change["updated"] for change in reversed(changes)]
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.handle(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def platform(self, name="Stub", page_size=None, query=""):
+        """
+        Summary: This function returns a platform that crawls this server.
+        Args:
+            page_size (int, optional): Defaults to None. The page size asked for; if None,
+                                        the page size of the server.
+        """
+        return Platform(name, self.url, page_size=page_size or self.page_size,
+                        requests_per_second=0, query=query)
+
+    def search(self, query):
+        """
+        Summary: This function returns the reviews matching a query, in Gerrit's order.
+        """
+        after = before = None
+        status = project = None
+        for negated, key, quoted, plain in TERM.findall(query):
+            value = quoted or plain
+            if key == "after":
+                after = parse_time(value)
+            elif key == "before":
+                before = parse_time(value)
+            elif key == "status" and not negated:
+                status = value.lower()
+            elif key == "project" and not negated:
+                project = value
+        low = bisect.bisect_left(self.ascending, after) if after is not None else 0
+        high = bisect.bisect_right(self.ascending, before) if before is not None \
+            else len(self.ascending)
+        selected = []
+        for change in self.changes[len(self.changes) - high:len(self.changes) - low]:
+            if status == "open" and change["status"] != "NEW":
+                continue
+            if status == "closed" and change["status"] == "NEW":
+                continue
+            if status not in (None, "open", "closed") and change["status"].lower() != status:
+                continue
+            if project is not None and change["project"] != project:
+                continue
+            selected.append(change)
+        return selected
+
+    def answer(self, path, compress):
+        """
+        Summary: This function computes the answer to a request.
+        Returns:
+            (query, offset, ids, body) (tuple)
+        """
+        parameters = parse_qs(urlparse(path).query)
+        query = parameters.get("q", [""])[0]
+        limit = min(int(parameters.get("n", [self.page_size])[0]), self.page_size)
+        offset = int(parameters.get("S", ["0"])[0])
+        selected = self.search(query)
+        page = [dict(change) for change in selected[offset:offset + limit]]
+        if "SKIP_DIFFSTAT" in parameters.get("o", []):
+            for change in page:
+                change.pop("insertions", None)
+                change.pop("deletions", None)
+        if page and offset + limit < len(selected):
+            page[-1]["_more_changes"] = True
+        body = (")]}'\n" + json.dumps(page)).encode()
+        if compress:
+            body = gzip.compress(body, 6)
+        return query, offset, [change["id"] for change in page], body
+
+    def handle(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        compress = "gzip" in request.headers.get("Accept-Encoding", "")
+        key = (request.path, compress)
+        answer = self.answers.get(key)
+        if answer is None:
+            answer = self.answers[key] = self.answer(request.path, compress)
+        query, offset, ids, body = answer
+        request.send_response(200)
+        if compress:
+            request.send_header("Content-Encoding", "gzip")
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+        with self.lock:
+            self.log.append({"query": query, "offset": offset, "ids": ids, "bytes": len(body)})
+
+    def reset(self):
+        """
+        Summary: This function forgets the answers recorded so far.
+        """
+        with self.lock:
+            self.log = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve reviews like the Gerrit REST API.")
+    parser.add_argument("--fixture", help="reviews recorded by record_fixture.py "
+                                          "(default: synthetic reviews)")
+    parser.add_argument("--reviews", type=int, default=10000,
+                        help="number of reviews served (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the server waits before every answer")
+    parser.add_argument("--page-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.fixture:
+        changes = resize_changes(load_fixture(args.fixture), args.reviews)
+    else:
+        changes = make_changes(args.reviews)
+    server = StubGerrit(changes, page_size=args.page_size, latency=args.latency, port=args.port)
+    print(f"Serving {len(changes)} reviews from {changes[-1]['updated'][:10]} to "
+          f"{changes[0]['updated'][:10]} on {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
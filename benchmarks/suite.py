@@ -0,0 +1,203 @@
+"""
+    Benchmark suite of the whole application, written as JSON so that the results
+    of two versions can be compared offline. For every number of reviews it measures:
+
+    - crawl: the end-to-end analysis (CodeReviewData.analyze(), without cache) against
+      the local stub Gerrit server (stub_gerrit.py), with its latency and page size,
+    - filter: the throughput of CodeReviewData.filter_data() and its peak memory,
+    - storage: the time to append the reviews to the review store and to the cache,
+    - render: the time to draw the four graphs and export them as PDF files.
+
+    The reviews are synthetic, or recorded from a real server by record_fixture.py and
+    repeated up to the number of reviews asked for:
+
+        python benchmarks/suite.py --output results.json
+        python benchmarks/suite.py --sizes 10000 100000 --latency 0.02 --page-size 1000
+        python benchmarks/suite.py --fixture benchmarks/fixtures/OpenStack.ndjson.gz
+        python benchmarks/suite.py --baseline old.json --output new.json
+
+    With --baseline, every time that is more than --tolerance slower than in the
+    baseline is reported as a regression and the exit code is 1. The crawl is run
+    twice and the second run is reported; the first run lets the stub server compute
+    its answers.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from common import ROOT, period, timed
+from gda.cache import ChangeCache
+from gda.charts import create_figures, export_charts
+from gda.crawler import CodeReviewData
+from gda.http import GerritClient
+from gda.storage import ReviewStore
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from stub_gerrit import StubGerrit, load_fixture, make_changes, resize_changes
+
+STAGES = ("crawl", "filter", "storage", "render")
+PAGE = 500
+
+
+def version():
+    """
+    Summary: This function returns the git commit of the repository, if there is one.
+    """
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_crawl(changes, args):
+    start_date, end_date = period(changes)
+    with StubGerrit(changes, page_size=args.page_size, latency=args.latency) as server:
+        reviews = CodeReviewData(concurrency=args.concurrency, client=GerritClient(requests_per_second=0),
+                                 platforms={"Stub": server.platform()})
+        reviews.analyze(start_date, end_date, "Stub")
+        reviews.client.stats.reset()
+        result, seconds = timed(lambda: reviews.analyze(start_date, end_date, "Stub"))
+    if result == 0:
+        raise RuntimeError("the crawl of the stub server failed")
+    stats = reviews.client.stats.summary()
+    return {"seconds": seconds,
+            "changes_per_second": len(changes) / seconds,
+            "requests": stats["requests"],
+            "wire_bytes": stats["wire_bytes"],
+            "body_bytes": stats["body_bytes"],
+            "latency_p50": stats["latency_p50"],
+            "latency_p95": stats["latency_p95"]}
+
+
+def bench_filter(changes, args):
+    reviews = CodeReviewData()
+    _, seconds = timed(lambda: reviews.filter_data(changes), repeat=3)
+    # The memory is measured in another run, tracemalloc slows the filtering down.
+    tracemalloc.start()
+    reviews.filter_data(changes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": seconds,
+            "changes_per_second": len(changes) / seconds,
+            "peak_memory_bytes": peak}
+
+
+def bench_storage(changes, args):
+    pages = [changes[index:index + PAGE] for index in range(0, len(changes), PAGE)]
+    with tempfile.TemporaryDirectory() as directory:
+        store = ReviewStore(os.path.join(directory, "reviews"))
+        _, store_seconds = timed(lambda: [store.append("Bench", page) for page in pages])
+        store_bytes = sum(os.path.getsize(os.path.join(folder, name))
+                          for folder, _, names in os.walk(store.root) for name in names)
+        cache = ChangeCache(os.path.join(directory, "cache.db"))
+        _, cache_seconds = timed(lambda: [cache.store("Bench", page) for page in pages])
+        cache_bytes = os.path.getsize(cache.path)
+    return {"seconds": store_seconds + cache_seconds,
+            "store_seconds": store_seconds,
+            "store_bytes": store_bytes,
+            "cache_seconds": cache_seconds,
+            "cache_bytes": cache_bytes}
+
+
+def bench_render(changes, args):
+    data = CodeReviewData().filter_data(changes)
+
+    def draw():
+        for fig in create_figures(*data):
+            FigureCanvasAgg(fig).draw()
+
+    _, draw_seconds = timed(draw, repeat=3)
+    with tempfile.TemporaryDirectory() as directory:
+        _, export_seconds = timed(lambda: export_charts(*data, directory=directory), repeat=3)
+    return {"seconds": draw_seconds + export_seconds,
+            "days": len(data[0]),
+            "draw_seconds": draw_seconds,
+            "export_seconds": export_seconds}
+
+
+BENCHMARKS = {"crawl": bench_crawl, "filter": bench_filter,
+              "storage": bench_storage, "render": bench_render}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Summary: This function compares the times of two runs of the suite.
+    Returns:
+        regressions (list): A line of text for every time more than tolerance slower.
+    """
+    before = {(entry["size"], stage): values["seconds"]
+              for entry in baseline["results"] for stage, values in entry["stages"].items()}
+    regressions = []
+    for entry in results["results"]:
+        for stage, values in entry["stages"].items():
+            old = before.get((entry["size"], stage))
+            if old and values["seconds"] > old * (1 + tolerance):
+                regressions.append(f"{stage} at {entry['size']} reviews: {old:.3f} s -> "
+                                   f"{values['seconds']:.3f} s (+{values['seconds'] / old - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="numbers of reviews (default: %(default)s)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--fixture", help="reviews recorded by record_fixture.py")
+    parser.add_argument("--days", type=int, default=365,
+                        help="days the synthetic reviews are spread over (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the stub server waits before every answer")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="JSON file of the results (default: standard output)")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown reported as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    recorded = load_fixture(args.fixture) if args.fixture else None
+    results = {"version": version(),
+               "date": datetime.now().isoformat(timespec="seconds"),
+               "python": platform.python_version(),
+               "machine": platform.platform(),
+               "cpus": os.cpu_count(),
+               "settings": {"fixture": args.fixture, "days": args.days, "latency": args.latency,
+                            "page_size": args.page_size, "concurrency": args.concurrency},
+               "results": []}
+    for size in args.sizes:
+        if recorded is not None:
+            changes = resize_changes(recorded, size)
+        else:
+            changes = make_changes(size, days=args.days, accounts=max(200, size // 100))
+        entry = {"size": size, "stages": {}}
+        for stage in args.stages:
+            entry["stages"][stage] = values = BENCHMARKS[stage](changes, args)
+            print(f"{size:>9} {stage:<8} {values['seconds']:>9.3f} s", file=sys.stderr)
+        # ru_maxrss is in kilobytes on Linux; it is the peak of the whole run so far.
+        entry["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        results["results"].append(entry)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            outfile.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as infile:
+            regressions = compare(results, json.load(infile), args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
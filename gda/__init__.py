@@ -0,0 +1,5 @@
+"""
+    GerritDataAnalyzer without the GUI: crawling, caching, filtering and exporting of
+    code review data. Nothing in this package imports tkinter, so it can run headless
+    (see gda.cli, started with "python -m gda").
+"""
@@ -0,0 +1,7 @@
+import sys
+from .cli import main
+
+# The guard is needed by the worker processes of the sharded mode, which import the
+# main module again on the platforms that do not fork.
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+    Filtering of the crawled reviews into reviews opened and closed per day and
+    active developers per month. The developers are counted exactly with sets of
+    account ids, or approximately with HyperLogLog sketches (see gda.sketch).
+"""
+from .sketch import HyperLogLog
+# NumPy is optional. Without it the reviews are filtered in pure Python.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ReviewAggregator:
+    """
+        This class filters the reviews incrementally. The reviews can be added page by
+        page while they are being crawled, so the whole list of reviews never has to be
+        kept in memory.
+    """
+    def __init__(self, developer_error=None):
+        """
+        Args:
+            developer_error (float, optional): Defaults to None. If given, the developers
+                                    of every month are counted with a HyperLogLog sketch
+                                    of this relative standard error instead of a set.
+        """
+        self.developer_error = developer_error
+        self.reviews_opened = {}
+        self.reviews_closed = {}
+        self.active_developers = {}
+
+    def new_developers(self):
+        """
+        Summary: This function returns an empty set of developers for a new month.
+        Returns:
+            set or HyperLogLog
+        """
+        if self.developer_error is None:
+            return set()
+        return HyperLogLog(self.developer_error)
+
+    def add(self, changes):
+        """
+        Summary: This function adds a page of reviews to the reviews opened and closed
+                    per day and to the active developers per month.
+        Args:
+            changes (list): A list of reviews returned by the Gerrit REST API.
+        """
+        reviews_opened = self.reviews_opened
+        reviews_closed = self.reviews_closed
+        active_developers = self.active_developers
+        for change in changes:
+            ################ Reviews opened and closed #################
+            timestamp_str = change['updated'][:10]
+            if timestamp_str not in reviews_opened:
+                reviews_opened[timestamp_str] = 0
+            if timestamp_str not in reviews_closed:
+                reviews_closed[timestamp_str] = 0
+            if change.get('status') == 'NEW':
+                reviews_opened[timestamp_str] += 1
+            elif change.get('status') in ['MERGED', 'ABANDONED']:
+                reviews_closed[timestamp_str] += 1
+
+            ############### Active developer per month ################
+            # The "updated" field is "YYYY-MM-DD hh:mm:ss.fffffffff", so the month is
+            # simply its first seven characters.
+            year_month = change['updated'][:7]
+            for account in (change.get('owner'), change.get('submitter')):
+                if account and account.get('_account_id') is not None:
+                    if year_month not in active_developers:
+                        active_developers[year_month] = self.new_developers()
+                    active_developers[year_month].add(account['_account_id'])
+
+    def partial(self):
+        """
+        Summary: This function returns the partial aggregate of the reviews added so far.
+                    Unlike result(), it keeps the ids of the developers, so the partial
+                    aggregates of different parts of the time period can be merged.
+        Returns:
+            partial (list): [reviews_opened, reviews_closed, active_developers], where
+                            active_developers maps every month to a set of account ids,
+                            or to a HyperLogLog sketch if developer_error is given.
+        """
+        return [self.reviews_opened, self.reviews_closed, self.active_developers]
+
+    def merge(self, partial):
+        """
+        Summary: This function adds a partial aggregate to this aggregator.
+        Args:
+            partial (list): A partial aggregate returned by partial().
+        """
+        reviews_opened, reviews_closed, active_developers = partial
+        for day, count in reviews_opened.items():
+            self.reviews_opened[day] = self.reviews_opened.get(day, 0) + count
+        for day, count in reviews_closed.items():
+            self.reviews_closed[day] = self.reviews_closed.get(day, 0) + count
+        for year_month, accounts in active_developers.items():
+            if year_month not in self.active_developers:
+                self.active_developers[year_month] = self.new_developers()
+            self.active_developers[year_month].update(accounts)
+
+    def result(self):
+        """
+        Summary: This function returns the filtered data. The days and months are
+                    ordered newest first, the same order as the Gerrit REST API returns
+                    the reviews.
+        Returns:
+            returned_data (list): [reviews_opened, reviews_closed, developers_per_month]
+        """
+        reviews_opened = {day: self.reviews_opened[day]
+                          for day in sorted(self.reviews_opened, reverse=True)}
+        reviews_closed = {day: self.reviews_closed[day]
+                          for day in sorted(self.reviews_closed, reverse=True)}
+        developers_per_month = {year_month: len(self.active_developers[year_month])
+                                for year_month in sorted(self.active_developers, reverse=True)}
+        return [reviews_opened, reviews_closed, developers_per_month]
+
+
+class ColumnarAggregator(ReviewAggregator):
+    """
+        This class filters the reviews in bulk with NumPy. Each page of reviews is
+        turned into columns (day, status, owner and submitter ids) and counted with
+        group-by operations on the whole page at once. Only the counts per day and the
+        developers per month are kept, like in ReviewAggregator, so the memory does not
+        grow with the number of pages and partial(), merge() and result() are the same.
+        It is faster than ReviewAggregator with HyperLogLog sketches (see make_aggregator()).
+    """
+    def add(self, changes):
+        """
+        Summary: This function adds a page of reviews to the reviews opened and closed
+                    per day and to the active developers per month.
+        Args:
+            changes (list): A list of reviews returned by the Gerrit REST API.
+        """
+        if not changes:
+            return
+        no_account = {}
+        # Fixed width byte strings keep only the first 10 characters ("YYYY-MM-DD").
+        days = np.array([change['updated'] for change in changes], dtype='S10')
+        statuses = np.array([change.get('status') or '' for change in changes], dtype='S9')
+
+        ################ Reviews opened and closed #################
+        # A page covers a few days, so the counts are added to the running counts of
+        # a few days only.
+        unique_days, day_index = np.unique(days, return_inverse=True)
+        opened = np.bincount(day_index, weights=statuses == b'NEW',
+                             minlength=len(unique_days)).astype(np.int64)
+        closed = np.bincount(day_index,
+                             weights=(statuses == b'MERGED') | (statuses == b'ABANDONED'),
+                             minlength=len(unique_days)).astype(np.int64)
+        reviews_opened = self.reviews_opened
+        reviews_closed = self.reviews_closed
+        for day, opened_count, closed_count in zip(unique_days.tolist(), opened.tolist(),
+                                                   closed.tolist()):
+            day = day.decode()
+            reviews_opened[day] = reviews_opened.get(day, 0) + opened_count
+            reviews_closed[day] = reviews_closed.get(day, 0) + closed_count
+
+        ############### Active developer per month ################
+        owners = self.account_ids(
+            [(change.get('owner') or no_account).get('_account_id') for change in changes])
+        submitters = self.account_ids(
+            [(change.get('submitter') or no_account).get('_account_id') for change in changes])
+        months = np.concatenate([days, days]).astype('S7')
+        accounts = np.concatenate([owners, submitters])
+        known = accounts >= 0
+        months = months[known]
+        accounts = accounts[known]
+        # A page covers one or two months.
+        for month in np.unique(months).tolist():
+            month_accounts = np.unique(accounts[months == month])
+            label = month.decode()
+            if label not in self.active_developers:
+                self.active_developers[label] = self.new_developers()
+            if self.developer_error is None:
+                self.active_developers[label].update(month_accounts.tolist())
+            else:
+                self.active_developers[label].add_many(month_accounts)
+
+    @staticmethod
+    def account_ids(ids):
+        """
+        Summary: This function converts a list of account ids to an array.
+        Args:
+            ids (list): The account ids. None is used when a review has no such account.
+        Returns:
+            account_ids (numpy.ndarray): The account ids, -1 when there is none.
+        """
+        account_ids = np.array(ids, dtype=object)
+        account_ids[np.equal(account_ids, None)] = -1
+        return account_ids.astype(np.int64)
+
+
+def make_aggregator(developer_error=None):
+    """
+    Summary: This function returns the fastest aggregator available. Reading the fields
+                of the reviews dominates, which ReviewAggregator does in a single loop,
+                so it is used to count the developers exactly. ColumnarAggregator is
+                used for the HyperLogLog sketches if NumPy is installed, since it hashes
+                the account ids of a whole page at once.
+    Args:
+        developer_error (float, optional): Defaults to None. If given, the developers are
+                                counted approximately with this relative standard error.
+    Returns:
+        ColumnarAggregator or ReviewAggregator
+    """
+    if np is not None and developer_error is not None:
+        return ColumnarAggregator(developer_error)
+    return ReviewAggregator(developer_error)
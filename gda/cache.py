@@ -0,0 +1,412 @@
+"""
+    Local SQLite cache of the reviews crawled from the Gerrit REST API, with rollup
+    tables of the filtered data kept up to date as the reviews are stored. The cache
+    of a platform is emptied when its url, query or projects change (see use_scope()).
+"""
+import json
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+from .crawler import split_date_range
+
+
+def rollup_deltas(removed, added):
+    """
+    Summary: This function computes how the rollups change when some reviews are
+                removed from the cache and others are added. A review that is replaced
+                by a newer version is in both lists, so a review that went from NEW
+                to MERGED is taken off the opened reviews of its old day and added to
+                the closed reviews of its new day.
+    Args:
+        removed (list): The reviews taken out of the cache.
+        added (list): The reviews put into the cache.
+    Returns:
+        (days, developers) (tuple): days maps every day to the change of its
+                [reviews, opened, closed] counts, developers maps every (day, account)
+                to the change of the number of reviews of the account on that day.
+    """
+    days = {}
+    developers = {}
+    for sign, changes in ((-1, removed), (1, added)):
+        for change in changes:
+            day = change["updated"][:10]
+            if day not in days:
+                days[day] = [0, 0, 0]
+            counts = days[day]
+            counts[0] += sign
+            if change.get("status") == "NEW":
+                counts[1] += sign
+            elif change.get("status") in ("MERGED", "ABANDONED"):
+                counts[2] += sign
+            for account in (change.get("owner"), change.get("submitter")):
+                if account and account.get("_account_id") is not None:
+                    key = (day, account["_account_id"])
+                    developers[key] = developers.get(key, 0) + sign
+    return days, developers
+
+
+def month_bounds(month):
+    """
+    Summary: This function returns the first day of a month and of the next month.
+    Args:
+        month (str): "YYYY-MM".
+    Returns:
+        (start_date, end_date) (tuple)
+    """
+    year, number = int(month[:4]), int(month[5:7])
+    next_month = f"{year + 1:04d}-01" if number == 12 else f"{year:04d}-{number + 1:02d}"
+    return month + "-01", next_month + "-01"
+
+
+class ChangeCache:
+    """
+        This class stores crawled reviews in a local SQLite database, keyed by platform
+        and change id. It also remembers which days have been crawled completely and
+        when each platform was last synchronized, so that a new query only has to
+        crawl the days it has not seen before plus the reviews updated since then.
+
+        The reviews opened and closed per day and the active developers per month are
+        kept in rollup tables, updated with the difference every time reviews are
+        stored, so rollup() returns the filtered data without reading the reviews.
+    """
+    def __init__(self, path="Storage/cache.db"):
+        self.path = path
+        with closing(self.connect()) as connection, connection:
+            new_rollups = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'rollup_days'").fetchone() is None
+            connection.execute("""CREATE TABLE IF NOT EXISTS changes (
+                                    platform TEXT NOT NULL,
+                                    id TEXT NOT NULL,
+                                    updated TEXT NOT NULL,
+                                    data TEXT NOT NULL,
+                                    PRIMARY KEY (platform, id))""")
+            connection.execute("""CREATE INDEX IF NOT EXISTS changes_updated
+                                    ON changes (platform, updated)""")
+            connection.execute("""CREATE TABLE IF NOT EXISTS synced_days (
+                                    platform TEXT NOT NULL,
+                                    day TEXT NOT NULL,
+                                    PRIMARY KEY (platform, day))""")
+            connection.execute("""CREATE TABLE IF NOT EXISTS sync_state (
+                                    platform TEXT PRIMARY KEY,
+                                    last_sync TEXT NOT NULL)""")
+            # The scope (Platform.scope) the reviews of every platform were crawled with.
+            connection.execute("""CREATE TABLE IF NOT EXISTS platform_scopes (
+                                    platform TEXT PRIMARY KEY,
+                                    scope TEXT NOT NULL)""")
+            ######################## Rollups ########################
+            connection.execute("""CREATE TABLE IF NOT EXISTS rollup_days (
+                                    platform TEXT NOT NULL,
+                                    day TEXT NOT NULL,
+                                    reviews INTEGER NOT NULL,
+                                    opened INTEGER NOT NULL,
+                                    closed INTEGER NOT NULL,
+                                    PRIMARY KEY (platform, day))""")
+            # The number of reviews of every developer per day and per month, to know
+            # when a developer is no longer active after a review has moved to another
+            # day. The days are only read for months partly in the time period.
+            connection.execute("""CREATE TABLE IF NOT EXISTS rollup_developers (
+                                    platform TEXT NOT NULL,
+                                    day TEXT NOT NULL,
+                                    account INTEGER NOT NULL,
+                                    reviews INTEGER NOT NULL,
+                                    PRIMARY KEY (platform, day, account))""")
+            connection.execute("""CREATE TABLE IF NOT EXISTS rollup_month_developers (
+                                    platform TEXT NOT NULL,
+                                    month TEXT NOT NULL,
+                                    account INTEGER NOT NULL,
+                                    reviews INTEGER NOT NULL,
+                                    PRIMARY KEY (platform, month, account))""")
+            connection.execute("""CREATE TABLE IF NOT EXISTS rollup_months (
+                                    platform TEXT NOT NULL,
+                                    month TEXT NOT NULL,
+                                    developers INTEGER NOT NULL,
+                                    PRIMARY KEY (platform, month))""")
+            # A cache created before the rollups existed: fill them once.
+            if new_rollups:
+                platforms = [platform for (platform,) in
+                             connection.execute("SELECT DISTINCT platform FROM changes")]
+                for platform in platforms:
+                    self.rebuild_rollups(connection, platform)
+
+    def connect(self):
+        """
+        Summary: This function opens a new connection to the database. A new connection
+                    is used for every operation so the cache can be used from any thread
+                    or process. A writer waits up to 30 seconds for the others to finish.
+        Returns:
+            sqlite3.Connection
+        """
+        return sqlite3.connect(self.path, timeout=30)
+
+    def use_scope(self, platform, scope):
+        """
+        Summary: This function checks that the cached reviews of a platform were crawled
+                    with the same url, query and projects. If not, the reviews, the
+                    synchronized days and the rollups of the platform are deleted, so
+                    that the reviews of the two scopes are not mixed and every day is
+                    crawled again.
+        Args:
+            platform (str): The platform of the reviews.
+            scope (str): The scope of the platform (Platform.scope).
+        Returns:
+            cleared (bool): True if the cached reviews were deleted.
+        """
+        with closing(self.connect()) as connection, connection:
+            row = connection.execute("SELECT scope FROM platform_scopes WHERE platform = ?",
+                                     (platform,)).fetchone()
+            if row is not None and row[0] == scope:
+                return False
+            # A cache written before the scopes were recorded is kept, its reviews are
+            # taken to be of the current scope.
+            cleared = row is not None
+            if cleared:
+                for table in ("changes", "synced_days", "sync_state", "rollup_days",
+                              "rollup_developers", "rollup_month_developers", "rollup_months"):
+                    connection.execute(f"DELETE FROM {table} WHERE platform = ?", (platform,))
+            connection.execute("INSERT OR REPLACE INTO platform_scopes VALUES (?, ?)",
+                               (platform, scope))
+        return cleared
+
+    def store(self, platform, changes):
+        """
+        Summary: This function inserts the reviews into the cache. A review that is
+                    already cached is replaced by the new version.
+        Args:
+            platform (str): The platform the reviews were crawled from.
+            changes (list): The reviews returned by the Gerrit REST API.
+        """
+        # Only the last version of a review that is twice in the page is kept.
+        latest = {}
+        for change in changes:
+            if change["updated"] >= latest.get(change["id"], change)["updated"]:
+                latest[change["id"]] = change
+        rows = [(platform, change["id"], change["updated"], json.dumps(change))
+                for change in latest.values()]
+        with closing(self.connect()) as connection, connection:
+            ids = list(latest)
+            replaced = []
+            # SQLite limits the number of parameters of a statement.
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                replaced.extend(json.loads(data) for (data,) in connection.execute(
+                    f"SELECT data FROM changes WHERE platform = ? AND id IN ({','.join('?' * len(chunk))})",
+                    [platform] + chunk))
+            connection.executemany("INSERT OR REPLACE INTO changes VALUES (?, ?, ?, ?)", rows)
+            self.apply_rollups(connection, platform, *rollup_deltas(replaced, list(latest.values())))
+
+    def apply_rollups(self, connection, platform, days, developers):
+        """
+        Summary: This function adds the differences computed by rollup_deltas() to the
+                    rollup tables, in the transaction that stores the reviews.
+        Args:
+            connection (sqlite3.Connection): The connection of the transaction.
+            platform (str): The platform of the reviews.
+            days (dict): The differences per day.
+            developers (dict): The differences per (day, account).
+        """
+        connection.executemany("""INSERT INTO rollup_days VALUES (?, ?, ?, ?, ?)
+                                ON CONFLICT (platform, day) DO UPDATE SET
+                                    reviews = reviews + excluded.reviews,
+                                    opened = opened + excluded.opened,
+                                    closed = closed + excluded.closed""",
+                               [(platform, day, *counts) for day, counts in days.items()
+                                if any(counts)])
+        connection.executemany("DELETE FROM rollup_days WHERE platform = ? AND day = ? AND reviews <= 0",
+                               [(platform, day) for day in days])
+        connection.executemany("""INSERT INTO rollup_developers VALUES (?, ?, ?, ?)
+                                ON CONFLICT (platform, day, account) DO UPDATE SET
+                                    reviews = reviews + excluded.reviews""",
+                               [(platform, day, account, count)
+                                for (day, account), count in developers.items() if count])
+        connection.executemany("""DELETE FROM rollup_developers
+                                WHERE platform = ? AND day = ? AND account = ? AND reviews <= 0""",
+                               [(platform, day, account) for day, account in developers])
+
+        ############### Active developer per month ################
+        month_developers = {}
+        for (day, account), count in developers.items():
+            key = (day[:7], account)
+            month_developers[key] = month_developers.get(key, 0) + count
+        accounts_per_month = {}
+        for (month, account), count in month_developers.items():
+            if count:
+                accounts_per_month.setdefault(month, []).append(account)
+        # A developer becomes active in a month when the number of its reviews goes up
+        # from 0, and inactive when it goes down to 0.
+        months = {}
+        for month, accounts in accounts_per_month.items():
+            before = {}
+            for start in range(0, len(accounts), 500):
+                chunk = accounts[start:start + 500]
+                before.update(connection.execute(
+                    f"""SELECT account, reviews FROM rollup_month_developers
+                    WHERE platform = ? AND month = ? AND account IN ({','.join('?' * len(chunk))})""",
+                    [platform, month] + chunk))
+            months[month] = sum((before.get(account, 0) + month_developers[(month, account)] > 0)
+                                - (before.get(account, 0) > 0) for account in accounts)
+        connection.executemany("""INSERT INTO rollup_month_developers VALUES (?, ?, ?, ?)
+                                ON CONFLICT (platform, month, account) DO UPDATE SET
+                                    reviews = reviews + excluded.reviews""",
+                               [(platform, month, account, count)
+                                for (month, account), count in month_developers.items() if count])
+        connection.executemany("""DELETE FROM rollup_month_developers
+                                WHERE platform = ? AND month = ? AND account = ? AND reviews <= 0""",
+                               [(platform, month, account) for month, account in month_developers])
+        connection.executemany("""INSERT INTO rollup_months VALUES (?, ?, ?)
+                                ON CONFLICT (platform, month) DO UPDATE SET
+                                    developers = developers + excluded.developers""",
+                               [(platform, month, count) for month, count in months.items() if count])
+        connection.executemany("DELETE FROM rollup_months WHERE platform = ? AND month = ? AND developers <= 0",
+                               [(platform, month) for month in months])
+
+    def rebuild_rollups(self, connection, platform):
+        """
+        Summary: This function computes the rollups of a platform again from all its
+                    cached reviews.
+        Args:
+            connection (sqlite3.Connection): The connection of the transaction.
+            platform (str): The platform of the reviews.
+        """
+        for table in ("rollup_days", "rollup_developers", "rollup_month_developers", "rollup_months"):
+            connection.execute(f"DELETE FROM {table} WHERE platform = ?", (platform,))
+        cursor = connection.execute("SELECT data FROM changes WHERE platform = ?", (platform,))
+        while True:
+            rows = cursor.fetchmany(5000)
+            if not rows:
+                break
+            self.apply_rollups(connection, platform,
+                               *rollup_deltas([], [json.loads(data) for (data,) in rows]))
+
+    def rollup(self, platform, start_date, end_date):
+        """
+        Summary: This function returns the filtered data of the cached reviews updated in
+                    the time period, read from the rollup tables. It is the same as
+                    filtering all the cached reviews of the time period with filter_data().
+        Args:
+            platform (str): The platform of the reviews.
+            start_date (str): The start date of the time period ("YYYY-MM-DD").
+            end_date (str): The end date of the time period ("YYYY-MM-DD").
+        Returns:
+            returned_data (list): [reviews_opened, reviews_closed, developers_per_month],
+                                newest first.
+        """
+        reviews_opened = {}
+        reviews_closed = {}
+        developers_per_month = {}
+        with closing(self.connect()) as connection:
+            for day, opened, closed in connection.execute(
+                    """SELECT day, opened, closed FROM rollup_days
+                    WHERE platform = ? AND day >= ? AND day < ? ORDER BY day DESC""",
+                    (platform, start_date, end_date)):
+                reviews_opened[day] = opened
+                reviews_closed[day] = closed
+            months = dict(connection.execute(
+                """SELECT month, developers FROM rollup_months
+                WHERE platform = ? AND month >= ? AND month <= ? ORDER BY month DESC""",
+                (platform, start_date[:7], end_date[:7])))
+            for month, developers in months.items():
+                month_start, month_end = month_bounds(month)
+                # A month that is only partly in the time period is counted from its days.
+                if month_start < start_date or month_end > end_date:
+                    (developers,) = connection.execute(
+                        """SELECT COUNT(DISTINCT account) FROM rollup_developers
+                        WHERE platform = ? AND day >= ? AND day < ?""",
+                        (platform, max(month_start, start_date), min(month_end, end_date))).fetchone()
+                if developers:
+                    developers_per_month[month] = developers
+        return [reviews_opened, reviews_closed, developers_per_month]
+
+    def iter_load(self, platform, start_date, end_date, page_size=500):
+        """
+        Summary: This generator reads the cached reviews updated in the time period,
+                    newest first like the Gerrit REST API returns them.
+        Args:
+            platform (str): The platform of the reviews.
+            start_date (str): The start date of the time period ("YYYY-MM-DD").
+            end_date (str): The end date of the time period ("YYYY-MM-DD").
+            page_size (int, optional): Defaults to 500. The number of reviews per page.
+        Yields:
+            page (list): A list of cached reviews.
+        """
+        with closing(self.connect()) as connection:
+            cursor = connection.execute("""SELECT data FROM changes
+                                        WHERE platform = ? AND updated >= ? AND updated < ?
+                                        ORDER BY updated DESC""",
+                                        (platform, start_date, end_date))
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    break
+                yield [json.loads(data) for (data,) in rows]
+
+    def missing_ranges(self, platform, start_date, end_date):
+        """
+        Summary: This function finds the days in the time period that have not been
+                    crawled completely yet, and groups them into continuous ranges.
+        Args:
+            platform (str): The platform of the reviews.
+            start_date (str): The start date of the time period ("YYYY-MM-DD").
+            end_date (str): The end date of the time period ("YYYY-MM-DD").
+        Returns:
+            ranges (list): A list of (start_date, end_date) tuples.
+        """
+        with closing(self.connect()) as connection:
+            synced = {day for (day,) in connection.execute(
+                "SELECT day FROM synced_days WHERE platform = ? AND day >= ? AND day < ?",
+                (platform, start_date, end_date))}
+        ranges = []
+        for day, _ in reversed(split_date_range(start_date, end_date, 1)):
+            if day in synced:
+                continue
+            next_day = (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+            if ranges and ranges[-1][1] == day:
+                ranges[-1] = (ranges[-1][0], next_day)
+            else:
+                ranges.append((day, next_day))
+        return ranges
+
+    def mark_synced(self, platform, start_date, end_date, sync_time):
+        """
+        Summary: This function records that the days in the time period have been
+                    crawled completely. Days that were not over yet when the crawl
+                    started are not recorded, since they can still get new reviews.
+        Args:
+            platform (str): The platform of the reviews.
+            start_date (str): The start date of the time period ("YYYY-MM-DD").
+            end_date (str): The end date of the time period ("YYYY-MM-DD").
+            sync_time (datetime): The time (UTC) the crawl started.
+        """
+        today = sync_time.strftime("%Y-%m-%d")
+        days = [(platform, day) for day, _ in split_date_range(start_date, end_date, 1)
+                if day < today]
+        with closing(self.connect()) as connection, connection:
+            connection.executemany("INSERT OR IGNORE INTO synced_days VALUES (?, ?)", days)
+
+    def last_sync(self, platform):
+        """
+        Summary: This function returns when the platform was last synchronized.
+        Args:
+            platform (str): The platform of the reviews.
+        Returns:
+            if the platform has been synchronized before:
+                last_sync (datetime): The time (UTC) of the last synchronization.
+            if NOT:
+                None
+        """
+        with closing(self.connect()) as connection:
+            row = connection.execute("SELECT last_sync FROM sync_state WHERE platform = ?",
+                                     (platform,)).fetchone()
+        if row is None:
+            return None
+        return datetime.fromisoformat(row[0])
+
+    def set_last_sync(self, platform, sync_time):
+        """
+        Summary: This function records when the platform was last synchronized.
+        Args:
+            platform (str): The platform of the reviews.
+            sync_time (datetime): The time (UTC) the crawl started.
+        """
+        with closing(self.connect()) as connection, connection:
+            connection.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)",
+                               (platform, sync_time.isoformat()))
@@ -0,0 +1,521 @@
+"""
+    Creation and export of the graphs with matplotlib. Only the Figure API is used, so
+    nothing here depends on pyplot or on a GUI backend; the PDF files are rendered
+    with the Agg based backends of matplotlib.
+
+    The days are plotted on a real date axis, which places a few ticks whatever the
+    number of days, and series longer than the width of the figure are decimated
+    before they are plotted. When a graph is zoomed or panned, the visible part of the
+    series is decimated again to the width of the axes (level of detail), so a graph
+    of years of days stays fast to draw. The export can run in a thread or a pool of
+    processes, one chart per task.
+
+    The latency metrics (see gda.latency) have their own graphs: a histogram of the
+    time to merge, the turnaround percentiles per month, the backlog (the reviews opened
+    minus closed, among the reviews updated in the time period) and the reviews merged
+    per project.
+"""
+import os
+import threading
+import numpy as np
+from matplotlib import style
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.dates import AutoDateLocator, ConciseDateFormatter, date2num
+from matplotlib.figure import Figure
+
+
+# The graphs shown in the application: (tab text, PDF file name)
+CHARTS = [("Review Opened and Closed: ", "Rev_opened_closed.pdf"),
+          ("Reviews Opened: ", "Rev_opened.pdf"),
+          ("Reviews Closed: ", "Rev_closed.pdf"),
+          ("Active developers per month: ", "Dev_per_month.pdf"),
+          ("Time to merge: ", "Time_to_merge.pdf"),
+          ("Turnaround: ", "Turnaround.pdf"),
+          ("Backlog: ", "Backlog.pdf"),
+          ("Merged per project: ", "Throughput.pdf")]
+
+# The graphs (see gda.crawler.GRAPHS) shown by every chart, by PDF file name
+CHART_GRAPHS = {"Rev_opened_closed.pdf": ("opened", "closed"),
+                "Rev_opened.pdf": ("opened",),
+                "Rev_closed.pdf": ("closed",),
+                "Dev_per_month.pdf": ("developers",),
+                "Time_to_merge.pdf": ("merge_time",),
+                "Turnaround.pdf": ("turnaround",),
+                "Backlog.pdf": ("backlog",),
+                "Throughput.pdf": ("throughput",)}
+
+# The number of projects shown in the graph of the reviews merged per project, the
+# others are added up in one bar.
+TOP_PROJECTS = 20
+
+# The largest number of points plotted per line. The graphs are 1200 pixels wide, so
+# more points than this are not visible and only slow down the drawing.
+MAX_POINTS = 2400
+
+# The style is the same for every graph. It is applied once, when the module is
+# imported, instead of before every graph.
+style.use('classic')
+
+
+def create_figures(rev_opened, rev_closed, dev_per_month, latency=None):
+    """
+    Summary:
+        This function creates the graphs of an analysis, in the same order as CHARTS.
+    Args:
+        rev_opened (dict): The rev_opened (reviews opened) is a dictionary that contains
+                            days ("YYYY-MM-DD") as keys and the number of reviews opened
+                            in that day as values.
+        rev_closed (dict): The rev_closed (reviews closed) is a dictionary that contains
+                            days ("YYYY-MM-DD") as keys and the number of reviews closed
+                            in that day as values.
+        dev_per_month (dict): The dev_per_month (developers per month) is a ditionary that
+                            contains months ("YYYY-MM") as keys and the number of active
+                            developers in the month as values.
+        latency (dict, optional): Defaults to None. The latency metrics returned by
+                            LatencyAggregator.result(). If None, only the first four
+                            graphs are created.
+    Returns:
+        figures (list): A list of matplotlib.figure.Figure.
+    """
+    return [create_chart(args)
+            for args in chart_args(rev_opened, rev_closed, dev_per_month, latency)]
+
+
+def chart_args(rev_opened, rev_closed, dev_per_month, latency=None):
+    """
+    Summary:
+        This function prepares the arguments of the graphs, in the same order as CHARTS.
+        The days are turned into numpy.datetime64 dates.
+    Returns:
+        charts (list): A list of argument tuples of create_chart(). Without latency
+                        metrics, only the first four graphs.
+    """
+    rev_opened_timestamp, rev_opened_number = to_series(rev_opened)
+    rev_closed_timestamp, rev_closed_number = to_series(rev_closed)
+
+    # The Gerrit REST API start fom the end date and then makes it way to the start date.
+    # This is why we have to reverse the months and developers.
+    month = list(dev_per_month.keys())
+    devs = list(dev_per_month.values())
+    month.reverse()
+    devs.reverse()
+
+    charts = [(rev_opened_timestamp, rev_opened_number, "blue",
+               "Review Closed AND Opened", rev_closed_timestamp, rev_closed_number),
+              (rev_opened_timestamp, rev_opened_number, "blue", "Review Opened"),
+              (rev_closed_timestamp, rev_closed_number, "red", "Reviews Closed"),
+              (month, devs, "blue", "Developers per month", None, None, 1)]
+    if latency is None:
+        return charts
+    # The metrics of the graphs not asked for are missing.
+    return charts + [("merge_time", latency.get("time_to_merge", {}), "Time to merge"),
+                     ("turnaround", latency.get("turnaround", {}), "Turnaround per month"),
+                     ("backlog", latency.get("backlog", {}),
+                      "Reviews opened - closed, of the reviews updated in the period"),
+                     ("throughput", latency.get("throughput", {}), "Reviews merged per project")]
+
+
+def to_series(per_day):
+    """
+    Summary:
+        This function turns a dictionary of days into two arrays sorted by date.
+    Args:
+        per_day (dict): Days ("YYYY-MM-DD") as keys and numbers as values.
+    Returns:
+        (dates, values) (tuple): A numpy.datetime64 array and an integer array.
+    """
+    dates = np.array(list(per_day.keys()), dtype="datetime64[D]")
+    values = np.fromiter(per_day.values(), dtype=np.int64, count=len(per_day))
+    order = np.argsort(dates, kind="stable")
+    return dates[order], values[order]
+
+
+def decimate(x, y, max_points=MAX_POINTS):
+    """
+    Summary:
+        This function reduces a long series to at most max_points points. The series is
+        split into buckets of consecutive points and the lowest and the highest point
+        of every bucket are kept, so the peaks of the series are still drawn.
+    Args:
+        x (numpy.ndarray): The x values, sorted.
+        y (numpy.ndarray): The y values.
+        max_points (int, optional): Defaults to MAX_POINTS.
+    Returns:
+        (x, y) (tuple): The decimated series, or the series itself if it is short enough.
+    """
+    size = len(y)
+    if size <= max_points:
+        return x, y
+    bucket = -(-size // (max_points // 2))
+    buckets = -(-size // bucket)
+    # The last bucket is padded with its last value, which changes neither its lowest
+    # nor its highest point.
+    padded = np.concatenate([y, np.repeat(y[-1:], buckets * bucket - size)]).reshape(buckets, bucket)
+    offsets = np.arange(buckets) * bucket
+    lowest = np.minimum(padded.argmin(axis=1) + offsets, size - 1)
+    highest = np.minimum(padded.argmax(axis=1) + offsets, size - 1)
+    # The first and the last point are kept, so the decimated series spans the same dates.
+    indices = np.concatenate([[0], np.sort(np.stack([lowest, highest], axis=1), axis=1).ravel(),
+                              [size - 1]])
+    indices = indices[np.concatenate([[True], np.diff(indices) != 0])]
+    return x[indices], y[indices]
+
+
+def plot_series(ax, x, y, **kwargs):
+    """
+    Summary:
+        This function plots a long series with a level of detail. Only the lowest and the
+        highest point per pixel of the axes are plotted, and they are computed again for
+        the visible dates every time the x limits of the axes change (zoom, pan).
+    Args:
+        ax (matplotlib.axes.Axes): The axes.
+        x (numpy.ndarray): The dates, sorted.
+        y (numpy.ndarray): The values.
+        **kwargs: The keyword arguments of Axes.plot(), e.g. color and label.
+    Returns:
+        line (matplotlib.lines.Line2D)
+    """
+    numbers = date2num(x)
+
+    def visible(low=None, high=None):
+        start = 0 if low is None else max(0, np.searchsorted(numbers, low) - 1)
+        stop = len(x) if high is None else min(len(x), np.searchsorted(numbers, high, "right") + 1)
+        return decimate(x[start:stop], y[start:stop], 2 * max(1, int(ax.bbox.width)))
+
+    def update(ax):
+        line.set_data(*visible(*ax.get_xlim()))
+
+    line, = ax.plot(*visible(), **kwargs)
+    # The callback is a closure and not a bound method, which the callback registry
+    # would only keep a weak reference to.
+    ax.callbacks.connect("xlim_changed", update)
+    return line
+
+
+def export_charts(rev_opened, rev_closed, dev_per_month, latency=None,
+                  directory="Storage/PDF_Files", formats=("pdf",), executor=None, graphs=None):
+    """
+    Summary:
+        This function creates the graphs of an analysis and exports each of them,
+        without showing them. The graphs are drawn by the Agg backend, so this function
+        can run in any thread or process.
+    Args:
+        rev_opened (dict): The reviews opened per day.
+        rev_closed (dict): The reviews closed per day.
+        dev_per_month (dict): The active developers per month.
+        latency (dict, optional): Defaults to None. The latency metrics; if None, their
+                                    graphs are not exported.
+        directory (str, optional): Defaults to "Storage/PDF_Files". The directory the
+                                    files are written to.
+        formats (tuple, optional): Defaults to ("pdf",). The file formats, e.g. ("pdf", "png").
+        executor (concurrent.futures.Executor, optional): Defaults to None. If given, the
+                                    graphs are exported in parallel by the executor, e.g.
+                                    a ProcessPoolExecutor; otherwise one after the other.
+        graphs (tuple, optional): Defaults to None. Only the charts of these graphs are
+                                    exported (see CHART_GRAPHS); if None, every chart.
+    Returns:
+        paths (list): The paths of the files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tasks = []
+    for (_, file_name), args in zip(CHARTS, chart_args(rev_opened, rev_closed, dev_per_month,
+                                                        latency)):
+        if not shows(file_name, graphs):
+            continue
+        base = os.path.join(directory, os.path.splitext(file_name)[0])
+        tasks.append((args, base, formats))
+    if executor is None:
+        results = [export_chart(*task) for task in tasks]
+    else:
+        results = [future.result() for future in
+                   [executor.submit(export_chart, *task) for task in tasks]]
+    return [path for paths in results for path in paths]
+
+
+def shows(file_name, graphs=None):
+    """
+    Summary:
+        This function tells if a chart shows only graphs asked for.
+    Args:
+        file_name (str): The PDF file name of the chart, as in CHARTS.
+        graphs (tuple, optional): Defaults to None, every graph.
+    """
+    return graphs is None or set(CHART_GRAPHS[file_name]) <= set(graphs)
+
+
+def chart_names(formats=("pdf",), graphs=None):
+    """
+    Summary:
+        This function returns the names of the files export_charts() writes.
+    Args:
+        formats (tuple, optional): Defaults to ("pdf",). The file formats.
+        graphs (tuple, optional): Defaults to None. The graphs asked for; if None, every graph.
+    Returns:
+        names (list)
+    """
+    return [f"{os.path.splitext(file_name)[0]}.{file_format}" for _, file_name in CHARTS
+            if shows(file_name, graphs) for file_format in formats]
+
+
+def export_chart(args, base, formats):
+    """
+    Summary:
+        This function creates one graph and saves it in every format.
+    Args:
+        args (tuple): The arguments of create_chart().
+        base (str): The path of the files without the extension.
+        formats (tuple): The file formats.
+    Returns:
+        paths (list): The paths of the files.
+    """
+    fig = create_chart(args)
+    FigureCanvasAgg(fig)
+    paths = []
+    for file_format in formats:
+        path = f"{base}.{file_format}"
+        fig.savefig(path, format=file_format)
+        paths.append(path)
+    return paths
+
+
+def export_in_background(rev_opened, rev_closed, dev_per_month, latency=None,
+                         directory="Storage/PDF_Files", formats=("pdf",), done=None):
+    """
+    Summary:
+        This function runs export_charts() in a daemon thread, so that the caller, e.g.
+        the Tkinter main loop, is not blocked while the files are written.
+    Args:
+        done (callable, optional): Defaults to None. Called in the thread with the paths
+                                    of the files once they are written.
+    Returns:
+        thread (threading.Thread): The thread exporting the graphs.
+    """
+    def export():
+        paths = export_charts(rev_opened, rev_closed, dev_per_month, latency, directory, formats)
+        if done is not None:
+            done(paths)
+
+    thread = threading.Thread(target=export, daemon=True)
+    thread.start()
+    return thread
+
+
+def create_chart(args, fig=None):
+    """
+    Summary:
+        This function creates the graph of one entry of chart_args(). The graphs of the
+        latency metrics start with the name of their kind, e.g. "backlog", and are
+        created by create_latency_figure(); the others by create_figure().
+    Args:
+        args (tuple): An entry of chart_args().
+        fig (matplotlib.figure.Figure, optional): Defaults to None. A figure to draw the graph
+                                    on again; otherwise a new one.
+    Returns:
+        matplotlib.figure.Figure
+    """
+    if isinstance(args[0], str):
+        return create_latency_figure(*args, fig=fig)
+    return create_figure(*args, fig=fig)
+
+
+def create_figure(x1_labels, y1_labels, color, title, x2_labels=None, y2_labels=None, pie_chart=None,
+                  fig=None):
+    """
+    Summary:
+        This function creates a graph. The type of the graph is base on the args sent
+        to the function. The function creates two different types of graphs, plot or
+        pie char. If the pie_chart is None, then it means the the function is ceating
+        just a plot. But if the pie_chart is not None then, the function creates a pie chart. 
+        The function can also create a plot for two types of data
+        (reviews opened + reviews closed in the same plot). This only works if x2_labels and y2_labels is
+        not None.
+    Args:
+        x1_labels (list): This is a list that contains all the labels for the x axis. These labels
+                    are dates (numpy.datetime64), or months "YYYY-MM" for the pie chart.
+        y1_labels (list): This is a list than contains all the labels for the y axis. These labels
+                    are integers. 
+        color (str): This indicates the color of the plot
+        title (str): This indictes the title of the graph
+        x2_labels (list, optional): Defaults to None. This is a list that contains all the labels
+                            for the x axis. These labels are dates (numpy.datetime64).
+        y2_labels (list, optional): Defaults to None. This is a list than contains all the labels for 
+                            the y axis. These labels are integers. 
+        pie_chart (int, optional): Defaults to None. This is use to indicate if the graphs
+                                    is a plot or a pie chart.
+        fig (matplotlib.figure.Figure, optional): Defaults to None. A figure to draw the graph
+                                    on again, e.g. the one already shown; otherwise a new one.
+    Returns:
+        matplotlib.figure.Figure
+    """
+    if fig is None:
+        fig = Figure(figsize=(12, 6), dpi=100)
+    else:
+        fig.clear()
+    ax = fig.add_subplot(111)
+    ax.set_title(title)
+
+    # The series of a time period without reviews are empty.
+    empty = len(y1_labels) == 0 and (y2_labels is None or len(y2_labels) == 0)
+
+    if pie_chart is None and empty:
+        ax.set_title(f"{title}: no reviews", fontsize=20)
+
+    ############### Two graphs in one plot ##################
+    elif x2_labels is not None and y2_labels is not None and pie_chart is None:
+        plot_series(ax, x1_labels, y1_labels, color="blue", label="Reviews Opened")
+        plot_series(ax, x2_labels, y2_labels, color="red", label="Reviews Closed")
+        ax.legend()
+        ax.grid(which='major', axis='both', linestyle='--', linewidth=1,
+                color='#cfcfcf', alpha=0.2)
+        # Only one of the series can be empty, e.g. when no review was closed.
+        first_day = min(labels[0] for labels in (x1_labels, x2_labels) if len(labels))
+        ax.axvline(x=first_day, color='black', linestyle='-', linewidth=1)
+        ax.set_facecolor('#a6a4a4')
+
+    ################ Developers per month #####################
+    elif pie_chart is not None and sum(y1_labels) == 0:
+        ax.set_title('Total Active Developers: 0', fontsize=20)
+
+    elif pie_chart is not None:
+        total_active_developers = sum(y1_labels)
+        percentages = [(developers / total_active_developers) * 100 for developers in y1_labels]
+        labels = x1_labels
+        sizes = percentages
+
+        colors = [(0.12156862745098039, 0.4666666666666667, 0.7058823529411765, 1.0),
+                  (0.6823529411764706, 0.7803921568627451, 0.9098039215686274, 1.0),
+                  (1.0, 0.7333333333333333, 0.47058823529411764, 1.0),
+                  (0.596078431372549, 0.8745098039215686, 0.5411764705882353, 1.0),
+                  (1.0, 0.596078431372549, 0.5882352941176471, 1.0),
+                  (0.7725490196078432, 0.6901960784313725, 0.8352941176470589, 1.0),
+                  (0.5490196078431373, 0.33725490196078434, 0.29411764705882354, 1.0),
+                  (0.8901960784313725, 0.4666666666666667, 0.7607843137254902, 1.0),
+                  (0.4980392156862745, 0.4980392156862745, 0.4980392156862745, 1.0),
+                  (0.7372549019607844, 0.7411764705882353, 0.13333333333333333, 1.0),
+                  (0.09019607843137255, 0.7450980392156863, 0.8117647058823529, 1.0),
+                  (0.6196078431372549, 0.8549019607843137, 0.8980392156862745, 1.0)]
+
+        _, _, autopcts = ax.pie(sizes, colors=colors, labels=labels, startangle=90,
+                        autopct=lambda pct: f'{pct:.1f}% ({int(round(pct*total_active_developers/100))})',
+                        textprops={'fontsize': 14})
+
+        ax.set_title(f'Total Active Developers: {total_active_developers}', fontsize=20)
+        for autopct in autopcts:
+            autopct.set_fontsize(14)
+
+    ################## Just one graph #########################
+    else:
+        max_y_value = max(y1_labels)
+        if max_y_value < 50:
+            ax.set_ylim(0, max_y_value + 1)
+        plot_series(ax, x1_labels, y1_labels, color=color, label="Reviews Opened")
+        ax.grid(which='major', axis='both', linestyle='--', linewidth=1,
+                color='#cfcfcf', alpha=0.2)
+        ax.axvline(x=x1_labels[0], color='black', linestyle='-', linewidth=1)
+        ax.set_facecolor('#a6a4a4')
+
+    ################# Date ticks of the x axis ####################
+    # A few ticks are placed whatever the number of days, labelled concisely.
+    if pie_chart is None and not empty:
+        locator = AutoDateLocator(minticks=3, maxticks=12)
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+    fig.subplots_adjust(left=0.05, right=0.95, bottom=0.1, top=0.9, wspace=0.4, hspace=0.4)
+
+    ax.spines['top'].set_color('#7d7a7a')
+    ax.spines['right'].set_color('#7d7a7a')
+
+    return fig
+
+
+def format_hours(hours):
+    """
+    Summary:
+        This function formats a duration in hours, or in days if it is longer than two days.
+    """
+    if hours is None:
+        return "-"
+    if hours < 48:
+        return f"{hours:.1f} h"
+    return f"{hours / 24:.1f} d"
+
+
+def create_latency_figure(kind, values, title, fig=None):
+    """
+    Summary:
+        This function creates a graph of the latency metrics (see gda.latency).
+    Args:
+        kind (str): "merge_time", "turnaround", "backlog" or "throughput".
+        values (dict): The metric, from LatencyAggregator.result().
+        title (str): The title of the graph.
+        fig (matplotlib.figure.Figure, optional): Defaults to None. A figure to draw the graph
+                                    on again; otherwise a new one.
+    Returns:
+        matplotlib.figure.Figure
+    """
+    if fig is None:
+        fig = Figure(figsize=(12, 6), dpi=100)
+    else:
+        fig.clear()
+    ax = fig.add_subplot(111)
+    ax.set_title(title)
+
+    ############### Histogram of the time to merge ##################
+    if kind == "merge_time":
+        if values.get("count"):
+            labels = [label for label, _ in values["histogram"]]
+            counts = [count for _, count in values["histogram"]]
+            ax.bar(range(len(counts)), counts, color="blue")
+            ax.set_xticks(range(len(labels)))
+            ax.set_xticklabels(labels)
+            ax.set_xlim(-0.5, len(labels) - 0.5)
+        ax.set_title(f"{title}: median {format_hours(values.get('p50'))}, "
+                     f"90% {format_hours(values.get('p90'))}, 99% {format_hours(values.get('p99'))} "
+                     f"({values.get('count', 0)} reviews merged)")
+
+    ############### Turnaround percentiles per month ################
+    elif kind == "turnaround" and values:
+        months = np.array(list(values.keys())[::-1], dtype="datetime64[M]")
+        for percentile, color in (("p50", "blue"), ("p90", "red"), ("p99", "black")):
+            days = [values[month][percentile] / 24 for month in reversed(values)]
+            ax.plot(months, days, color=color, marker="o", label=f"{percentile[1:]}th percentile")
+        ax.set_ylabel("Days from creation to merge or abandon")
+        ax.legend()
+
+    ################# Backlog per day ####################
+    elif kind == "backlog" and values:
+        days, net = to_series(values)
+        plot_series(ax, days, net, color="blue", label="Reviews opened - closed")
+        ax.axvline(x=days[0], color='black', linestyle='-', linewidth=1)
+
+    ############### Reviews merged per project ################
+    elif kind == "throughput" and values:
+        projects = list(values)[:TOP_PROJECTS]
+        merged = [values[project] for project in projects]
+        others = sum(values.values()) - sum(merged)
+        if others:
+            projects.append(f"{len(values) - TOP_PROJECTS} other projects")
+            merged.append(others)
+        # The project that merged the most is at the top.
+        ax.barh(range(len(projects))[::-1], merged, color="blue")
+        ax.set_yticks(range(len(projects))[::-1])
+        ax.set_yticklabels(projects, fontsize=9)
+        ax.set_ylim(-0.5, len(projects) - 0.5)
+        ax.set_xlabel("Reviews merged")
+        ax.set_title(f"{title}: {sum(values.values())} in {len(values)} projects")
+
+    else:
+        ax.set_title(f"{title}: no reviews", fontsize=20)
+
+    if kind in ("turnaround", "backlog") and values:
+        locator = AutoDateLocator(minticks=3, maxticks=12)
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+    ax.grid(which='major', axis='both', linestyle='--', linewidth=1, color='#cfcfcf', alpha=0.2)
+    ax.set_facecolor('#a6a4a4')
+    left = 0.2 if kind == "throughput" else 0.05
+    fig.subplots_adjust(left=left, right=0.95, bottom=0.1, top=0.9)
+    ax.spines['top'].set_color('#7d7a7a')
+    ax.spines['right'].set_color('#7d7a7a')
+
+    return fig
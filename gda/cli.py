@@ -0,0 +1,474 @@
+"""
+    Headless command line interface of GerritDataAnalyzer.
+
+    Examples:
+        python -m gda crawl --platform OpenStack --from 2022-01-01 --to 2022-03-31
+        python -m gda crawl --platform Android --platform Chromium \
+                            --range 2022-01-01:2022-03-31 --range 2022-04-01:2022-06-30
+        python -m gda crawl --jobs nightly.json
+        python -m gda serve --port 8080
+
+    A jobs file is a JSON list of {"platform": ..., "from": ..., "to": ...} objects.
+    Every job writes its graphs (PDF files) to <output-dir>/<platform>_<from>_<to>/.
+    The platforms are read from platforms.json (see gda.platforms); different platforms
+    are crawled at the same time, the jobs of one platform one after the other.
+    The crawled reviews are appended to the review store (see gda.storage), which
+    --compact rewrites with every review once. The service answers the analyses over
+    HTTP (see gda.service).
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from .cache import ChangeCache
+from .crawler import GRAPHS, CodeReviewData
+from .decoding import AGGREGATION_FIELDS, BACKENDS, PageDecoder
+from .http import GerritClient
+from .metrics import STAGES, Metrics
+from .platforms import load_platforms
+from .results import ResultCache
+from .service import AnalyticsService
+from .sharding import analyze_sharded
+from .storage import ReviewStore
+
+
+def parse_date(value):
+    """
+    Summary: argparse type for dates in the format "YYYY-MM-DD".
+    """
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        raise argparse.ArgumentTypeError(f"expected a date in the format YYYY-MM-DD, got {value!r}")
+    return value
+
+
+def parse_range(value):
+    """
+    Summary: argparse type for time periods in the format "YYYY-MM-DD:YYYY-MM-DD".
+    """
+    start_date, _, end_date = value.partition(":")
+    return parse_date(start_date), parse_date(end_date)
+
+
+def build_parser():
+    """
+    Summary: This function creates the parser of the command line arguments.
+    Returns:
+        argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(prog="python -m gda",
+                                     description="Crawl, filter and export Gerrit code review data.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    # The options of the crawl and of the service.
+    shared = argparse.ArgumentParser(add_help=False)
+    shared.add_argument("--platforms", dest="platforms_config",
+                        help="JSON config file of the Gerrit servers (default: platforms.json if "
+                             "it exists, otherwise Android, OpenStack and Chromium)")
+    shared.add_argument("--cache", default="Storage/cache.db",
+                        help="SQLite cache of the crawled reviews (default: %(default)s)")
+    shared.add_argument("--no-cache", action="store_true", help="do not use the cache")
+    shared.add_argument("--store", default="Storage/reviews",
+                        help="directory the crawled reviews are appended to (default: %(default)s)")
+    shared.add_argument("--no-store", action="store_true", help="do not store the crawled reviews")
+    shared.add_argument("--result-cache", default="Storage/results",
+                        help="directory of the cache of whole analyses, filtered data and "
+                             "graphs (default: %(default)s)")
+    shared.add_argument("--no-result-cache", action="store_true",
+                        help="always crawl and draw again, even if the same analysis is cached")
+    shared.add_argument("--result-cache-size", type=float, default=200,
+                        help="size limit of the result cache in MB (default: %(default)s)")
+    shared.add_argument("--result-ttl", type=float, default=900,
+                        help="seconds a cached analysis of a time period reaching today is "
+                             "used (default: %(default)s)")
+    shared.add_argument("--concurrency", type=int, default=8,
+                        help="number of windows crawled at the same time (default: %(default)s)")
+    shared.add_argument("--window-days", type=int, default=7,
+                        help="number of days per crawled window (default: %(default)s)")
+    shared.add_argument("--requests-per-second", type=float, default=10,
+                        help="maximum requests per second to one host, 0 for no limit; the "
+                             "platforms config can set its own limit per host (default: %(default)s)")
+    shared.add_argument("--timeout", type=float, default=30,
+                        help="seconds to wait for a Gerrit server before retrying (default: %(default)s)")
+    shared.add_argument("--max-retries", type=int, default=5,
+                        help="retries of a failed request before giving up (default: %(default)s)")
+    shared.add_argument("--json-backend", choices=("auto",) + BACKENDS, default="auto",
+                        help="JSON library used to decode the pages (default: %(default)s)")
+    shared.add_argument("--minimal", action="store_true",
+                        help="keep only the fields the graphs use (id, project, created, updated, "
+                             "submitted, status, owner, submitter) in the store and in the cache; "
+                             "makes them smaller, not the decoding faster")
+    shared.add_argument("--developer-error", type=float, metavar="ERROR",
+                        help="count the active developers per month approximately, with this "
+                             "relative standard error (e.g. 0.01), in fixed memory per month; "
+                             "needs --no-cache")
+
+    crawl = commands.add_parser("crawl", parents=[shared],
+                                help="crawl one or more platforms and time periods")
+    crawl.add_argument("--platform", action="append", default=[],
+                       help="platform to crawl, by its name in the platforms config; can be repeated")
+    crawl.add_argument("--from", dest="start_date", type=parse_date,
+                       help="start date of the time period (YYYY-MM-DD)")
+    crawl.add_argument("--to", dest="end_date", type=parse_date,
+                       help="end date of the time period (YYYY-MM-DD)")
+    crawl.add_argument("--range", dest="ranges", action="append", default=[], type=parse_range,
+                       metavar="FROM:TO", help="time period to crawl; can be repeated")
+    crawl.add_argument("--jobs", help="JSON file with a list of {platform, from, to} jobs")
+    crawl.add_argument("--parallel", type=int, default=4,
+                       help="number of platforms crawled at the same time (default: %(default)s)")
+    crawl.add_argument("--output-dir", default="Storage/Reports",
+                       help="directory the results are written to (default: %(default)s)")
+    crawl.add_argument("--processes", type=int, default=1,
+                       help="split every time period into months crawled and filtered by this "
+                            "many processes; use it for long time periods (default: %(default)s)")
+    crawl.add_argument("--graphs", nargs="+", choices=GRAPHS, default=list(GRAPHS),
+                       help="graphs to export; with --no-cache, only the reviews they need are "
+                            "asked for, e.g. status:closed for closed (default: all)")
+    crawl.add_argument("--no-charts", action="store_true", help="do not export the PDF graphs")
+    crawl.add_argument("--compact", action="store_true",
+                       help="after the jobs of a platform, rewrite its files in the review store "
+                            "so that every review is stored once, in its latest version")
+    crawl.add_argument("--chart-format", dest="chart_formats", action="append",
+                       choices=("pdf", "png", "svg"),
+                       help="file format of the graphs; can be repeated (default: pdf)")
+    crawl.add_argument("--render-processes", type=int, default=1,
+                       help="number of processes drawing the graphs of a job at the same "
+                            "time (default: %(default)s)")
+    crawl.add_argument("--metrics-report", metavar="FILE",
+                       help="write the time of every stage and the latency histogram of every "
+                            "host to this JSON file")
+    crawl.add_argument("--metrics-port", type=int, metavar="PORT",
+                       help="serve the metrics in the Prometheus text format on "
+                            "http://127.0.0.1:PORT/metrics while the jobs run")
+    crawl.add_argument("--profile", action="append", default=[], choices=STAGES + ("all",),
+                       help="profile a stage with cProfile; can be repeated")
+    crawl.add_argument("--profile-dir", default="Storage/Profiles",
+                       help="directory the profiles (<stage>.prof) are written to "
+                            "(default: %(default)s)")
+
+    serve = commands.add_parser("serve", parents=[shared],
+                                help="answer the analyses over HTTP as JSON, refreshed in the background")
+    serve.add_argument("--host", default="127.0.0.1",
+                       help="address the service listens on (default: %(default)s)")
+    serve.add_argument("--port", type=int, default=8080,
+                       help="port the service listens on (default: %(default)s)")
+    serve.add_argument("--platform", action="append", default=[],
+                       help="platform refreshed in the background; can be repeated (default: all)")
+    serve.add_argument("--refresh-interval", type=float, default=900,
+                       help="seconds between two refreshes of the analyses reaching today, 0 for "
+                            "none (default: %(default)s)")
+    serve.add_argument("--refresh-days", type=int, default=30,
+                       help="days up to today refreshed for every platform, and answered without "
+                            "from and to (default: %(default)s)")
+    serve.add_argument("--max-entries", type=int, default=256,
+                       help="number of answers kept in memory (default: %(default)s)")
+    return parser
+
+
+def get_jobs(args, parser):
+    """
+    Summary: This function collects the jobs from the command line arguments. Every
+                platform is crawled for every time period, and the jobs of the jobs
+                file are added after them.
+    Returns:
+        jobs (list): A list of (platform, start_date, end_date) tuples.
+    """
+    ranges = list(args.ranges)
+    if args.start_date or args.end_date:
+        if not (args.start_date and args.end_date):
+            parser.error("--from and --to must be used together")
+        ranges.insert(0, (args.start_date, args.end_date))
+    if args.platform and not ranges:
+        parser.error("a time period is needed (--from/--to or --range)")
+    if ranges and not args.platform:
+        parser.error("a platform is needed (--platform)")
+    jobs = [(platform, start_date, end_date)
+            for platform in args.platform for start_date, end_date in ranges]
+
+    if args.jobs:
+        try:
+            with open(args.jobs) as infile:
+                entries = json.load(infile)
+        except (OSError, ValueError) as error:
+            parser.error(f"can not read the jobs file {args.jobs}: {error}")
+        if not isinstance(entries, list):
+            parser.error(f"the jobs file {args.jobs} must contain a list of jobs")
+        for number, job in enumerate(entries, 1):
+            if not isinstance(job, dict) or not {"platform", "from", "to"} <= job.keys():
+                parser.error(f"job {number} of {args.jobs} must have a platform, from and to, "
+                             f"got {job!r}")
+            try:
+                jobs.append((job["platform"], parse_date(job["from"]), parse_date(job["to"])))
+            except argparse.ArgumentTypeError as error:
+                parser.error(f"job {number} of {args.jobs}: {error}")
+    if not jobs:
+        parser.error("nothing to crawl; use --platform with --from/--to or --range, or --jobs")
+    for _, start_date, end_date in jobs:
+        if start_date >= end_date:
+            parser.error(f"the start date {start_date} is not before the end date {end_date}")
+    return jobs
+
+
+def run_job(reviews, platform, start_date, end_date, output_dir, charts=True, processes=1,
+            formats=("pdf",), renderer=None, results=None):
+    """
+    Summary: This function crawls and filters one platform and time period and exports
+                its graphs to its own directory. With more than one process, the time
+                period is split into shards crawled by a pool of processes. With a
+                renderer (a pool of processes), the graphs are drawn in parallel. With a
+                result cache, a cached analysis is copied instead.
+    Returns:
+        if successful:
+            True
+        if NOT successful:
+            False: If there was a problem while crawling data.
+    """
+    directory = os.path.join(output_dir, f"{platform}_{start_date}_{end_date}")
+    names = []
+    if charts:
+        # matplotlib takes most of the startup time, so it is only imported when graphs
+        # are exported.
+        from .charts import chart_names, export_charts
+        names = chart_names(formats, reviews.graphs)
+    cached = key = None
+    if results is not None:
+        key = results.key(reviews.get_platform(platform), start_date, end_date,
+                          graphs=reviews.graphs, developer_error=reviews.developer_error)
+        cached = results.get(key)
+        if cached is not None and results.copy_charts(cached[1], directory, names) is not None:
+            return True
+
+    if cached is not None:
+        # The data is cached but not the graphs in these formats.
+        returned_data = cached[0]
+    elif processes > 1:
+        returned_data = analyze_sharded(reviews, start_date, end_date, platform, processes)
+    else:
+        returned_data = reviews.analyze(start_date, end_date, platform)
+    if returned_data == 0:
+        return False
+    paths = []
+    if charts:
+        with reviews.metrics.stage("export"):
+            paths = export_charts(*returned_data, directory=directory, formats=formats,
+                                  executor=renderer, graphs=reviews.graphs)
+    if results is not None:
+        if cached is not None:
+            # Keep the graphs cached in other formats.
+            new = {os.path.basename(path) for path in paths}
+            paths += [path for name, path in cached[1].items() if name not in new]
+        results.put(key, returned_data, end_date, paths)
+    return True
+
+
+def run_platform_jobs(reviews, jobs, args, renderer=None, results=None):
+    """
+    Summary: This function runs the jobs of one platform one after the other, since
+                they share the cache state of the platform. A job that fails is
+                reported and the next jobs still run.
+    Returns:
+        failed (int): The number of jobs that failed.
+    """
+    failed = 0
+    for platform, start_date, end_date in jobs:
+        start = time.perf_counter()
+        try:
+            done = run_job(reviews, platform, start_date, end_date, args.output_dir,
+                           charts=not args.no_charts, processes=args.processes,
+                           formats=tuple(args.chart_formats or ("pdf",)), renderer=renderer,
+                           results=results)
+        except Exception as error:
+            failed += 1
+            print(f"{platform} {start_date}..{end_date}: {type(error).__name__}: {error}")
+            continue
+        if done:
+            print(f"{platform} {start_date}..{end_date}: done in {time.perf_counter() - start:.1f} s")
+        else:
+            failed += 1
+            print(f"{platform} {start_date}..{end_date}: APIError: there was an issue with the API")
+    return failed
+
+
+def format_stats(stats, reviews=None):
+    """
+    Summary: This function formats a summary of RequestStats as one line.
+    Args:
+        stats (dict): The summary.
+        reviews (int, optional): Defaults to None. The number of reviews received, to
+                                show the bytes received per review.
+    """
+    line = (f"{stats['requests']} requests ({stats['retries']} retried), "
+            f"{stats['wire_bytes'] / 1e6:.1f} MB received ({stats['body_bytes'] / 1e6:.1f} MB "
+            f"decompressed), latency p50 {stats['latency_p50']:.2f} s, "
+            f"p95 {stats['latency_p95']:.2f} s")
+    if reviews:
+        line += (f", {reviews} reviews, {stats['wire_bytes'] / reviews:.0f} bytes per review "
+                 f"({stats['body_bytes'] / reviews:.0f} decompressed)")
+    return line
+
+
+def format_stages(report):
+    """
+    Summary: This function formats the time of every stage of a Metrics report as one line.
+    """
+    parts = []
+    for name, totals in sorted(report["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        part = f"{name} {totals['seconds']:.1f} s"
+        if totals["items_per_second"]:
+            part += f" ({totals['items_per_second']:,.0f} reviews/s)"
+        parts.append(part)
+    return ", ".join(parts)
+
+
+def load_config(args, parser, names):
+    """
+    Summary: This function reads the platforms config and checks the platforms asked for.
+    Args:
+        names (iterable): The names of the platforms asked for.
+    Returns:
+        platforms (dict)
+    """
+    if args.developer_error is not None and not 0 < args.developer_error < 1:
+        parser.error("--developer-error must be between 0 and 1")
+    if args.developer_error is not None and not args.no_cache:
+        parser.error("--developer-error needs --no-cache; with the cache the active developers "
+                     "are counted exactly from its rollup tables")
+    try:
+        platforms = load_platforms(args.platforms_config)
+    except (OSError, ValueError) as error:
+        parser.error(f"can not read the platforms config: {error}")
+    unknown = sorted(set(names) - set(platforms))
+    if unknown:
+        parser.error(f"unknown platform {', '.join(unknown)}; choose from {', '.join(platforms)}")
+    return platforms
+
+
+def build_reviews(args, parser, platforms, metrics, graphs=GRAPHS):
+    """
+    Summary: This function creates the CodeReviewData of the options shared by the
+                crawl and the service, and the result cache.
+    Returns:
+        (reviews, results) (tuple): The CodeReviewData, and the ResultCache or None.
+    """
+    cache = None
+    if not args.no_cache:
+        os.makedirs(os.path.dirname(args.cache) or ".", exist_ok=True)
+        cache = ChangeCache(args.cache)
+    client = GerritClient(timeout=args.timeout, max_retries=args.max_retries,
+                          requests_per_second=args.requests_per_second,
+                          pool_size=max(16, args.concurrency))
+    try:
+        decoder = PageDecoder(args.json_backend, AGGREGATION_FIELDS if args.minimal else None)
+    except ValueError as error:
+        parser.error(str(error))
+    store = None if args.no_store else ReviewStore(args.store)
+    reviews = CodeReviewData(concurrency=args.concurrency, window_days=args.window_days,
+                             cache=cache, client=client, decoder=decoder, store=store,
+                             platforms=platforms, developer_error=args.developer_error,
+                             metrics=metrics, graphs=graphs)
+    results = None
+    if not args.no_result_cache:
+        results = ResultCache(args.result_cache, max_bytes=int(args.result_cache_size * 10 ** 6),
+                              ttl=args.result_ttl)
+    return reviews, results
+
+
+def serve(args, parser):
+    """
+    Summary: This function runs the HTTP service (see gda.service) until it is
+                interrupted with Ctrl+C.
+    Returns:
+        exit_code (int)
+    """
+    platforms = load_config(args, parser, args.platform)
+    reviews, results = build_reviews(args, parser, platforms, Metrics())
+    service = AnalyticsService(reviews, results, refresh_interval=args.refresh_interval,
+                               refresh_days=args.refresh_days,
+                               refresh_platforms=args.platform or None,
+                               max_entries=args.max_entries)
+
+    def ready(port):
+        print(f"Serving on http://{args.host}:{port}/metrics", flush=True)
+
+    try:
+        asyncio.run(service.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv=None):
+    """
+    Summary: This function is the entry point of "python -m gda".
+    Returns:
+        exit_code (int): 0 if every job succeeded, 1 otherwise.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        return serve(args, parser)
+    jobs = get_jobs(args, parser)
+    if args.compact and args.no_store:
+        parser.error("--compact needs the review store; remove --no-store")
+    platforms = load_config(args, parser, {platform for platform, _, _ in jobs})
+    metrics = Metrics(profile=args.profile)
+    reviews, results = build_reviews(args, parser, platforms, metrics, args.graphs)
+    client = reviews.client
+    metrics_server = None
+    if args.metrics_port is not None:
+        metrics_server = metrics.serve(args.metrics_port, client.stats)
+
+    jobs_per_platform = {}
+    for job in jobs:
+        jobs_per_platform.setdefault(job[0], []).append(job)
+    timings = {}
+
+    def run_platform(platform):
+        start = time.perf_counter()
+        failed = run_platform_jobs(reviews, jobs_per_platform[platform], args, renderer, results)
+        if args.compact:
+            try:
+                with metrics.stage("compact"):
+                    reviews.store.compact(platform)
+                print(f"{platform}: review store compacted")
+            except Exception as error:
+                failed += 1
+                print(f"{platform}: compacting the review store failed: "
+                      f"{type(error).__name__}: {error}")
+        timings[platform] = time.perf_counter() - start
+        return failed
+
+    renderer = None
+    if args.render_processes > 1 and not args.no_charts:
+        renderer = ProcessPoolExecutor(max_workers=args.render_processes)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+            failed = sum(executor.map(run_platform, jobs_per_platform))
+    finally:
+        if renderer is not None:
+            renderer.shutdown()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+    for platform in jobs_per_platform:
+        stats = client.stats.summary(platforms[platform].host)
+        line = f"{platform}: {timings[platform]:.1f} s"
+        if stats["requests"]:
+            line += ", " + format_stats(stats)
+        print(line)
+    stats = client.stats.summary()
+    report = metrics.report(client.stats)
+    if stats["requests"]:
+        print("HTTP: " + format_stats(stats, report["stages"].get("decode", {}).get("items")))
+    if report["stages"]:
+        print("Stages: " + format_stages(report))
+    if args.metrics_report:
+        metrics.write_report(args.metrics_report, client.stats)
+    if args.profile:
+        for path in metrics.write_profiles(args.profile_dir):
+            print(f"Profile written to {path}")
+    return 1 if failed else 0
@@ -0,0 +1,605 @@
+"""
+    Crawling of code review data through the Gerrit REST API.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+from .aggregate import make_aggregator
+from .decoding import PageDecoder
+from .errors import CrawlCancelled, CrawlError
+from .http import GerritClient
+from .latency import LATENCY_GRAPHS, LatencyAggregator
+from .metrics import Metrics
+from .platforms import load_platforms
+
+
+# The graphs that can be asked for. The reviews opened are the reviews with the status
+# NEW, the reviews closed are merged or abandoned, and the active developers are counted
+# from every review. The latency metrics (see gda.latency) need the reviews closed, and
+# the backlog (reviews opened minus closed) every review.
+GRAPHS = ("opened", "closed", "developers") + LATENCY_GRAPHS
+CLOSED_GRAPHS = {"closed", "merge_time", "turnaround", "throughput"}
+
+
+def status_query(graphs):
+    """
+    Summary: This function returns the status search term that asks the server only for
+                the reviews the graphs need.
+    Args:
+        graphs (iterable): Some of GRAPHS.
+    Returns:
+        term (str): "status:open", "status:closed", or "" if every review is needed.
+    """
+    graphs = set(graphs)
+    if graphs == {"opened"}:
+        return "status:open"
+    if graphs and graphs <= CLOSED_GRAPHS:
+        return "status:closed"
+    return ""
+
+
+def split_date_range(start_date, end_date, window_days):
+    """
+    Summary: This function splits the time period into smaller windows that can be
+                crawled independently of each other. The newest window comes first,
+                in the same order as the Gerrit REST API returns the reviews.
+    Args:
+        start_date (str): The start date of the time period ("YYYY-MM-DD").
+        end_date (str): The end date of the time period ("YYYY-MM-DD").
+        window_days (int): The number of days in each window.
+    Returns:
+        windows (list): A list of (start_date, end_date) tuples.
+    """
+    first = datetime.strptime(start_date, "%Y-%m-%d")
+    last = datetime.strptime(end_date, "%Y-%m-%d")
+    step = timedelta(days=max(1, window_days))
+    windows = []
+    while last > first:
+        window_start = max(first, last - step)
+        windows.append((window_start.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d")))
+        last = window_start
+    return windows
+
+
+def subtract_ranges(start_date, end_date, ranges):
+    """
+    Summary: This function returns the parts of the time period that are not covered
+                by any of the ranges.
+    Args:
+        start_date (str): The start date of the time period ("YYYY-MM-DD").
+        end_date (str): The end date of the time period ("YYYY-MM-DD").
+        ranges (list): A list of (start_date, end_date) tuples.
+    Returns:
+        uncovered (list): A list of (start_date, end_date) tuples, oldest first.
+    """
+    uncovered = []
+    cursor = start_date
+    for range_start, range_end in sorted(ranges):
+        if range_start > cursor:
+            uncovered.append((cursor, min(range_start, end_date)))
+        cursor = max(cursor, range_end)
+        if cursor >= end_date:
+            return uncovered
+    uncovered.append((cursor, end_date))
+    return uncovered
+
+
+def with_latency(returned_data, latency):
+    """
+    Summary: This function adds the latency metrics to the filtered data.
+    Args:
+        returned_data (list): [reviews_opened, reviews_closed, developers_per_month]
+        latency (LatencyAggregator): The latency metrics, or None if no latency graph
+                                    is needed.
+    Returns:
+        returned_data (list): [reviews_opened, reviews_closed, developers_per_month,
+                            latency], latency is {} if no latency graph is needed.
+    """
+    return returned_data + [latency.result() if latency is not None else {}]
+
+
+class CrawlProgress:
+    """
+        This class keeps track of the progress of a crawl: pages and reviews fetched and
+        windows crawled so far. The callback is called (from the crawling thread) every
+        time the progress changes, and cancel() can be called from any thread to stop
+        the crawl.
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.cancel_event = threading.Event()
+        self.started = time.monotonic()
+        self.pages = 0
+        self.changes = 0
+        self.windows_done = 0
+        self.windows_total = 0
+
+    def cancel(self):
+        """
+        Summary: This function asks the crawl to stop as soon as possible.
+        """
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def eta(self):
+        """
+        Summary: This function estimates the time left, based on how long the windows
+                    crawled so far have taken.
+        Returns:
+            if it can be estimated:
+                seconds (float): The estimated number of seconds left.
+            if NOT:
+                None: No window has been crawled yet.
+        """
+        if self.windows_done == 0:
+            return None
+        elapsed = time.monotonic() - self.started
+        return elapsed * (self.windows_total - self.windows_done) / self.windows_done
+
+    def add_windows(self, number):
+        self.windows_total += number
+        self.notify()
+
+    def window_done(self):
+        self.windows_done += 1
+        self.notify()
+
+    def page_done(self, changes):
+        self.pages += 1
+        self.changes += changes
+        self.notify()
+
+    def notify(self):
+        if self.callback is not None:
+            self.callback(self)
+
+
+class CodeReviewData:
+    """
+        This class contains two functions, get_reviews() which crawls code review
+        data through Gerrit REST API and filter_data() which filters the data crawled
+        by get_reviews. The function analyze() does both at once while the reviews are
+        being crawled, page by page.
+    """
+    def __init__(self, concurrency=8, window_days=7, requests_per_second=10, cache=None,
+                 client=None, decoder=None, store=None, platforms=None, developer_error=None,
+                 metrics=None, graphs=GRAPHS):
+        """
+        Args:
+            concurrency (int, optional): Defaults to 8. The number of windows that are
+                                        crawled at the same time.
+            window_days (int, optional): Defaults to 7. The time period is split into
+                                        windows of this many days.
+            requests_per_second (float, optional): Defaults to 10. The maximum number of
+                                        requests sent to one host per second. Use 0 or
+                                        None to disable the rate limiting.
+            cache (ChangeCache, optional): Defaults to None. If a cache is given, only
+                                        the days that are not cached yet and the reviews
+                                        updated since the last crawl are crawled.
+            client (GerritClient, optional): Defaults to None. The HTTP client used for
+                                        all requests. If None, a client with the default
+                                        timeouts and retries and requests_per_second is used.
+            decoder (PageDecoder, optional): Defaults to None. Decodes the pages. If None,
+                                        the fastest JSON library installed is used and all
+                                        the fields of the reviews are kept.
+            store (ReviewStore, optional): Defaults to None. If a store is given, every
+                                        crawled page is appended to it as it arrives.
+            platforms (dict, optional): Defaults to None. The platforms that can be crawled,
+                                        by name (see gda.platforms). If None, they are read
+                                        from platforms.json.
+            developer_error (float, optional): Defaults to None. If given, the active
+                                        developers per month are counted approximately with
+                                        HyperLogLog sketches of this relative standard error,
+                                        which use fixed memory however many developers there
+                                        are (see gda.sketch). Not with a cache, whose rollup
+                                        tables count the developers exactly.
+            metrics (Metrics, optional): Defaults to None. Times every stage of the crawl
+                                        and of the filtering (see gda.metrics). If None, a
+                                        new Metrics is used.
+            graphs (tuple, optional): Defaults to GRAPHS. The graphs needed. Without a cache,
+                                        only the reviews they need are asked for (see
+                                        status_query()), the data of the other graphs is
+                                        then incomplete. With a cache every review is
+                                        crawled, since the cache serves every graph later.
+        """
+        if cache is not None and developer_error is not None:
+            # The rollup tables can take a review off a day it moved from, which a
+            # HyperLogLog sketch can not, so the cache always counts exactly.
+            raise ValueError("developer_error can not be used with a cache; the cache counts "
+                             "the developers exactly")
+        self.cache = cache
+        self.store = store
+        self.concurrency = max(1, concurrency)
+        self.window_days = window_days
+        if client is None:
+            client = GerritClient(requests_per_second=requests_per_second,
+                                  pool_size=max(16, self.concurrency))
+        self.client = client
+        self.decoder = decoder if decoder is not None else PageDecoder()
+        self.platforms = platforms if platforms is not None else load_platforms()
+        self.developer_error = developer_error
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.graphs = tuple(graphs)
+        for server in self.platforms.values():
+            if server.requests_per_second is not None:
+                self.client.rate_limiter.set_rate(server.host, server.requests_per_second)
+
+    def get_reviews(self, start_date, end_date, platform):
+        """
+        Summary: This function crawls code review data from Gerrit REST API 
+                    and then stores all the data into a list. If a cache is used,
+                    only the missing days are crawled and the rest of the reviews
+                    are read from the cache. The function then returns the list.
+        Args:
+            start_date (str): This date indicates the start date in the time period.
+            end_date (str): This date indicates the end date in the time period.
+            platform (str): This indicates what platform you want to crawl data for.
+        Returns:
+            if everything is successful:
+                changes (list): The list contains all the reviews crawled from the Gerrit REST API
+            if NOT successful:
+                0: If there is a problem while crawling data then return 0.
+        """
+        changes = []
+        try:
+            for page in self.iter_reviews(start_date, end_date, platform):
+                changes.extend(page)
+        except CrawlError:
+            return 0
+        changes.sort(key=lambda change: change["updated"], reverse=True)
+        return changes
+
+    def analyze(self, start_date, end_date, platform, progress=None, partial=None,
+                partial_interval=5.0):
+        """
+        Summary: This function crawls and filters code review data at the same time.
+                    Every page is filtered as soon as it arrives, so the memory used does
+                    not grow with the time period. If a cache is used, the data is read
+                    from its rollup tables once the missing days have been crawled, and
+                    the developers are always counted exactly.
+        Args:
+            start_date (str): This date indicates the start date in the time period.
+            end_date (str): This date indicates the end date in the time period.
+            platform (str): This indicates what platform you want to crawl data for.
+            progress (CrawlProgress, optional): Defaults to None. Receives the progress
+                                    of the crawl and can be used to cancel it.
+            partial (callable, optional): Defaults to None. Called with the data filtered
+                                    so far, at most once every partial_interval seconds.
+            partial_interval (float, optional): Defaults to 5.0.
+        Returns:
+            if successful:
+                returned_data (list): [reviews_opened, reviews_closed, developers_per_month,
+                                    latency], the same as returned by filter_data(). If
+                                    the crawl was cancelled, only the data filtered so far.
+            if NOT successful:
+                0: If there is a problem while crawling data then return 0.
+        """
+        aggregator = make_aggregator(self.developer_error)
+        latency = self.latency_aggregator()
+        last_partial = time.monotonic()
+        try:
+            # The crawled pages are still filtered, to show the partial data. The latency
+            # metrics have no rollup tables, so with a cache they are computed from the
+            # cached reviews of the time period too, in the same pass.
+            for page in self.iter_reviews(start_date, end_date, platform, progress,
+                                          cached=self.cache is None or latency is not None):
+                with self.metrics.stage("aggregate", len(page)):
+                    aggregator.add(page)
+                    if latency is not None:
+                        latency.add(page)
+                if partial is not None and time.monotonic() - last_partial >= partial_interval:
+                    partial(with_latency(aggregator.result(), latency))
+                    last_partial = time.monotonic()
+        except CrawlCancelled:
+            return with_latency(aggregator.result(), latency)
+        except CrawlError:
+            return 0
+        if self.cache is not None:
+            with self.metrics.stage("rollup"):
+                return with_latency(self.cache.rollup(platform, start_date, end_date), latency)
+        return with_latency(aggregator.result(), latency)
+
+    def latency_aggregator(self):
+        """
+        Summary: This function returns a LatencyAggregator if a latency graph is needed.
+        Returns:
+            LatencyAggregator or None
+        """
+        if set(self.graphs) & set(LATENCY_GRAPHS):
+            return LatencyAggregator()
+        return None
+
+    def iter_reviews(self, start_date, end_date, platform, progress=None, cached=True):
+        """
+        Summary: This generator yields the reviews of the time period page by page.
+                    If a cache is used, only the missing days are crawled; their
+                    reviews are yielded while they are crawled and the rest of the
+                    time period is then read from the cache.
+        Args:
+            start_date (str): This date indicates the start date in the time period.
+            end_date (str): This date indicates the end date in the time period.
+            platform (str): This indicates what platform you want to crawl data for.
+            progress (CrawlProgress, optional): Defaults to None. Receives the progress
+                                    of the crawl and can be used to cancel it.
+            cached (bool, optional): Defaults to True. If False, only the crawled reviews
+                                    are yielded, not the ones read from the cache.
+        Yields:
+            page (list): A list of reviews. A review is never yielded twice.
+        Raises:
+            CrawlError: If the platform is unknown or the Gerrit REST API fails.
+            CrawlCancelled: If the crawl is cancelled.
+        """
+        server = self.get_platform(platform)
+        if server is None:
+            raise CrawlError(f"Unknown platform: {platform}")
+
+        if self.cache is None:
+            if progress is not None:
+                progress.add_windows(self.count_windows(start_date, end_date, server))
+            for page in self.iter_crawl(start_date, end_date, server, progress):
+                if self.store is not None:
+                    with self.metrics.stage("store", len(page)):
+                        self.store.append(platform, page)
+                yield page
+            return
+
+        ############### Incremental refresh of the cache ################
+        sync_time, ranges, cached_ranges = self.plan_refresh(start_date, end_date, platform)
+        if progress is not None:
+            progress.add_windows(sum(self.count_windows(range_start, range_end, server)
+                                     for range_start, range_end in ranges))
+        for range_start, range_end in ranges:
+            for page in self.iter_crawl(range_start, range_end, server, progress):
+                with self.metrics.stage("cache", len(page)):
+                    self.cache.store(platform, page)
+                if self.store is not None:
+                    with self.metrics.stage("store", len(page)):
+                        self.store.append(platform, page)
+                # Only the reviews of this range are yielded, since the ranges do not
+                # overlap the same review can not be yielded twice.
+                lower = max(start_date, range_start)
+                upper = min(end_date, range_end)
+                page = [change for change in page if lower <= change["updated"] < upper]
+                if page:
+                    yield page
+            self.cache.mark_synced(platform, range_start, range_end, sync_time)
+        self.cache.set_last_sync(platform, sync_time)
+
+        # The rest of the time period was crawled before, read it from the cache.
+        if not cached:
+            return
+        for load_start, load_end in cached_ranges:
+            yield from self.cache.iter_load(platform, load_start, load_end,
+                                            server.page_size)
+
+    def plan_refresh(self, start_date, end_date, platform):
+        """
+        Summary: This function decides which parts of the time period have to be crawled
+                    and which can be read from the cache: the days that have never been
+                    crawled, and everything updated since the last crawl. If the url,
+                    query or projects of the platform have changed, the cache of the
+                    platform is emptied first and everything is crawled.
+        Args:
+            start_date (str): This date indicates the start date in the time period.
+            end_date (str): This date indicates the end date in the time period.
+            platform (str): This indicates what platform you want to crawl data for.
+        Returns:
+            (sync_time, ranges, cached_ranges) (tuple): The time of this refresh, the
+                    (start_date, end_date) ranges to crawl and the ranges of the time
+                    period to read from the cache.
+        """
+        self.cache.use_scope(platform, self.get_platform(platform).scope)
+        sync_time = datetime.now(timezone.utc)
+        tomorrow = (sync_time + timedelta(days=1)).strftime("%Y-%m-%d")
+        last_sync = self.cache.last_sync(platform)
+        ranges = []
+        missing_end = end_date
+        # Reviews updated since the last crawl have moved to a later day, so they
+        # are crawled again to replace the outdated copies in the cache.
+        if last_sync is not None:
+            ranges.append((last_sync.strftime("%Y-%m-%d"), tomorrow))
+            missing_end = min(end_date, last_sync.strftime("%Y-%m-%d"))
+        ranges.extend(self.cache.missing_ranges(platform, start_date, missing_end))
+        return sync_time, ranges, subtract_ranges(start_date, end_date, ranges)
+
+    def count_windows(self, start_date, end_date, server):
+        """
+        Summary: This function returns the number of windows iter_crawl() crawls: one
+                    per window and project.
+        """
+        return len(split_date_range(start_date, end_date, self.window_days)) \
+            * max(1, len(server.projects))
+
+    def search_terms(self, server):
+        """
+        Summary: This function returns the search terms added to every query: the query
+                    of the server and, without a cache, the status of the reviews the
+                    graphs need.
+        Args:
+            server (Platform): The Gerrit server.
+        Returns:
+            terms (str)
+        """
+        terms = [server.query]
+        if self.cache is None:
+            terms.append(status_query(self.graphs))
+        return " ".join(term for term in terms if term)
+
+    def get_platform(self, platform):
+        """
+        Summary: This function looks up a platform in the registry.
+        Args:
+            platform (str): This indicates what platform you want to crawl data for.
+        Returns:
+            if the platform is known:
+                server (Platform): The Gerrit server of the platform.
+            if NOT:
+                None
+        """
+        return self.platforms.get(platform)
+
+    def iter_crawl(self, start_date, end_date, server, progress=None):
+        """
+        Summary: This generator crawls the time period from a Gerrit server. The time period
+                    is split into windows of window_days days which are crawled concurrently,
+                    one query per project if the server lists projects.
+                    The pages are yielded as soon as they arrive; at most two pages per
+                    thread are waiting to be consumed at any time.
+        Args:
+            start_date (str): The start date of the time period.
+            end_date (str): The end date of the time period.
+            server (Platform): The Gerrit server.
+            progress (CrawlProgress, optional): Defaults to None. Receives the progress
+                                    of the crawl and can be used to cancel it.
+        Yields:
+            page (list): A list of reviews. A review is never yielded twice.
+        Raises:
+            CrawlError: If the Gerrit REST API fails.
+            CrawlCancelled: If the crawl is cancelled.
+        """
+        terms = [f"project:{project}" for project in server.projects] or [""]
+        windows = [(window_start, window_end, term) for window_start, window_end
+                   in split_date_range(start_date, end_date, self.window_days) for term in terms]
+        pages = queue.Queue(maxsize=2 * self.concurrency)
+        stop = threading.Event()
+
+        def put(item):
+            # Give up when the consumer has stopped, otherwise the thread would
+            # block forever on a full queue.
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def crawl_window(window):
+            if stop.is_set():
+                return
+            try:
+                for page in self.iter_window(window[0], window[1], server, stop, window[2]):
+                    if stop.is_set():
+                        return
+                    put(page)
+                put(None)
+            except Exception as error:
+                put(error)
+
+        # A review updated while the time period is crawled moves to a newer window
+        # and can be crawled twice. Only the change ids are remembered to skip it.
+        seen = set()
+        finished = 0
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            for window in windows:
+                executor.submit(crawl_window, window)
+            while finished < len(windows):
+                if progress is not None and progress.cancelled:
+                    raise CrawlCancelled()
+                try:
+                    item = pages.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    finished += 1
+                    if progress is not None:
+                        progress.window_done()
+                    continue
+                if isinstance(item, Exception):
+                    raise item
+                page = [change for change in item if change["id"] not in seen]
+                seen.update(change["id"] for change in page)
+                if progress is not None:
+                    progress.page_done(len(page))
+                if page:
+                    yield page
+        finally:
+            stop.set()
+            executor.shutdown(wait=True)
+
+    def iter_window(self, start_date, end_date, server, stop=None, terms=""):
+        """
+        Summary: This generator crawls all the reviews of one window, page by page.
+                    Instead of an offset, every page asks for the reviews updated before
+                    the last review of the previous page (a cursor), skipping only the
+                    reviews with that same timestamp that were already crawled. So no
+                    review is crawled twice, a window of any length can be crawled and a
+                    failed page is retried by the client from the same cursor.
+        Args:
+            start_date (str): The start date of the window.
+            end_date (str): The end date of the window.
+            server (Platform): The Gerrit server.
+            stop (threading.Event, optional): Defaults to None. Stops waiting for retries.
+            terms (str, optional): Defaults to "". More search terms, e.g. "project:nova".
+        Yields:
+            page (list): A list of reviews as returned by the Gerrit REST API.
+        Raises:
+            CrawlError: If the Gerrit REST API does not answer with 200 OK.
+        """
+        try:
+            auth = server.credentials()
+        except ValueError as error:
+            raise CrawlError(str(error)) from error
+        # after: and before: are both inclusive, so the window ends one millisecond
+        # before end_date, where the next window starts.
+        cursor = (datetime.strptime(end_date, "%Y-%m-%d") - timedelta(milliseconds=1)) \
+            .strftime("%Y-%m-%d %H:%M:%S.%f")[:23]
+        terms = " ".join(term for term in (terms, self.search_terms(server)) if term)
+        # The o= options of the server, e.g. SKIP_DIFFSTAT, ask for less detail.
+        options = "".join(f"&o={option}" for option in server.options)
+        skip = 0
+        while True:
+            query = f'after:"{start_date}" before:"{cursor}" {terms}'.strip()
+            url = server.changes_url + \
+                f"?q={quote(query, safe=':')}&n={server.page_size}&S={skip}{options}"
+            with self.metrics.stage("request"):
+                response = self.client.get(url, stop, auth)
+            with self.metrics.stage("decode") as stage:
+                response_data = self.decoder.decode(response.content)
+                stage.items = len(response_data)
+            if not response_data:
+                break
+            yield response_data
+            # The server may return fewer reviews than asked for, so the last review of
+            # the page tells whether there are more.
+            if not response_data[-1].get("_more_changes"):
+                break
+            # Gerrit sorts by updated and then by number, so the reviews of this page
+            # with the timestamp of its last review come first in the next page.
+            last_updated = response_data[-1]["updated"][:23]
+            if last_updated != cursor:
+                cursor, skip = last_updated, 0
+            skip += sum(1 for change in response_data if change["updated"][:23] == cursor)
+
+    def filter_data(self, reviews_lst):
+        """
+        Summary: This function gets the list of reviews returned from the get_reviews
+                function as an arg, filter the data, and
+                then retuns a list that contains these filtered data.
+        Args:
+            reviews_lst (list): The list contains all code review data retuned from
+            the get_review function.
+        Returns:
+            if successful:
+                returned_data (type:list): When the data is filtered, it is stored in a
+                                            list called returned_data: [reviews_opened,
+                                            reviews_closed, developers_per_month, latency].
+            if NOT successful:
+                0: when getting data from the get_reviews function, a problem might occur.
+        """
+        if reviews_lst == 0:
+            return 0
+
+        with self.metrics.stage("filter", len(reviews_lst)):
+            aggregator = make_aggregator(self.developer_error)
+            aggregator.add(reviews_lst)
+            latency = self.latency_aggregator()
+            if latency is not None:
+                latency.add(reviews_lst)
+            return with_latency(aggregator.result(), latency)
@@ -0,0 +1,16 @@
+"""
+    Exceptions raised while crawling code review data.
+"""
+
+
+class CrawlError(Exception):
+    """
+        This exception is raised when the Gerrit REST API does not answer a request
+        with 200 OK while reviews are being crawled.
+    """
+
+
+class CrawlCancelled(CrawlError):
+    """
+        This exception is raised when a crawl is cancelled through CrawlProgress.cancel().
+    """
@@ -0,0 +1,354 @@
+"""
+    HTTP client used to crawl the Gerrit REST API: pooled keep-alive connections,
+    compressed responses, timeouts, retries with exponential backoff and statistics
+    of every request.
+"""
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from .errors import CrawlCancelled, CrawlError
+
+
+# These answers mean "try again later", every other error is final.
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# These errors come from the url itself, every other error of requests (connection,
+# timeout, an answer cut or badly compressed while it is read) is retried.
+FINAL_ERRORS = (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema,
+                requests.exceptions.InvalidSchema, requests.exceptions.URLRequired)
+
+
+class HostRateLimiter:
+    """
+        This class limits how many requests per second are sent to each Gerrit host.
+        It is shared by all the crawler threads so that a higher concurrency does not
+        flood a single server.
+    """
+    def __init__(self, requests_per_second):
+        self.interval = self.to_interval(requests_per_second)
+        self.host_intervals = {}
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def to_interval(requests_per_second):
+        return 1.0 / requests_per_second if requests_per_second else 0.0
+
+    def set_rate(self, host, requests_per_second):
+        """
+        Summary: This function sets the limit of one host, overriding the default limit.
+        Args:
+            host (str): The host, e.g. "review.opendev.org".
+            requests_per_second (float): The maximum number of requests sent to the
+                                        host per second. Use 0 or None for no limit.
+        """
+        with self.lock:
+            self.host_intervals[host] = self.to_interval(requests_per_second)
+
+    def wait(self, url):
+        """
+        Summary: This function blocks until the next request to the host of the url
+                    is allowed to be sent.
+        Args:
+            url (str): The url of the request that is about to be sent.
+        """
+        host = urlparse(url).netloc
+        interval = self.host_intervals.get(host, self.interval)
+        if interval <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class RequestStats:
+    """
+        This class records the latency and the size of every request sent by a
+        GerritClient. It is shared by all the crawler threads. The requests, retries,
+        failures and bytes are counted per host, and only the latencies of the last
+        max_records requests are kept for the percentiles, so the memory stays the same
+        in a long-running service.
+    """
+    def __init__(self, max_records=10000):
+        """
+        Args:
+            max_records (int, optional): Defaults to 10000. The number of latest requests
+                                        whose latency is kept.
+        """
+        self.lock = threading.Lock()
+        self.max_records = max_records
+        self.reset()
+
+    def reset(self):
+        """
+        Summary: This function forgets all the requests recorded so far.
+        """
+        with self.lock:
+            # [requests, retries, failures, wire_bytes, body_bytes] per host, in the
+            # order of their first request.
+            self.totals = {}
+            # (host, latency) of the latest requests.
+            self.records = deque(maxlen=self.max_records)
+
+    def add_totals(self, host, totals):
+        if host not in self.totals:
+            self.totals[host] = [0, 0, 0, 0, 0]
+        host_totals = self.totals[host]
+        for index, value in enumerate(totals):
+            host_totals[index] += value
+
+    def record(self, latency, status, wire_bytes, body_bytes, retry, host=None):
+        """
+        Summary: This function records one request.
+        Args:
+            latency (float): The time in seconds until the whole answer was received.
+            status (int): The HTTP status code, or None if no answer was received.
+            wire_bytes (int): The number of bytes received, compressed.
+            body_bytes (int): The number of bytes of the answer, decompressed.
+            retry (bool): True if the request is going to be sent again.
+            host (str, optional): Defaults to None. The host the request was sent to.
+        """
+        with self.lock:
+            self.add_totals(host, (1, int(retry), int(status != 200), wire_bytes, body_bytes))
+            self.records.append((host, latency))
+
+    def partial(self):
+        """
+        Summary: This function returns the requests recorded so far, to be merged into
+                    another RequestStats, for example by the main process.
+        Returns:
+            partial (list): [totals, records]
+        """
+        with self.lock:
+            return [{host: list(totals) for host, totals in self.totals.items()},
+                    list(self.records)]
+
+    def merge(self, partial):
+        """
+        Summary: This function adds the requests recorded by another RequestStats, for
+                    example the one of a worker process.
+        Args:
+            partial (list): The partial() of the other RequestStats.
+        """
+        totals, records = partial
+        with self.lock:
+            for host, host_totals in totals.items():
+                self.add_totals(host, host_totals)
+            self.records.extend(records)
+
+    def hosts(self):
+        """
+        Summary: This function returns the hosts requests were sent to, in the order
+                    of their first request.
+        """
+        with self.lock:
+            return list(self.totals)
+
+    def latencies(self, host=None):
+        """
+        Summary: This function returns the latencies of the latest requests.
+        Args:
+            host (str, optional): Defaults to None. Only the requests sent to this host.
+                                If None, the requests sent to every host.
+        Returns:
+            latencies (list): The latencies in seconds.
+        """
+        with self.lock:
+            return [latency for record_host, latency in self.records
+                    if host is None or record_host == host]
+
+    def summary(self, host=None):
+        """
+        Summary: This function summarizes the requests recorded so far.
+        Args:
+            host (str, optional): Defaults to None. Only summarize the requests sent to
+                                this host. If None, all the requests are summarized.
+        Returns:
+            summary (dict): The number of requests, retries and failures, the bytes
+                            received and the latency percentiles in seconds of the latest
+                            max_records requests.
+        """
+        with self.lock:
+            totals = [sum(column) for column in zip(*(host_totals for record_host, host_totals
+                                                      in self.totals.items()
+                                                      if host is None or record_host == host))]
+        latencies = sorted(self.latencies(host))
+        summary = dict(zip(("requests", "retries", "failures", "wire_bytes", "body_bytes"),
+                           totals or [0] * 5))
+        for name, fraction in (("latency_p50", 0.5), ("latency_p95", 0.95), ("latency_max", 1.0)):
+            summary[name] = latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] \
+                if latencies else None
+        return summary
+
+
+class GerritClient:
+    """
+        This class sends the requests of the crawler. All the threads share one
+        requests.Session, so the TLS connections to a host are kept alive and reused.
+        Answers 429 and 5xx, connection errors and answers cut while they are read are
+        retried with exponential backoff and jitter, respecting the Retry-After header of
+        the server.
+    """
+    def __init__(self, timeout=30, max_retries=5, backoff=1.0, max_backoff=60,
+                 requests_per_second=10, pool_size=16):
+        """
+        Args:
+            timeout (float, optional): Defaults to 30. Seconds to wait for the server to
+                                        connect or send data before the attempt fails.
+            max_retries (int, optional): Defaults to 5. How many times a request is sent
+                                        again before giving up.
+            backoff (float, optional): Defaults to 1.0. Seconds to wait before the first
+                                        retry; the wait doubles with every retry.
+            max_backoff (float, optional): Defaults to 60. The longest wait between retries.
+            requests_per_second (float, optional): Defaults to 10. The maximum number of
+                                        requests sent to one host per second. Use 0 or
+                                        None to disable the rate limiting.
+            pool_size (int, optional): Defaults to 16. The number of connections kept
+                                        alive per host.
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self.stats = RequestStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+
+    def __getstate__(self):
+        # The session, the locks and the statistics belong to one process, a copy of
+        # the client sent to another process only keeps the settings.
+        return {"timeout": self.timeout, "max_retries": self.max_retries,
+                "backoff": self.backoff, "max_backoff": self.max_backoff,
+                "pool_size": self.pool_size, "interval": self.rate_limiter.interval,
+                "host_intervals": dict(self.rate_limiter.host_intervals)}
+
+    def __setstate__(self, state):
+        self.__init__(state["timeout"], state["max_retries"], state["backoff"],
+                      state["max_backoff"], requests_per_second=0, pool_size=state["pool_size"])
+        self.rate_limiter.interval = state["interval"]
+        self.rate_limiter.host_intervals = state["host_intervals"]
+
+    def share(self, parts):
+        """
+        Summary: This function creates a client with the same settings for one of several
+                    processes crawling at the same time. The rate limits are divided
+                    between the processes, so together they keep the limits of this client.
+        Args:
+            parts (int): The number of processes.
+        Returns:
+            client (GerritClient)
+        """
+        state = self.__getstate__()
+        state["interval"] *= parts
+        state["host_intervals"] = {host: interval * parts
+                                   for host, interval in state["host_intervals"].items()}
+        client = GerritClient.__new__(GerritClient)
+        client.__setstate__(state)
+        return client
+
+    def get(self, url, stop=None, auth=None):
+        """
+        Summary: This function sends a GET request and retries it until it succeeds or
+                    max_retries is reached.
+        Args:
+            url (str): The url of the request.
+            stop (threading.Event, optional): Defaults to None. If it is set while waiting
+                                        for a retry, the request is given up.
+            auth (tuple, optional): Defaults to None. (username, password) sent with
+                                        HTTP basic authentication.
+        Returns:
+            requests.Response: The answer, with status code 200.
+        Raises:
+            CrawlError: If the server answers with an error, or still fails after
+                        max_retries retries.
+            CrawlCancelled: If stop is set while waiting for a retry.
+        """
+        attempt = 0
+        host = urlparse(url).netloc
+        while True:
+            self.rate_limiter.wait(url)
+            start = time.monotonic()
+            response = None
+            error = None
+            try:
+                response = self.session.get(url, timeout=self.timeout, auth=auth)
+            except requests.RequestException as exception:
+                error = exception
+            latency = time.monotonic() - start
+
+            if error is not None:
+                retry = attempt < self.max_retries and not isinstance(error, FINAL_ERRORS)
+            else:
+                retry = attempt < self.max_retries and response.status_code in RETRY_STATUS
+            if response is None:
+                self.stats.record(latency, None, 0, 0, retry, host)
+            else:
+                self.stats.record(latency, response.status_code, self.wire_bytes(response),
+                                  len(response.content), retry, host)
+                if response.status_code == 200:
+                    return response
+            if not retry:
+                if error is not None:
+                    raise CrawlError(f"{url} failed: {error}") from error
+                raise CrawlError(f"{url} returned {response.status_code}")
+
+            delay = self.retry_delay(attempt, response)
+            attempt += 1
+            if stop is not None:
+                if stop.wait(delay):
+                    raise CrawlCancelled()
+            else:
+                time.sleep(delay)
+
+    def retry_delay(self, attempt, response):
+        """
+        Summary: This function computes how long to wait before the next attempt:
+                    exponential backoff with jitter, up to max_backoff, but never less
+                    than the server asked for in its Retry-After header.
+        Args:
+            attempt (int): The number of attempts that have failed before this one.
+            response (requests.Response): The failed answer, or None if there was none.
+        Returns:
+            delay (float): The number of seconds to wait.
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                try:
+                    retry_at = parsedate_to_datetime(retry_after)
+                    delay = max(delay, (retry_at - datetime.now(timezone.utc)).total_seconds())
+                except (TypeError, ValueError):
+                    pass
+        return delay
+
+    @staticmethod
+    def wire_bytes(response):
+        """
+        Summary: This function returns how many bytes of the answer were received over
+                    the network, before they were decompressed.
+        Args:
+            response (requests.Response): The answer, already read.
+        Returns:
+            wire_bytes (int)
+        """
+        try:
+            return response.raw.tell()
+        except (AttributeError, OSError):
+            return len(response.content)
@@ -0,0 +1,275 @@
+"""
+    Review latency metrics for capacity planning, computed in the same pass over the
+    reviews as the reviews opened and closed (see gda.aggregate):
+
+    - time to merge: the time from the creation of a review to its submission,
+    - turnaround: the time from the creation of a review to its merge or abandonment,
+      per month it was closed in,
+    - backlog: the net number of reviews opened minus closed up to the end of every
+      day, among the reviews updated in the time period (see below),
+    - throughput: the number of reviews merged per project.
+
+    The durations are counted in QuantileSketch (see gda.sketch), so the memory does
+    not grow with the number of reviews, only with the number of days, months and
+    projects. The partial metrics of different parts of the time period can be merged.
+
+    The reviews are the ones updated in the time period, so the backlog is not the number
+    of open reviews of the platform. It leaves out the reviews that were open during the
+    time period but were last updated before it (e.g. forgotten reviews), and the ones
+    that were updated after it. It shows how the reviews of the time period piled up or
+    were worked off, not how many reviews were open.
+"""
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from .sketch import QuantileSketch
+# NumPy is optional. Without it the reviews are added one by one in pure Python.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The graphs of the latency metrics (see gda.crawler.GRAPHS).
+LATENCY_GRAPHS = ("merge_time", "turnaround", "backlog", "throughput")
+
+# The percentiles returned, and the bins of the histogram of the time to merge in
+# hours with their labels.
+PERCENTILES = (50, 90, 99)
+MERGE_TIME_BINS = (1, 4, 24, 72, 168, 336, 720, 2160)
+MERGE_TIME_BOUNDS = tuple(hours * 3600 for hours in MERGE_TIME_BINS)
+MERGE_TIME_LABELS = ("< 1 h", "1-4 h", "4 h-1 d", "1-3 d", "3-7 d", "1-2 w", "2 w-1 mo",
+                     "1-3 mo", "> 3 mo")
+
+
+def parse_timestamp(timestamp):
+    """
+    Summary: This function parses a timestamp of the Gerrit REST API,
+                "YYYY-MM-DD hh:mm:ss.fffffffff" in UTC, to the second.
+    Returns:
+        datetime
+    """
+    return datetime.fromisoformat(timestamp[:19])
+
+
+def closed_at(change):
+    """
+    Summary: This function returns the timestamp a review was closed at. A merged review
+                has the time it was submitted; an abandoned review has no such field and
+                its last update is used instead.
+    Returns:
+        timestamp (str)
+    """
+    if change.get("status") == "MERGED":
+        return change.get("submitted") or change["updated"]
+    return change["updated"]
+
+
+class LatencyAggregator:
+    """
+        This class computes the latency metrics incrementally, page by page, like
+        ReviewAggregator. It needs the "created", "submitted" and "project" fields of
+        the reviews (see gda.decoding.AGGREGATION_FIELDS).
+    """
+    def __init__(self, accuracy=0.01):
+        """
+        Args:
+            accuracy (float, optional): Defaults to 0.01. The relative error of the
+                                    percentiles.
+        """
+        self.accuracy = accuracy
+        self.time_to_merge = QuantileSketch(accuracy)
+        # The histogram of the time to merge is counted from the exact durations, not
+        # from the buckets of the sketch, so no review is counted in the next bin.
+        self.merge_histogram = [0] * (len(MERGE_TIME_BINS) + 1)
+        self.turnaround = {}
+        # The change of the backlog on every day: +1 on the day a review was created and
+        # -1 on the day it was closed.
+        self.backlog = {}
+        # The first and the last day a review was updated.
+        self.days = None
+        self.throughput = {}
+
+    def add(self, changes):
+        """
+        Summary: This function adds a page of reviews to the metrics.
+        Args:
+            changes (list): A list of reviews returned by the Gerrit REST API.
+        """
+        if not changes:
+            return
+        if np is not None:
+            self.add_columns(changes)
+            return
+        backlog = self.backlog
+        turnaround = self.turnaround
+        throughput = self.throughput
+        merge_seconds = []
+        first = last = None
+        for change in changes:
+            day = change["updated"][:10]
+            if first is None or day < first:
+                first = day
+            if last is None or day > last:
+                last = day
+            created = change.get("created")
+            if created is None:
+                continue
+            status = change.get("status")
+            created_day = created[:10]
+            backlog[created_day] = backlog.get(created_day, 0) + 1
+            if status not in ("MERGED", "ABANDONED"):
+                continue
+
+            ################ Reviews closed #################
+            closed = closed_at(change)
+            closed_day = closed[:10]
+            backlog[closed_day] = backlog.get(closed_day, 0) - 1
+            seconds = (parse_timestamp(closed) - parse_timestamp(created)).total_seconds()
+            month = closed[:7]
+            if month not in turnaround:
+                turnaround[month] = QuantileSketch(self.accuracy)
+            turnaround[month].add(seconds)
+            if status == "MERGED":
+                merge_seconds.append(seconds)
+                self.merge_histogram[bisect_left(MERGE_TIME_BOUNDS, seconds)] += 1
+                project = change.get("project")
+                if project is not None:
+                    throughput[project] = throughput.get(project, 0) + 1
+        self.time_to_merge.add_many(merge_seconds)
+        if first is not None:
+            self.days = (first, last) if self.days is None else \
+                (min(self.days[0], first), max(self.days[1], last))
+
+    def add_columns(self, changes):
+        """
+        Summary: This function does the same as add() with NumPy: the timestamps of the
+                    page are parsed and grouped by day and month all at once.
+        Args:
+            changes (list): A list of reviews returned by the Gerrit REST API.
+        """
+        updated = [change["updated"] for change in changes]
+        first, last = min(updated)[:10], max(updated)[:10]
+        self.days = (first, last) if self.days is None else \
+            (min(self.days[0], first), max(self.days[1], last))
+        changes = [change for change in changes if change.get("created") is not None]
+        if not changes:
+            return
+        created = np.array([change["created"] for change in changes], dtype="S19")
+        statuses = np.array([change.get("status") or "" for change in changes], dtype="S9")
+        merged = statuses == b"MERGED"
+        closed = merged | (statuses == b"ABANDONED")
+        closed_changes = [change for change, is_closed in zip(changes, closed.tolist()) if is_closed]
+        closed_times = np.array([closed_at(change) for change in closed_changes], dtype="S19")
+
+        ################ Backlog per day #################
+        for days, sign in ((created.astype("S10"), 1), (closed_times.astype("S10"), -1)):
+            unique_days, counts = np.unique(days, return_counts=True)
+            for day, count in zip(unique_days.tolist(), counts.tolist()):
+                day = day.decode()
+                self.backlog[day] = self.backlog.get(day, 0) + sign * count
+        if not closed_changes:
+            return
+
+        ################ Reviews closed #################
+        seconds = (closed_times.astype("datetime64[s]")
+                   - created[closed].astype("datetime64[s]")).astype(np.float64)
+        months = closed_times.astype("S7")
+        for month in np.unique(months).tolist():
+            label = month.decode()
+            if label not in self.turnaround:
+                self.turnaround[label] = QuantileSketch(self.accuracy)
+            self.turnaround[label].add_many(seconds[months == month])
+        merged = merged[closed]
+        self.time_to_merge.add_many(seconds[merged])
+        bins = np.bincount(np.searchsorted(MERGE_TIME_BOUNDS, seconds[merged]),
+                           minlength=len(self.merge_histogram))
+        self.merge_histogram = [total + count for total, count
+                                in zip(self.merge_histogram, bins.tolist())]
+        for change, is_merged in zip(closed_changes, merged.tolist()):
+            project = change.get("project")
+            if is_merged and project is not None:
+                self.throughput[project] = self.throughput.get(project, 0) + 1
+
+    def partial(self):
+        """
+        Summary: This function returns the partial metrics of the reviews added so far,
+                    which can be merged with merge().
+        Returns:
+            partial (list): [time_to_merge, merge_histogram, turnaround, backlog, days,
+                            throughput]
+        """
+        return [self.time_to_merge, self.merge_histogram, self.turnaround, self.backlog,
+                self.days, self.throughput]
+
+    def merge(self, partial):
+        """
+        Summary: This function adds partial metrics to this aggregator.
+        Args:
+            partial (list): Partial metrics returned by partial().
+        """
+        time_to_merge, merge_histogram, turnaround, backlog, days, throughput = partial
+        self.time_to_merge.merge(time_to_merge)
+        self.merge_histogram = [total + count for total, count
+                                in zip(self.merge_histogram, merge_histogram)]
+        for month, sketch in turnaround.items():
+            if month not in self.turnaround:
+                self.turnaround[month] = QuantileSketch(self.accuracy)
+            self.turnaround[month].merge(sketch)
+        for day, delta in backlog.items():
+            self.backlog[day] = self.backlog.get(day, 0) + delta
+        if days is not None:
+            self.days = days if self.days is None else \
+                (min(self.days[0], days[0]), max(self.days[1], days[1]))
+        for project, merged in throughput.items():
+            self.throughput[project] = self.throughput.get(project, 0) + merged
+
+    def result(self):
+        """
+        Summary: This function returns the metrics. The durations are in hours, and the
+                    days and months are ordered newest first like the filtered data.
+        Returns:
+            latency (dict): {"time_to_merge": {"count": ..., "p50": ..., "p90": ...,
+                            "p99": ..., "histogram": [[label, count], ...]},
+                            "turnaround": {month: {"count": ..., "p50": ..., ...}},
+                            "backlog": {day: reviews opened - closed},
+                            "throughput": {project: reviews merged}, most merged first}
+        """
+        time_to_merge = dict(percentiles(self.time_to_merge),
+                             histogram=[list(pair) for pair
+                                        in zip(MERGE_TIME_LABELS, self.merge_histogram)])
+        turnaround = {month: percentiles(self.turnaround[month])
+                      for month in sorted(self.turnaround, reverse=True)}
+
+        ############### Backlog per day ################
+        backlog = {}
+        if self.days is not None:
+            first, last = self.days
+            # The reviews created before the first day and not closed before it count on
+            # the first day.
+            net = sum(delta for day, delta in self.backlog.items() if day < first)
+            day = date.fromisoformat(first)
+            while day.isoformat() <= last:
+                net += self.backlog.get(day.isoformat(), 0)
+                backlog[day.isoformat()] = net
+                day += timedelta(days=1)
+            backlog = {day: backlog[day] for day in reversed(backlog)}
+
+        throughput = dict(sorted(self.throughput.items(), key=lambda item: (-item[1], item[0])))
+        return {"time_to_merge": time_to_merge, "turnaround": turnaround, "backlog": backlog,
+                "throughput": throughput}
+
+
+def percentiles(sketch):
+    """
+    Summary: This function returns the number of durations and their PERCENTILES in hours.
+    Args:
+        sketch (QuantileSketch): The durations in seconds.
+    Returns:
+        percentiles (dict): {"count": ..., "p50": ..., "p90": ..., "p99": ...}, None if
+                            there are no durations.
+    """
+    values = {"count": len(sketch)}
+    for percentile in PERCENTILES:
+        seconds = sketch.quantile(percentile / 100)
+        values[f"p{percentile}"] = None if seconds is None else seconds / 3600
+    return values
+
@@ -0,0 +1,257 @@
+"""
+    Instrumentation of the crawl -> filter -> visualize pipeline. Every stage (the
+    requests, the decoding of the pages, the aggregation, the writes to the store and
+    the cache, the export of the graphs) is timed with Metrics.stage(), together with
+    the number of reviews it handled. The latency of every request and the bytes
+    received are recorded by the RequestStats of the GerritClient, per host.
+
+    The metrics can be written as a JSON report, or served in the Prometheus text
+    format while a crawl runs. A stage can also be profiled with cProfile.
+"""
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The stages timed by the application.
+STAGES = ("request", "decode", "aggregate", "filter", "store", "compact", "cache", "rollup",
+          "export")
+
+# The upper bounds in seconds of the buckets of the latency histograms.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def latency_histogram(latencies, buckets=LATENCY_BUCKETS):
+    """
+    Summary: This function counts the latencies in cumulative buckets, like a
+                Prometheus histogram.
+    Args:
+        latencies (list): The latencies in seconds.
+        buckets (tuple, optional): Defaults to LATENCY_BUCKETS. The upper bounds.
+    Returns:
+        histogram (dict): {"buckets": [[upper bound, count], ...], "count": ..., "sum": ...},
+                        the last bound is "+Inf".
+    """
+    counts = [sum(1 for latency in latencies if latency <= bound) for bound in buckets]
+    return {"buckets": [[bound, count] for bound, count in zip(buckets, counts)]
+            + [["+Inf", len(latencies)]],
+            "count": len(latencies),
+            "sum": sum(latencies)}
+
+
+class Stage:
+    """
+        The record of one run of a stage, returned by Metrics.stage(). The number of
+        items (reviews) can be set once it is known.
+    """
+    def __init__(self, items=0):
+        self.items = items
+
+
+class Metrics:
+    """
+        This class adds up the time spent in every stage of the pipeline. It is shared
+        by all the crawler threads.
+    """
+    def __init__(self, profile=()):
+        """
+        Args:
+            profile (tuple, optional): Defaults to (). The stages profiled with cProfile,
+                                    or ("all",) for every stage.
+        """
+        self.profile = tuple(profile)
+        self.lock = threading.Lock()
+        # Only one profiler can run at a time, a stage running in another thread at the
+        # same time is timed but not profiled.
+        self.profiler_lock = threading.Lock()
+        self.started = time.monotonic()
+        self.stages = {}
+        self.profiles = {}
+
+    def __getstate__(self):
+        # The worker processes of gda.sharding get a copy without the locks.
+        return {"profile": self.profile, "stages": self.stages}
+
+    def __setstate__(self, state):
+        self.__init__(state["profile"])
+        self.stages = state["stages"]
+
+    @contextmanager
+    def stage(self, name, items=0):
+        """
+        Summary: This context manager times one run of a stage:
+
+                    with metrics.stage("decode") as stage:
+                        page = decode(body)
+                        stage.items = len(page)
+        Args:
+            name (str): The name of the stage, e.g. one of STAGES.
+            items (int, optional): Defaults to 0. The number of reviews handled.
+        Yields:
+            stage (Stage)
+        """
+        record = Stage(items)
+        profiler = None
+        if (name in self.profile or "all" in self.profile) and self.profiler_lock.acquire(False):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self.profiler_lock.release()
+            with self.lock:
+                totals = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "items": 0,
+                                                       "max_seconds": 0.0})
+                totals["calls"] += 1
+                totals["seconds"] += elapsed
+                totals["items"] += record.items
+                totals["max_seconds"] = max(totals["max_seconds"], elapsed)
+                if profiler is not None:
+                    if name in self.profiles:
+                        self.profiles[name].add(profiler)
+                    else:
+                        self.profiles[name] = pstats.Stats(profiler)
+
+    def merge(self, stages):
+        """
+        Summary: This function adds the stages timed by another Metrics, for example the
+                    one of a worker process.
+        Args:
+            stages (dict): The stages of the other Metrics.
+        """
+        with self.lock:
+            for name, other in stages.items():
+                totals = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "items": 0,
+                                                       "max_seconds": 0.0})
+                for key in ("calls", "seconds", "items"):
+                    totals[key] += other[key]
+                totals["max_seconds"] = max(totals["max_seconds"], other["max_seconds"])
+
+    def report(self, request_stats=None):
+        """
+        Summary: This function summarizes the metrics.
+        Args:
+            request_stats (RequestStats, optional): Defaults to None. The requests of the
+                                    client; if given, a latency histogram, the bytes and
+                                    the failures are added for every host.
+        Returns:
+            report (dict): Can be written as JSON.
+        """
+        with self.lock:
+            stages = {name: dict(totals) for name, totals in self.stages.items()}
+        for totals in stages.values():
+            totals["items_per_second"] = totals["items"] / totals["seconds"] \
+                if totals["items"] and totals["seconds"] else None
+        report = {"elapsed_seconds": time.monotonic() - self.started, "stages": stages}
+        if request_stats is not None:
+            hosts = {}
+            for host in request_stats.hosts():
+                summary = request_stats.summary(host)
+                summary["latency_seconds"] = latency_histogram(request_stats.latencies(host))
+                hosts[host] = summary
+            report["hosts"] = hosts
+        return report
+
+    def write_report(self, path, request_stats=None):
+        """
+        Summary: This function writes the report as a JSON file.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as outfile:
+            json.dump(self.report(request_stats), outfile, indent=2)
+
+    def write_profiles(self, directory):
+        """
+        Summary: This function writes the profile of every profiled stage, <stage>.prof,
+                    which can be read with pstats or snakeviz.
+        Returns:
+            paths (list): The paths of the files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        with self.lock:
+            for name, stats in self.profiles.items():
+                path = os.path.join(directory, f"{name}.prof")
+                stats.dump_stats(path)
+                paths.append(path)
+        return paths
+
+    def prometheus(self, request_stats=None):
+        """
+        Summary: This function formats the metrics in the Prometheus text format.
+        Returns:
+            text (str)
+        """
+        report = self.report(request_stats)
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{text}}} {value}" if text else f"{name} {value}")
+
+        stages = report["stages"]
+        metric("gda_stage_seconds_total", "counter", "Time spent in every stage of the pipeline.",
+               [({"stage": name}, totals["seconds"]) for name, totals in stages.items()])
+        metric("gda_stage_calls_total", "counter", "Runs of every stage of the pipeline.",
+               [({"stage": name}, totals["calls"]) for name, totals in stages.items()])
+        metric("gda_stage_items_total", "counter", "Reviews handled by every stage.",
+               [({"stage": name}, totals["items"]) for name, totals in stages.items()])
+        hosts = report.get("hosts", {})
+        if hosts:
+            lines.append("# HELP gda_request_latency_seconds Latency of the requests to Gerrit.")
+            lines.append("# TYPE gda_request_latency_seconds histogram")
+            for host, summary in hosts.items():
+                histogram = summary["latency_seconds"]
+                for bound, count in histogram["buckets"]:
+                    lines.append(f'gda_request_latency_seconds_bucket{{host="{host}",le="{bound}"}} '
+                                 f'{count}')
+                lines.append(f'gda_request_latency_seconds_sum{{host="{host}"}} {histogram["sum"]}')
+                lines.append(f'gda_request_latency_seconds_count{{host="{host}"}} {histogram["count"]}')
+            metric("gda_received_bytes_total", "counter", "Bytes received from Gerrit.",
+                   [({"host": host, "encoding": encoding}, summary[key])
+                    for host, summary in hosts.items()
+                    for encoding, key in (("wire", "wire_bytes"), ("decoded", "body_bytes"))])
+            metric("gda_request_failures_total", "counter", "Requests that failed.",
+                   [({"host": host}, summary["failures"]) for host, summary in hosts.items()])
+            metric("gda_request_retries_total", "counter", "Requests sent again.",
+                   [({"host": host}, summary["retries"]) for host, summary in hosts.items()])
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, request_stats=None, host="127.0.0.1"):
+        """
+        Summary: This function serves the metrics in the Prometheus text format on
+                    http://host:port/metrics from a daemon thread.
+        Returns:
+            server (ThreadingHTTPServer): Call shutdown() to stop it.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus(request_stats).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -0,0 +1,175 @@
+"""
+    Registry of the Gerrit servers that can be crawled. The servers are read from a
+    JSON config file, so a new Gerrit instance is added without changing the code:
+
+        [
+            {"name": "OpenStack", "url": "https://review.opendev.org", "page_size": 500},
+            {"name": "Internal", "url": "https://gerrit.example.com", "page_size": 1000,
+             "requests_per_second": 2, "query": "-is:wip", "options": ["SKIP_DIFFSTAT"],
+             "projects": ["platform/build", "platform/tools"],
+             "auth": {"username": "bot", "password_env": "GERRIT_HTTP_PASSWORD"}}
+        ]
+
+    Only "name" and "url" are needed, see Platform for the other keys.
+"""
+import hashlib
+import json
+import os
+import re
+from urllib.parse import urlparse
+
+
+DEFAULT_CONFIG = "platforms.json"
+
+# The names of the ListChangesOption values of Gerrit, e.g. "SKIP_DIFFSTAT".
+OPTION = re.compile(r"^[A-Z][A-Z_]*$")
+
+
+class Platform:
+    """
+        This class describes one Gerrit server: where its REST API is, how many reviews
+        it returns per page, how fast it may be crawled, the query terms and options
+        added to every request and the projects crawled.
+    """
+    def __init__(self, name, url, page_size=500, requests_per_second=None, query="", auth=None,
+                 options=(), projects=()):
+        """
+        Args:
+            name (str): The name shown in the GUI and used on the command line.
+            url (str): The url of the Gerrit server, e.g. "https://review.opendev.org".
+            page_size (int, optional): Defaults to 500. The number of reviews asked for per
+                                        page (the "n" parameter). Use the largest page the
+                                        server accepts to send fewer requests.
+            requests_per_second (float, optional): Defaults to None. The maximum number of
+                                        requests sent to this server per second. If None,
+                                        the limit of the client is used.
+            query (str, optional): Defaults to "". Search terms added to every query,
+                                        e.g. "project:nova" or "-is:wip".
+            auth (dict, optional): Defaults to None. {"username": ..., "password": ...} or
+                                        {"username": ..., "password_env": ...} to read the
+                                        HTTP password from an environment variable. The
+                                        authenticated REST API (/a/) is used when it is set.
+            options (list, optional): Defaults to (). Options of the changes endpoint sent as
+                                        "o=" parameters, e.g. ["SKIP_DIFFSTAT"] to skip the
+                                        insertions and deletions the graphs do not use.
+            projects (list, optional): Defaults to (). If given, only these projects are
+                                        crawled, every window with one query per project.
+        """
+        if not url.startswith(("http://", "https://")):
+            raise ValueError(f"{name}: the url must start with http:// or https://, got {url!r}")
+        if page_size < 1:
+            raise ValueError(f"{name}: the page size must be at least 1, got {page_size}")
+        if auth is not None and ("username" not in auth
+                                 or not ("password" in auth or "password_env" in auth)):
+            raise ValueError(f"{name}: auth needs a username and a password or password_env")
+        for option in options:
+            if not isinstance(option, str) or not OPTION.match(option):
+                raise ValueError(f"{name}: not a Gerrit option: {option!r}")
+        self.name = name
+        self.url = url.rstrip("/")
+        self.page_size = page_size
+        self.requests_per_second = requests_per_second
+        self.query = query
+        self.auth = auth
+        self.options = tuple(options)
+        self.projects = tuple(projects)
+
+    @classmethod
+    def from_dict(cls, entry):
+        """
+        Summary: This function creates a platform from one entry of the config file.
+        Raises:
+            ValueError: If the entry is not valid.
+        """
+        if not isinstance(entry, dict):
+            raise ValueError(f"expected a platform object, got {entry!r}")
+        unknown = set(entry) - {"name", "url", "page_size", "requests_per_second", "query", "auth",
+                                "options", "projects"}
+        if unknown:
+            raise ValueError(f"{entry.get('name')}: unknown keys {', '.join(sorted(unknown))}")
+        try:
+            return cls(**entry)
+        except TypeError as error:
+            raise ValueError(f"{entry.get('name')}: {error}") from error
+
+    @property
+    def scope(self):
+        """
+        A hash of the url, the query and the projects, which decide which reviews are
+        crawled. The reviews cached for another scope are not used (see gda.cache).
+        """
+        identity = json.dumps([self.url, self.query, list(self.projects)])
+        return hashlib.sha256(identity.encode()).hexdigest()[:16]
+
+    @property
+    def host(self):
+        return urlparse(self.url).netloc
+
+    @property
+    def changes_url(self):
+        """
+        The url of the changes endpoint. Authenticated requests go through /a/.
+        """
+        return self.url + ("/a/changes/" if self.auth else "/changes/")
+
+    def credentials(self):
+        """
+        Summary: This function returns the credentials sent with every request.
+        Returns:
+            if the platform needs authentication:
+                (username, password) (tuple)
+            if NOT:
+                None
+        Raises:
+            ValueError: If the environment variable of the password is not set.
+        """
+        if self.auth is None:
+            return None
+        password = self.auth.get("password")
+        if password is None:
+            password = os.environ.get(self.auth["password_env"])
+            if password is None:
+                raise ValueError(f"{self.name}: the environment variable "
+                                 f"{self.auth['password_env']} is not set")
+        return self.auth["username"], password
+
+
+# Used when there is no config file.
+DEFAULT_PLATFORMS = [
+    Platform("Android", "https://android-review.googlesource.com", page_size=2000),
+    Platform("OpenStack", "https://review.opendev.org", page_size=500),
+    Platform("Chromium", "https://chromium-review.googlesource.com", page_size=500),
+]
+
+
+def load_platforms(path=None):
+    """
+    Summary: This function reads the platforms from a config file.
+    Args:
+        path (str, optional): Defaults to None. The JSON config file. If None,
+                                platforms.json is used if it exists, otherwise the
+                                default platforms.
+    Returns:
+        platforms (dict): The platforms by name, in the order of the config file.
+    Raises:
+        ValueError: If the config file is not valid.
+        OSError: If the config file given can not be read.
+    """
+    if path is None:
+        if not os.path.exists(DEFAULT_CONFIG):
+            return {platform.name: platform for platform in DEFAULT_PLATFORMS}
+        path = DEFAULT_CONFIG
+    with open(path) as infile:
+        try:
+            entries = json.load(infile)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"{path}: {error}") from error
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: expected a non-empty list of platforms")
+    platforms = {}
+    for entry in entries:
+        platform = Platform.from_dict(entry)
+        if platform.name in platforms:
+            raise ValueError(f"{path}: the platform {platform.name} is listed twice")
+        platforms[platform.name] = platform
+    return platforms
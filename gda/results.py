@@ -0,0 +1,193 @@
+"""
+    Cache of whole analyses. The filtered data of an analysis and its exported graphs
+    are kept on disk, keyed by the platform, the time period, the settings of the
+    analysis and the version of the code, so the same analysis is shown again without
+    crawling, filtering or drawing anything.
+
+    Every analysis is a directory with a data.json file and the files of its graphs.
+    The least recently used analyses are removed when the cache is larger than its
+    size limit. An analysis of a time period that reaches today expires after a time
+    to live, since new reviews keep arriving; older time periods do not expire.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date
+
+DATA_FILE = "data.json"
+
+
+def code_version():
+    """
+    Summary: This function returns a hash of the source files of the gda package. An
+                analysis cached by another version of the code is not used.
+    Returns:
+        version (str)
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            with open(os.path.join(directory, name), "rb") as infile:
+                digest.update(name.encode() + b"\0" + infile.read())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+        This class stores analyses in a directory. It can be used from any thread or
+        process: an analysis is written to a temporary directory and then renamed.
+    """
+    def __init__(self, root="Storage/results", max_bytes=200 * 10 ** 6, ttl=900):
+        """
+        Args:
+            root (str, optional): Defaults to "Storage/results". The directory of the cache.
+            max_bytes (int, optional): Defaults to 200 MB. The size limit of the cache.
+            ttl (float, optional): Defaults to 900. Seconds an analysis of a time period
+                                    that reaches today is used.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = code_version()
+        self.lock = threading.Lock()
+
+    def key(self, server, start_date, end_date, **settings):
+        """
+        Summary: This function returns the key of an analysis.
+        Args:
+            server (Platform): The Gerrit server.
+            start_date (str): The start date of the time period.
+            end_date (str): The end date of the time period.
+            **settings: The other settings that change the result, e.g. graphs and
+                        developer_error.
+        Returns:
+            key (str)
+        """
+        identity = {"platform": server.name, "url": server.url, "query": server.query,
+                    "projects": list(server.projects), "from": start_date, "to": end_date,
+                    "version": self.version,
+                    "settings": {name: list(value) if isinstance(value, tuple) else value
+                                 for name, value in sorted(settings.items())}}
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()[:32]
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        """
+        Summary: This function returns a cached analysis, and marks it as used.
+        Args:
+            key (str): The key returned by key().
+        Returns:
+            if the analysis is cached and not expired:
+                (returned_data, charts) (tuple): The filtered data, as returned by
+                        CodeReviewData.analyze(), and the paths of the cached graphs by
+                        file name.
+            if NOT:
+                None
+        """
+        directory = self.path(key)
+        try:
+            with open(os.path.join(directory, DATA_FILE)) as infile:
+                entry = json.load(infile)
+        except (OSError, ValueError):
+            return None
+        if entry["expires"] is not None and entry["expires"] < time.time():
+            shutil.rmtree(directory, ignore_errors=True)
+            return None
+        # The modification time of the directory is the time it was last used.
+        try:
+            os.utime(directory)
+        except OSError:
+            return None
+        charts = {name: os.path.join(directory, name) for name in entry["charts"]}
+        return entry["data"], charts
+
+    def put(self, key, returned_data, end_date, charts=()):
+        """
+        Summary: This function stores an analysis, then removes the least recently used
+                    analyses if the cache is too large.
+        Args:
+            key (str): The key returned by key().
+            returned_data (list): The filtered data returned by CodeReviewData.analyze().
+            end_date (str): The end date of the time period, to know if it reaches today.
+            charts (list, optional): Defaults to (). The paths of the exported graphs,
+                                    copied into the cache.
+        """
+        expires = None
+        if end_date > date.today().isoformat():
+            expires = time.time() + self.ttl
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+        try:
+            names = []
+            for chart in charts:
+                shutil.copyfile(chart, os.path.join(staging, os.path.basename(chart)))
+                names.append(os.path.basename(chart))
+            with open(os.path.join(staging, DATA_FILE), "w") as outfile:
+                json.dump({"data": returned_data, "charts": names, "expires": expires,
+                           "created": time.time()}, outfile)
+            with self.lock:
+                shutil.rmtree(self.path(key), ignore_errors=True)
+                os.replace(staging, self.path(key))
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Summary: This function removes the least recently used analyses until the cache
+                    is not larger than max_bytes.
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isdir(directory):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(directory, file_name))
+                           for file_name in os.listdir(directory))
+                entries.append((os.path.getmtime(directory), size, directory))
+            except OSError:
+                continue
+            total += size
+        for _, size, directory in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+
+    def copy_charts(self, charts, directory, names=None):
+        """
+        Summary: This function copies cached graphs to a directory, e.g. Storage/PDF_Files.
+        Args:
+            charts (dict): The paths of the cached graphs by file name, from get().
+            directory (str): The directory the graphs are copied to.
+            names (list, optional): Defaults to None. The file names needed. If None,
+                                    every cached graph.
+        Returns:
+            if every graph needed is cached:
+                paths (list): The paths of the copies.
+            if NOT:
+                None
+        """
+        names = list(charts) if names is None else names
+        if not all(name in charts for name in names):
+            return None
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                shutil.copyfile(charts[name], path)
+            except OSError:
+                return None
+            paths.append(path)
+        return paths
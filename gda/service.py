@@ -0,0 +1,307 @@
+"""
+    Long-running HTTP service of the analyses, for dashboards and scripts:
+
+        python -m gda serve --port 8080
+        curl 'http://127.0.0.1:8080/metrics?platform=OpenStack&from=2022-01-01&to=2022-02-01'
+
+    GET /metrics?platform=...&from=...&to=... answers the filtered data of an analysis
+    as JSON: the reviews opened and closed per day, the active developers per month and
+    the latency metrics. Without from and to, the last refresh_days days are used.
+    GET /platforms lists the platforms and GET /status the state of the service.
+
+    The answers are kept in memory, least recently used first out, and the analyses in
+    the result cache and the cache of the reviews (see gda.results and gda.cache), so
+    an analysis done before is answered in milliseconds, even after a restart. The
+    analyses run in threads, one at a time per platform since they share the cache
+    state of the platform, and identical requests that arrive while an analysis runs
+    wait for the same analysis instead of crawling again.
+
+    In the background, the last refresh_days days of every platform, and every time
+    period in memory that reaches today, are analyzed again every refresh_interval
+    seconds. An answer of a time period that reaches today and is older than that is
+    still answered at once, and analyzed again in the background.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error", 502: "Bad Gateway"}
+
+
+class ServiceError(Exception):
+    """
+        An error answered to the client, with its HTTP status.
+    """
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Answer:
+    """
+        The answer of an analysis kept in memory: the JSON body, encoded once.
+    """
+    def __init__(self, body, end_date, refresh_interval):
+        self.body = body
+        self.created = time.time()
+        # Only the time periods that reach today get new reviews.
+        self.stale_at = None
+        if end_date > date.today().isoformat() and refresh_interval:
+            self.stale_at = self.created + refresh_interval
+
+    def stale(self):
+        return self.stale_at is not None and time.time() >= self.stale_at
+
+
+class AnalyticsService:
+    """
+        This class answers the requests of the HTTP service and refreshes the analyses
+        in the background. It runs in an asyncio event loop.
+    """
+    def __init__(self, reviews, results=None, refresh_interval=900, refresh_days=30,
+                 refresh_platforms=None, max_entries=256):
+        """
+        Args:
+            reviews (CodeReviewData): Crawls and filters the data, with its cache and store.
+            results (ResultCache, optional): Defaults to None. The analyses on disk.
+            refresh_interval (float, optional): Defaults to 900. Seconds between two
+                                    refreshes; 0 to never refresh.
+            refresh_days (int, optional): Defaults to 30. The number of days up to today
+                                    refreshed for every platform, and answered without
+                                    from and to.
+            refresh_platforms (list, optional): Defaults to None. The platforms refreshed;
+                                    if None, every platform of reviews.
+            max_entries (int, optional): Defaults to 256. The number of answers in memory.
+        """
+        self.reviews = reviews
+        self.results = results
+        self.refresh_interval = refresh_interval
+        self.refresh_days = refresh_days
+        self.refresh_platforms = list(refresh_platforms or reviews.platforms)
+        self.max_entries = max_entries
+        self.answers = OrderedDict()
+        # The analyses running, by (platform, start_date, end_date).
+        self.running = {}
+        self.locks = {}
+        self.counts = {"requests": 0, "memory_hits": 0, "coalesced": 0, "analyses": 0,
+                       "refreshes": 0, "errors": 0}
+        self.started = time.time()
+
+    def default_range(self):
+        """
+        Summary: This function returns the time period refreshed in the background:
+                    the last refresh_days days up to and including today.
+        """
+        today = date.today()
+        return ((today - timedelta(days=self.refresh_days)).isoformat(),
+                (today + timedelta(days=1)).isoformat())
+
+    async def metrics(self, platform, start_date, end_date):
+        """
+        Summary: This function returns the JSON answer of an analysis, from memory if
+                    possible.
+        Returns:
+            body (bytes)
+        Raises:
+            ServiceError: If the analysis failed.
+        """
+        key = (platform, start_date, end_date)
+        answer = self.answers.get(key)
+        if answer is not None:
+            self.counts["memory_hits"] += 1
+            self.answers.move_to_end(key)
+            if answer.stale():
+                self.analyze(key, refresh=True)
+            return answer.body
+        return await asyncio.shield(self.analyze(key))
+
+    def analyze(self, key, refresh=False):
+        """
+        Summary: This function starts the analysis of a time period, or returns the one
+                    already running for the same time period.
+        Args:
+            key (tuple): (platform, start_date, end_date).
+            refresh (bool, optional): Defaults to False. If True, the result cache is not
+                                    read, so new reviews are crawled.
+        Returns:
+            task (asyncio.Task): Its result is the JSON answer.
+        """
+        task = self.running.get(key)
+        if task is not None:
+            self.counts["coalesced"] += 1
+            return task
+        task = asyncio.ensure_future(self.run_analysis(key, refresh))
+        self.running[key] = task
+
+        def done(task):
+            del self.running[key]
+            # Reading the exception also stops asyncio from logging the failed refreshes
+            # that nobody waits for.
+            if not task.cancelled() and task.exception() is not None:
+                self.counts["errors"] += 1
+
+        task.add_done_callback(done)
+        return task
+
+    async def run_analysis(self, key, refresh):
+        platform, start_date, end_date = key
+        if platform not in self.locks:
+            self.locks[platform] = asyncio.Lock()
+        async with self.locks[platform]:
+            self.counts["refreshes" if refresh else "analyses"] += 1
+            loop = asyncio.get_running_loop()
+            returned_data = await loop.run_in_executor(None, self.load, platform, start_date,
+                                                       end_date, refresh)
+        body = json.dumps({"platform": platform, "from": start_date, "to": end_date,
+                           "computed_at": datetime.now().isoformat(timespec="seconds"),
+                           "reviews_opened": returned_data[0],
+                           "reviews_closed": returned_data[1],
+                           "developers_per_month": returned_data[2],
+                           "latency": returned_data[3]}).encode()
+        self.answers[key] = Answer(body, end_date, self.refresh_interval)
+        self.answers.move_to_end(key)
+        while len(self.answers) > self.max_entries:
+            self.answers.popitem(last=False)
+        return body
+
+    def load(self, platform, start_date, end_date, refresh):
+        """
+        Summary: This function runs in a thread. It reads the analysis from the result
+                    cache, or crawls and filters it.
+        Returns:
+            returned_data (list): The data returned by CodeReviewData.analyze().
+        Raises:
+            ServiceError: If there was a problem while crawling data.
+        """
+        reviews = self.reviews
+        key = None
+        if self.results is not None:
+            key = self.results.key(reviews.get_platform(platform), start_date, end_date,
+                                   graphs=reviews.graphs, developer_error=reviews.developer_error)
+            cached = None if refresh else self.results.get(key)
+            if cached is not None:
+                return cached[0]
+        returned_data = reviews.analyze(start_date, end_date, platform)
+        if returned_data == 0:
+            raise ServiceError(502, "There was an issue with the Gerrit REST API")
+        if self.results is not None:
+            self.results.put(key, returned_data, end_date)
+        return returned_data
+
+    async def refresh_loop(self):
+        """
+        Summary: This coroutine analyzes again, every refresh_interval seconds, the last
+                    refresh_days days of every platform and the time periods in memory
+                    that reach today. The first refresh warms the service up.
+        """
+        while True:
+            start_date, end_date = self.default_range()
+            keys = {(platform, start_date, end_date) for platform in self.refresh_platforms}
+            keys.update(key for key, answer in self.answers.items() if answer.stale_at is not None)
+            # The platforms are refreshed at the same time, the time periods of one
+            # platform one after the other.
+            await asyncio.gather(*(self.analyze(key, refresh=True) for key in sorted(keys)),
+                                 return_exceptions=True)
+            await asyncio.sleep(self.refresh_interval)
+
+    def status(self):
+        """
+        Summary: This function returns the state of the service.
+        """
+        return dict(self.counts, uptime_seconds=round(time.time() - self.started, 1),
+                    answers=len(self.answers), running=[list(key) for key in self.running])
+
+    async def respond(self, method, target):
+        """
+        Summary: This function answers a request.
+        Args:
+            method (str): The HTTP method.
+            target (str): The path and the query string.
+        Returns:
+            (status, body) (tuple): The HTTP status and the JSON body.
+        """
+        if method != "GET":
+            raise ServiceError(405, f"Unsupported method {method}")
+        url = urlsplit(target)
+        if url.path == "/platforms":
+            return 200, json.dumps(list(self.reviews.platforms)).encode()
+        if url.path == "/status":
+            return 200, json.dumps(self.status()).encode()
+        if url.path != "/metrics":
+            raise ServiceError(404, f"Unknown path {url.path}; use /metrics, /platforms or /status")
+
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        platform = query.get("platform")
+        if platform not in self.reviews.platforms:
+            raise ServiceError(400, f"Unknown platform {platform}; choose from "
+                                    f"{', '.join(self.reviews.platforms)}")
+        start_date, end_date = self.default_range()
+        start_date = query.get("from", start_date)
+        end_date = query.get("to", end_date)
+        for value in (start_date, end_date):
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise ServiceError(400, f"Expected a date in the format YYYY-MM-DD, got {value!r}")
+        if start_date >= end_date:
+            raise ServiceError(400, f"The start date {start_date} is not before the end date "
+                                    f"{end_date}")
+        return 200, await self.metrics(platform, start_date, end_date)
+
+    async def handle(self, reader, writer):
+        """
+        Summary: This coroutine reads one HTTP request and writes its answer. The
+                    connection is then closed.
+        """
+        try:
+            request_line = await reader.readline()
+            # The headers are not used.
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            self.counts["requests"] += 1
+            try:
+                if len(parts) != 3:
+                    raise ServiceError(400, "Malformed request line")
+                status, body = await self.respond(parts[0], parts[1])
+            except ServiceError as error:
+                status, body = error.status, json.dumps({"error": str(error)}).encode()
+            except Exception as error:
+                status, body = 500, json.dumps({"error": repr(error)}).encode()
+            writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                         f"Content-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # The client went away, or the server is stopping.
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080, ready=None):
+        """
+        Summary: This coroutine runs the HTTP server and the refreshes until it is
+                    cancelled.
+        Args:
+            host (str, optional): Defaults to "127.0.0.1".
+            port (int, optional): Defaults to 8080. 0 for any free port.
+            ready (callable, optional): Defaults to None. Called with the port once the
+                                    server listens.
+        """
+        server = await asyncio.start_server(self.handle, host, port)
+        refresher = None
+        if self.refresh_interval:
+            refresher = asyncio.ensure_future(self.refresh_loop())
+        try:
+            if ready is not None:
+                ready(server.sockets[0].getsockname()[1])
+            async with server:
+                await server.serve_forever()
+        finally:
+            if refresher is not None:
+                refresher.cancel()
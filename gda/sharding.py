@@ -0,0 +1,199 @@
+"""
+    Sharded analysis of long time periods. The time period is split into shards of
+    whole months which are crawled and filtered by a pool of processes, so that both
+    the crawling and the filtering use every core. Every process returns a partial
+    aggregate of its shard and the partial aggregates are merged at the end. With
+    developer_error, the partial aggregates carry small HyperLogLog sketches instead
+    of the sets of account ids. With a cache, only the missing days are crawled by the
+    processes and the data is then read from the rollup tables of the cache, and the
+    latency metrics from the cached reviews.
+"""
+import copy
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from multiprocessing import Event
+from .aggregate import ReviewAggregator, make_aggregator
+from .crawler import CrawlProgress, with_latency
+from .errors import CrawlCancelled, CrawlError
+from .metrics import Metrics
+
+
+# Set in every worker process by init_worker(), cancels the crawl of the shards.
+cancel_event = None
+
+
+def split_months(start_date, end_date):
+    """
+    Summary: This function splits the time period at the first day of every month.
+    Args:
+        start_date (str): The start date of the time period ("YYYY-MM-DD").
+        end_date (str): The end date of the time period ("YYYY-MM-DD").
+    Returns:
+        shards (list): A list of (start_date, end_date) tuples, newest first.
+    """
+    shards = []
+    cursor = datetime.strptime(start_date, "%Y-%m-%d")
+    while cursor.strftime("%Y-%m-%d") < end_date:
+        if cursor.month == 12:
+            next_month = cursor.replace(year=cursor.year + 1, month=1, day=1)
+        else:
+            next_month = cursor.replace(month=cursor.month + 1, day=1)
+        shards.append((cursor.strftime("%Y-%m-%d"), min(end_date, next_month.strftime("%Y-%m-%d"))))
+        cursor = next_month
+    return shards[::-1]
+
+
+def month_shards(ranges):
+    """
+    Summary: This function splits the ranges to crawl at the first day of every month
+                and puts the parts of the same month in one shard. With a cache, two
+                ranges can be in the same month, e.g. the days never crawled and the
+                days updated since the last crawl; they are crawled one after the other
+                by the same process, so two processes never append to the same file of
+                the review store, whose lock only works between threads.
+    Args:
+        ranges (list): A list of (start_date, end_date) tuples.
+    Returns:
+        shards (list): A list of shards, newest month first. A shard is a list of
+                        (start_date, end_date) tuples of the same month.
+    """
+    months = {}
+    for range_start, range_end in ranges:
+        for part in split_months(range_start, range_end):
+            months.setdefault(part[0][:7], []).append(part)
+    return [months[month] for month in sorted(months, reverse=True)]
+
+
+def init_worker(event):
+    global cancel_event
+    cancel_event = event
+
+
+def analyze_shard(reviews, platform, shard, start_date, end_date):
+    """
+    Summary: This function runs in a worker process. It crawls the ranges of the shard
+                and filters their reviews.
+    Args:
+        reviews (CodeReviewData): A copy of the CodeReviewData of the main process.
+        platform (str): The platform.
+        shard (list): (range_start, range_end) tuples of one month, see month_shards().
+        start_date (str): The start date of the whole time period.
+        end_date (str): The end date of the whole time period.
+    Returns:
+        (partial, latency, request_stats, stages) (tuple): The partial aggregate of the
+                        shard, its partial latency metrics (None with a cache or if no
+                        latency graph is needed), and the partial() of the requests
+                        recorded by the client and the stages timed in the process.
+    """
+    server = reviews.get_platform(platform)
+    aggregator = make_aggregator(reviews.developer_error)
+    latency = reviews.latency_aggregator() if reviews.cache is None else None
+    progress = CrawlProgress()
+    progress.cancel_event = cancel_event
+    metrics = reviews.metrics
+    for range_start, range_end in shard:
+        # A range crawled to refresh the cache can be longer than the time period.
+        lower = max(start_date, range_start)
+        upper = min(end_date, range_end)
+        for page in reviews.iter_crawl(range_start, range_end, server, progress):
+            if reviews.cache is not None:
+                with metrics.stage("cache", len(page)):
+                    reviews.cache.store(platform, page)
+            if reviews.store is not None:
+                with metrics.stage("store", len(page)):
+                    reviews.store.append(platform, page)
+            page = [change for change in page if lower <= change["updated"] < upper]
+            if page:
+                with metrics.stage("aggregate", len(page)):
+                    aggregator.add(page)
+                    if latency is not None:
+                        latency.add(page)
+    return (aggregator.partial(), latency.partial() if latency is not None else None,
+            reviews.client.stats.partial(), metrics.stages)
+
+
+def analyze_sharded(reviews, start_date, end_date, platform, processes=None, progress=None):
+    """
+    Summary: This function does the same as CodeReviewData.analyze(), but crawls and
+                filters the shards of the time period in processes.
+    Args:
+        reviews (CodeReviewData): The settings of the crawl: platforms, client, cache,
+                                store, decoder, concurrency and window_days are used by
+                                every process. The rate limits of the client are shared
+                                between the processes.
+        start_date (str): This date indicates the start date in the time period.
+        end_date (str): This date indicates the end date in the time period.
+        platform (str): This indicates what platform you want to crawl data for.
+        processes (int, optional): Defaults to None. The number of processes. If None,
+                                the number of CPUs.
+        progress (CrawlProgress, optional): Defaults to None. Counts the shards done as
+                                windows and can be used to cancel the analysis.
+    Returns:
+        if successful:
+            returned_data (list): [reviews_opened, reviews_closed, developers_per_month,
+                                latency], the same as returned by analyze(). If the analysis was
+                                cancelled, only the data of the shards done.
+        if NOT successful:
+            0: If there is a problem while crawling data then return 0.
+    """
+    if reviews.get_platform(platform) is None:
+        return 0
+    processes = max(1, processes or os.cpu_count() or 1)
+    if reviews.cache is not None:
+        sync_time, ranges, _ = reviews.plan_refresh(start_date, end_date, platform)
+    else:
+        ranges = [(start_date, end_date)]
+    shards = month_shards(ranges)
+    if progress is not None:
+        progress.add_windows(len(shards))
+
+    worker = copy.copy(reviews)
+    worker.client = reviews.client.share(processes)
+    # The stages are timed in the processes and added up here. The profiles of the
+    # processes are not collected.
+    worker.metrics = Metrics()
+    event = Event()
+    reducer = ReviewAggregator(reviews.developer_error)
+    latency = reviews.latency_aggregator()
+    executor = ProcessPoolExecutor(max_workers=min(processes, max(1, len(shards))),
+                                   initializer=init_worker, initargs=(event,))
+    try:
+        pending = {executor.submit(analyze_shard, worker, platform, shard, start_date, end_date)
+                   for shard in shards}
+        while pending:
+            if progress is not None and progress.cancelled:
+                raise CrawlCancelled()
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                partial, latency_partial, request_stats, stages = future.result()
+                reducer.merge(partial)
+                if latency_partial is not None:
+                    latency.merge(latency_partial)
+                reviews.client.stats.merge(request_stats)
+                reviews.metrics.merge(stages)
+                if progress is not None:
+                    progress.window_done()
+    except CrawlCancelled:
+        return with_latency(reducer.result(), latency)
+    except CrawlError:
+        return 0
+    finally:
+        event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    if reviews.cache is not None:
+        for range_start, range_end in ranges:
+            reviews.cache.mark_synced(platform, range_start, range_end, sync_time)
+        reviews.cache.set_last_sync(platform, sync_time)
+        with reviews.metrics.stage("rollup"):
+            returned_data = reviews.cache.rollup(platform, start_date, end_date)
+        if latency is not None:
+            # The latency metrics have no rollup tables, they are computed from the
+            # cached reviews of the time period.
+            server = reviews.get_platform(platform)
+            for page in reviews.cache.iter_load(platform, start_date, end_date, server.page_size):
+                with reviews.metrics.stage("aggregate", len(page)):
+                    latency.add(page)
+        return with_latency(returned_data, latency)
+    return with_latency(reducer.result(), latency)
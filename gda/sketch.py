@@ -0,0 +1,281 @@
+"""
+    Sketches of streams of values that take a fixed amount of memory, however many
+    values they have seen, and can be merged:
+
+    - HyperLogLog counts the active developers approximately. Two sketches are merged
+      by keeping the largest register of each.
+    - QuantileSketch estimates the percentiles of durations, e.g. the time to merge,
+      with a relative error. Two sketches are merged by adding their buckets.
+"""
+import hashlib
+import math
+
+# NumPy is optional. It is only used to add many account ids at once.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+MASK = (1 << 64) - 1
+# The powers 2 ** -rank of every possible register value.
+POWERS = [2.0 ** -rank for rank in range(65)]
+
+
+def precision_for(error):
+    """
+    Summary: This function returns the number of index bits (the precision) needed for
+                a relative standard error, which is 1.04 / sqrt(2 ** precision).
+    Args:
+        error (float): The relative standard error, e.g. 0.01 for 1%.
+    Returns:
+        precision (int): Between 4 and 18.
+    """
+    if not 0 < error < 1:
+        raise ValueError(f"The error must be between 0 and 1, got {error}")
+    return min(18, max(4, math.ceil(math.log2((1.04 / error) ** 2))))
+
+
+def mix(value):
+    """
+    Summary: This function hashes an account id to 64 bits (splitmix64). Strings are
+                hashed with blake2b.
+    """
+    if not isinstance(value, int):
+        return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+    z = (value + 0x9E3779B97F4A7C15) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+
+class HyperLogLog:
+    """
+        This class estimates the number of distinct values added to it. It can be used
+        instead of a set of account ids: add(), update() and len() work the same, but
+        len() is an estimate with the relative standard error given.
+    """
+    def __init__(self, error=0.01, precision=None):
+        """
+        Args:
+            error (float, optional): Defaults to 0.01. The relative standard error of the
+                                    estimate. The sketch uses 2 ** precision bytes, about
+                                    (1.04 / error) ** 2: 16 KB for 1%, 1 KB for 4%.
+            precision (int, optional): Defaults to None. The number of index bits, instead
+                                    of the error.
+        """
+        self.precision = precision if precision is not None else precision_for(error)
+        self.registers = bytearray(1 << self.precision)
+
+    @property
+    def error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, value):
+        """
+        Summary: This function adds one value, e.g. an account id.
+        """
+        hashed = mix(value)
+        bits = 64 - self.precision
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add_many(self, values):
+        """
+        Summary: This function adds an array of integer account ids at once with NumPy.
+        Args:
+            values (numpy.ndarray): The account ids.
+        """
+        if np is None:
+            for value in values:
+                self.add(int(value))
+            return
+        z = np.asarray(values, dtype=np.int64).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+        bits = 64 - self.precision
+        index = (z >> np.uint64(bits)).astype(np.intp)
+        rest = z & np.uint64((1 << bits) - 1)
+        # bit_length() of every value, in two halves so that float64 holds them exactly.
+        high = np.frexp((rest >> np.uint64(30)).astype(np.float64))[1]
+        low = np.frexp((rest & np.uint64((1 << 30) - 1)).astype(np.float64))[1]
+        bit_length = np.where(high > 0, high + 30, low)
+        rank = (bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(np.frombuffer(self.registers, dtype=np.uint8), index, rank)
+
+    def update(self, values):
+        """
+        Summary: This function adds several values, or merges another sketch.
+        Args:
+            values (iterable or HyperLogLog): The values, or a sketch with the same precision.
+        """
+        if isinstance(values, HyperLogLog):
+            self.merge(values)
+        else:
+            for value in values:
+                self.add(value)
+
+    def merge(self, other):
+        """
+        Summary: This function merges another sketch into this one. The result is the
+                    same as if all the values had been added to this sketch.
+        Args:
+            other (HyperLogLog): A sketch with the same precision.
+        Raises:
+            ValueError: If the precisions are not the same.
+        """
+        if other.precision != self.precision:
+            raise ValueError(f"Can not merge sketches of precision {other.precision} "
+                             f"and {self.precision}")
+        if np is not None:
+            np.maximum(np.frombuffer(self.registers, dtype=np.uint8),
+                       np.frombuffer(other.registers, dtype=np.uint8),
+                       out=np.frombuffer(self.registers, dtype=np.uint8))
+        else:
+            self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """
+        Summary: This function estimates the number of distinct values added.
+        Returns:
+            estimate (float)
+        """
+        size = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(size, 0.7213 / (1 + 1.079 / size))
+        estimate = alpha * size * size / sum(POWERS[rank] for rank in self.registers)
+        zeros = self.registers.count(0)
+        # Linear counting is more accurate for small numbers of values.
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+        return estimate
+
+    def __len__(self):
+        return round(self.count())
+
+
+class QuantileSketch:
+    """
+        This class estimates the quantiles of positive values, e.g. the seconds a review
+        took to be merged, with a relative error (the DDSketch algorithm). Every value
+        is counted in a bucket whose bounds grow geometrically, so the memory depends on
+        the range of the values and not on their number: about 1000 buckets cover one
+        second to ten years at 1%. Beyond max_buckets, the lowest buckets are collapsed.
+    """
+    def __init__(self, accuracy=0.01, max_buckets=2048):
+        """
+        Args:
+            accuracy (float, optional): Defaults to 0.01. The relative error of the
+                                    quantiles returned.
+            max_buckets (int, optional): Defaults to 2048. The largest number of buckets.
+        """
+        if not 0 < accuracy < 1:
+            raise ValueError(f"The accuracy must be between 0 and 1, got {accuracy}")
+        self.accuracy = accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        # The values smaller than one, e.g. a review merged in the second it was created.
+        self.zeros = 0
+        self.total = 0
+
+    def add(self, value):
+        """
+        Summary: This function adds one value.
+        """
+        self.total += 1
+        if value < 1:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self.collapse()
+
+    def add_many(self, values):
+        """
+        Summary: This function adds an array of values at once with NumPy.
+        Args:
+            values (numpy.ndarray): The values.
+        """
+        if np is None:
+            for value in values:
+                self.add(float(value))
+            return
+        values = np.asarray(values, dtype=np.float64)
+        small = values < 1
+        self.zeros += int(small.sum())
+        self.total += len(values)
+        indices, counts = np.unique(np.ceil(np.log(values[~small]) / self.log_gamma),
+                                    return_counts=True)
+        buckets = self.buckets
+        for index, count in zip(indices.astype(np.int64).tolist(), counts.tolist()):
+            buckets[index] = buckets.get(index, 0) + count
+        if len(buckets) > self.max_buckets:
+            self.collapse()
+
+    def collapse(self):
+        """
+        Summary: This function merges the lowest buckets until there are max_buckets.
+                    The low quantiles then lose their accuracy first.
+        """
+        indices = sorted(self.buckets)
+        extra = len(indices) - self.max_buckets
+        if extra > 0:
+            target = indices[extra]
+            self.buckets[target] += sum(self.buckets.pop(index) for index in indices[:extra])
+
+    def merge(self, other):
+        """
+        Summary: This function merges another sketch into this one. The result is the
+                    same as if all the values had been added to this sketch.
+        Args:
+            other (QuantileSketch): A sketch with the same accuracy.
+        Raises:
+            ValueError: If the accuracies are not the same.
+        """
+        if other.accuracy != self.accuracy:
+            raise ValueError(f"Can not merge sketches of accuracy {other.accuracy} "
+                             f"and {self.accuracy}")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.total += other.total
+        if len(self.buckets) > self.max_buckets:
+            self.collapse()
+
+    def value(self, index):
+        """
+        Summary: This function returns the value that represents a bucket, the one with
+                    the same relative distance to both bounds.
+        """
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        Summary: This function estimates a quantile of the values added.
+        Args:
+            q (float): Between 0 and 1, e.g. 0.5 for the median.
+        Returns:
+            if values were added:
+                value (float)
+            if NOT:
+                None
+        """
+        if not self.total:
+            return None
+        rank = q * (self.total - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return self.value(index)
+        return self.value(max(self.buckets))
+
+    def __len__(self):
+        return self.total
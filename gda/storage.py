@@ -0,0 +1,177 @@
+"""
+    Storage of the crawled reviews on disk.
+
+    The reviews are appended, page by page while they are crawled, to newline-delimited
+    JSON files (one review per line) partitioned by platform and month:
+
+        Storage/reviews/<platform>/<YYYY-MM>.ndjson.gz
+
+    Nothing is ever rewritten while crawling, so earlier crawls are kept. A review that
+    was crawled several times is stored several times; the readers only return its
+    latest version and compact() removes the older ones.
+"""
+import gzip
+import json
+import os
+import threading
+from .decoding import project
+# orjson is optional. Without it the json module is used.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(change):
+    """
+    Summary: This function encodes a review as one line of compact JSON.
+    Returns:
+        line (bytes)
+    """
+    if orjson is not None:
+        return orjson.dumps(change) + b"\n"
+    return json.dumps(change, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def loads(line):
+    """
+    Summary: This function decodes a line written by dumps().
+    Returns:
+        change (dict)
+    """
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+class ReviewStore:
+    """
+        This class appends crawled reviews to partitioned NDJSON files and reads them
+        back lazily, only from the months needed.
+    """
+    # Appends from different threads must not interleave inside a file.
+    lock = threading.Lock()
+
+    def __init__(self, root="Storage/reviews", compress=True):
+        """
+        Args:
+            root (str, optional): Defaults to "Storage/reviews". The directory of the files.
+            compress (bool, optional): Defaults to True. If True the files are compressed
+                                    with gzip (".ndjson.gz"), otherwise they are plain
+                                    text (".ndjson").
+        """
+        self.root = root
+        self.compress = compress
+        self.extension = ".ndjson.gz" if compress else ".ndjson"
+
+    def path(self, platform, month):
+        return os.path.join(self.root, platform, month + self.extension)
+
+    def open(self, path, mode):
+        if self.compress:
+            return gzip.open(path, mode, compresslevel=6)
+        return open(path, mode)
+
+    def append(self, platform, changes):
+        """
+        Summary: This function appends a page of reviews to the files of their months.
+        Args:
+            platform (str): The platform the reviews were crawled from.
+            changes (list): A list of reviews returned by the Gerrit REST API.
+        """
+        partitions = {}
+        for change in changes:
+            partitions.setdefault(change["updated"][:7], []).append(dumps(change))
+        os.makedirs(os.path.join(self.root, platform), exist_ok=True)
+        with self.lock:
+            for month, lines in partitions.items():
+                # Every append adds one gzip member; gzip reads them back as one file.
+                with self.open(self.path(platform, month), "ab") as outfile:
+                    outfile.write(b"".join(lines))
+
+    def months(self, platform):
+        """
+        Summary: This function lists the months stored for a platform.
+        Args:
+            platform (str): The platform.
+        Returns:
+            months (list): The months ("YYYY-MM"), oldest first.
+        """
+        directory = os.path.join(self.root, platform)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len(self.extension)] for name in os.listdir(directory)
+                      if name.endswith(self.extension))
+
+    def iter_lines(self, platform, months):
+        for month in months:
+            with self.open(self.path(platform, month), "rb") as infile:
+                for line in infile:
+                    if line.strip():
+                        yield loads(line)
+
+    def iter_pages(self, platform, start_date=None, end_date=None, fields=None, page_size=500):
+        """
+        Summary: This generator reads the stored reviews updated in the time period,
+                    lazily and only from the files of the months in the time period.
+                    Every review is yielded once, in its latest version.
+        Args:
+            platform (str): The platform of the reviews.
+            start_date (str, optional): Defaults to None. The start date ("YYYY-MM-DD").
+            end_date (str, optional): Defaults to None. The end date ("YYYY-MM-DD"),
+                                    not included.
+            fields (dict, optional): Defaults to None. If given, only these fields of the
+                                    reviews are returned (see decoding.AGGREGATION_FIELDS).
+            page_size (int, optional): Defaults to 500. The number of reviews per page.
+        Yields:
+            page (list): A list of reviews.
+        """
+        months = [month for month in self.months(platform)
+                  if (start_date is None or month >= start_date[:7])
+                  and (end_date is None or month <= end_date[:7])]
+
+        def in_period(change):
+            return ((start_date is None or change["updated"] >= start_date)
+                    and (end_date is None or change["updated"] < end_date))
+
+        # First pass: the latest version of every review, only the ids are kept.
+        latest = {}
+        for change in self.iter_lines(platform, months):
+            if change["updated"] > latest.get(change["id"], ""):
+                latest[change["id"]] = change["updated"]
+
+        # Second pass: yield the latest versions.
+        page = []
+        for change in self.iter_lines(platform, months):
+            if latest.get(change["id"]) != change["updated"] or not in_period(change):
+                continue
+            # The same version can have been crawled twice.
+            del latest[change["id"]]
+            page.append(project(change, fields) if fields is not None else change)
+            if len(page) >= page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def compact(self, platform):
+        """
+        Summary: This function rewrites the files of a platform so that every review is
+                    stored once, in its latest version.
+        Args:
+            platform (str): The platform.
+        """
+        with self.lock:
+            months = self.months(platform)
+            latest = {}
+            for change in self.iter_lines(platform, months):
+                if change["updated"] > latest.get(change["id"], ""):
+                    latest[change["id"]] = change["updated"]
+            for month in months:
+                path = self.path(platform, month)
+                with self.open(path + ".tmp", "wb") as outfile:
+                    for change in self.iter_lines(platform, [month]):
+                        if latest.get(change["id"]) == change["updated"]:
+                            del latest[change["id"]]
+                            outfile.write(dumps(change))
+                os.replace(path + ".tmp", path)
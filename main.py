@@ -4,145 +4,22 @@
     This Python/Tkinter application crawls code review data through Gerrit REST API 
     and then uses matplotlib library to visualize the data.
 """
-import json
-import os
+import queue
+import threading
+import time
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk
 from PIL import Image, ImageTk
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import requests
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from gda.cache import ChangeCache
+from gda.charts import CHARTS, chart_args, chart_names, create_chart, export_in_background
+from gda.crawler import GRAPHS, CodeReviewData, CrawlProgress
+from gda.platforms import load_platforms
+from gda.results import ResultCache
+from gda.storage import ReviewStore
 
 
-
-class CodeReviewData:
-    """
-        This class contains two functions, get_reviews() which crawls code review
-        data through Gerrit REST API and filter_data() which filters the data crawled
-        by get_reviews.
-    """
-    def get_reviews(self, start_date, end_date, platform):
-        """
-        Summary: This function crawls code review data from Gerrit REST API 
-                    and then stores all the data into a list. The function 
-                    then returns the list.
-        Args:
-            start_date (str): This date indicates the start date in the time period.
-            end_date (str): This date indicates the end date in the time period.
-            platform (str): This indicates what platform you want to crawl data for.
-        Returns:
-            if everything is successful:
-                changes (list): The list contains all the reviews crawled from the Gerrit REST API
-            if NOT successful:
-                0: If there is a problem while crawling data then return 0.
-        """
-        changes = []
-        start = 0
-        url = ""
-        max_review = 0
-        if platform == "Android":
-            android_url = f"https://android-review.googlesource.com/changes/?q=after:{start_date} before:{end_date}"
-            url = android_url
-            max_review = 2000
-        elif platform == "OpenStack":
-            openstack_url = f"https://review.opendev.org/changes/?q=after:{start_date} before:{end_date}"
-            url = openstack_url
-            max_review = 500
-        elif platform == "Chromium":
-            chromium_url = f"https://chromium-review.googlesource.com/changes/?q=after:{start_date} before:{end_date}"
-            url = chromium_url
-            max_review = 500
-        else:
-            return 0
-        # Crawl more than max allowed review.
-        while True:
-            response = requests.get(url + f"&S={start}")
-            if response.status_code != 200:
-                return 0
-            response_data = json.loads(response.content.decode('utf-8')[4:])
-            changes.extend(response_data)
-            if len(response_data) < max_review:
-                break
-            start += max_review
-
-        # Check the last review. If the last review does not match the start_date
-        # then call the get_reviews function.
-        # The start_date is the same, but the end_date is not las_review.
-        last_review = changes[-1]["updated"][:10]
-        if last_review > start_date:
-            new_changes = self.get_reviews(start_date, last_review, platform)
-            changes = changes + new_changes
-        return changes
-
-
-    def filter_data(self, reviews_lst):
-        """
-        Summary: This function gets the list of reviews returned from the get_reviews
-                function as an arg, filter the data, and
-                then retuns a list that contains these filtered data.
-        Args:
-            reviews_lst (list): The list contains all code review data retuned from
-            the get_review function.
-        Returns:
-            if successful:
-                returned_data (type:list): When the data is filtered, it is stored in a
-                                            list called returned_data.
-            if NOT successful:
-                0: when getting data from the get_reviews function, a problem might occur.
-        """
-        if reviews_lst == 0:
-            return 0
-
-        returned_data = []
-        reviews_opened = {}
-        reviews_closed = {}
-        active_developers = {}
-        developers_per_month = {}
-        for change in reviews_lst:
-            ################ Reviews opened and closed #################
-            timestamp_str = change['updated'][:10]
-            if timestamp_str not in reviews_opened:
-                reviews_opened[timestamp_str] = 0
-            if timestamp_str not in reviews_closed:
-                reviews_closed[timestamp_str] = 0
-            if change.get('status') == 'NEW':
-                reviews_opened[timestamp_str] += 1
-            elif change.get('status') in ['MERGED', 'ABANDONED']:
-                reviews_closed[timestamp_str] += 1
-
-            ############### Active developer per month ################
-            timestamp_str = change['updated'][:19]
-            timestamp = int(datetime.fromisoformat(timestamp_str).timestamp())
-            date_ = datetime.fromtimestamp(timestamp)
-            year_month = date_.strftime('%Y-%m')
-            if 'owner' in change and '_account_id' in change['owner'] and change['owner']['_account_id'] is not None:
-                if year_month not in active_developers:
-                    active_developers[year_month] = set()
-                active_developers[year_month].add(change["owner"]["_account_id"])
-            if 'submitter' in change and '_account_id' in change['submitter'] and change['submitter']['_account_id'] is not None:
-                if year_month not in active_developers:
-                    active_developers[year_month] = set()
-                active_developers[year_month].add(change["submitter"]["_account_id"])
-
-        for year_month, developers in active_developers.items():
-            developers_per_month[year_month] = len(developers)
-
-        returned_data.append(reviews_opened)
-        returned_data.append(reviews_closed)
-        returned_data.append(developers_per_month)
-
-        # Store the file in a JSON file valled data.json
-        if os.path.exists("Storage/data.json") is True:
-            os.remove("Storage/data.json")
-            with open("Storage/data.json", "w") as outfile:
-                json.dump(reviews_lst, outfile, indent=4)
-        else:
-            with open("Storage/data.json", "w") as outfile:
-                json.dump(reviews_lst, outfile, indent=4)
-
-        return returned_data
-
 class GerritDataAnalyzer:
     # test is used for unit testing
     def __init__(self, test=False):
@@ -160,6 +37,22 @@ class GerritDataAnalyzer:
         self.root.geometry("1498x943")
         self.root.minsize(1498, 943)
 
+        # The graphs or error message shown, and the progress of the running analysis
+        self.results = []
+        # The tabs of the graphs, the arguments of create_chart() for every tab, the
+        # figures and canvases created so far and the tabs drawn with the latest data
+        self.tabs = []
+        self.charts = []
+        self.figures = []
+        self.canvases = []
+        self.drawn = set()
+        self.progress = None
+        self.status_frame = None
+        # The Gerrit servers that can be crawled, from platforms.json
+        self.platforms = load_platforms()
+        # The analyses done before, shown again without crawling or exporting
+        self.result_cache = ResultCache()
+
         img1 = ImageTk.PhotoImage(Image.open("open.png"))
         #print(type(img1))
         self.home_page(img1)
@@ -283,17 +176,13 @@ class GerritDataAnalyzer:
         radio_frame.place(relx=0.5, rely=0.35, anchor="center")
 
         var = tk.StringVar()
-        # OpenStack is chosen by default
-        var.set("OpenStack")
-        android_radio_button = ttk.Radiobutton(radio_frame, text="Android", variable=var,
-                                               value="Android", takefocus=False)
-        android_radio_button.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
-        openStack_radio_button = ttk.Radiobutton(radio_frame, text="OpenStack", variable=var,
-                                                 value="OpenStack", takefocus=False)
-        openStack_radio_button.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
-        chromium_radio_button = ttk.Radiobutton(radio_frame, text="Chromium ", variable=var,
-                                                value="Chromium", takefocus=False)
-        chromium_radio_button.grid(row=2, column=0, padx=10, pady=10, sticky="nsew")
+        # OpenStack is chosen by default, or the first platform of the config file
+        var.set("OpenStack" if "OpenStack" in self.platforms else next(iter(self.platforms)))
+        # One radiobutton per platform of the platforms config file
+        for row, name in enumerate(self.platforms):
+            radio_button = ttk.Radiobutton(radio_frame, text=name, variable=var,
+                                           value=name, takefocus=False)
+            radio_button.grid(row=row, column=0, padx=10, pady=10, sticky="nsew")
 
         # Creating two entries for the time perid; start and end
         # From date
@@ -322,10 +211,9 @@ class GerritDataAnalyzer:
                 This funciton is where everything starts. The funciton extracts/gets the dates
                 entered in the entries and the platfrom chosen by the user.
                 The function then uses the validate_date_format to validate the dates. When
-                the date is validated then function then calls the get_reviews function to crawl
-                data. The function then passes the data from the get_reviews() to the filter_data()
-                function in order to filter the data.The filtered data then is passed to the
-                visulize_data() function.
+                the date is validated then function then calls start_analysis() which crawls
+                and filters the data in the background and passes it to the visulize_data()
+                function.
             """
             from_date = entry1.get()
             to_date = entry2.get()
@@ -334,36 +222,10 @@ class GerritDataAnalyzer:
             valid_date = self.validate_date_format(from_date, to_date)
             destroy_window()
             if valid_date is False:
-                notebook = ttk.Notebook(self.root, width=1400, height=800)
-                notebook.place(relx=0.5, rely=0.5, anchor="center")
-                error_msg = ttk.Frame(notebook)
-                notebook.add(error_msg, text="InputError!")
-                the_message = ttk.Label(self.root,
-                                    text="InputError: Either Wrong Date format(Expected format: 'YYYY-MM-DD')\nor start date is after the end date. Please try again! ",
-                                    font=("TkDefaultFont", 20, "bold"),
-                                    foreground="grey")
-
-                the_message.place(relx=0.5, rely=0.5, anchor="center")
-
+                self.show_error("InputError!",
+                                "InputError: Either Wrong Date format(Expected format: 'YYYY-MM-DD')\nor start date is after the end date. Please try again! ")
             else:
-                reviews = CodeReviewData()
-                reviews_lst = reviews.get_reviews(from_date, to_date, platfrom)
-                returned_data = reviews.filter_data(reviews_lst)
-                if returned_data == 0:
-                    notebook = ttk.Notebook(self.root, width=1400, height=800)
-                    notebook.place(relx=0.5, rely=0.5, anchor="center")
-                    error_msg = ttk.Frame(notebook)
-                    notebook.add(error_msg, text="Error!")
-                    the_message = ttk.Label(self.root,
-                                            text="APIError: There was an issue with the API. Please try again!",
-                                            font=("TkDefaultFont", 20, "bold"),
-                                            foreground="grey")
-                    the_message.place(relx=0.5, rely=0.5, anchor="center")
-                else:
-                    reviews_opened = returned_data[0]
-                    reviews_closed = returned_data[1]
-                    developer_per_month = returned_data[-1]
-                    self.visulize_data(reviews_opened, reviews_closed, developer_per_month)
+                self.start_analysis(from_date, to_date, platfrom)
 
         # Creating a submit button. When the submit is pressed the get_user_data_from_gui is called.
         submit_button = ttk.Button(f1, text="Submit", command=get_user_data_from_gui)
@@ -399,7 +261,197 @@ class GerritDataAnalyzer:
                 bg='#262626',
                 activebackground='#262626').place(x=450,y=10)
 
-    def visulize_data(self, rev_opened, rev_closed, dev_per_month):
+    def start_analysis(self, from_date, to_date, platform):
+        """
+        Summary:
+            This function starts crawling and filtering the data in a background thread, so
+            the window stays responsive. A status bar at the bottom of the window shows the
+            progress and has a button for cancelling the crawl. The thread sends the progress,
+            the data filtered so far and the final data through a queue which is read by
+            poll_analysis() every 100 ms.
+        Args:
+            from_date (str): The start date of the time period.
+            to_date (str): The end date of the time period.
+            platform (str): The platform chosen by the user.
+        """
+        # Only one analysis at a time, a new Submit cancels the running one.
+        if self.progress is not None:
+            self.progress.cancel()
+        self.clear_results()
+        if self.status_frame is not None:
+            self.status_frame.destroy()
+
+        messages = queue.Queue()
+        progress = CrawlProgress(
+            callback=lambda progress: messages.put(("progress", self.progress_text(progress))))
+        self.progress = progress
+
+        self.status_frame = ttk.Frame(self.root)
+        self.status_frame.place(relx=0.5, rely=0.975, anchor="center")
+        self.status_label = ttk.Label(self.status_frame, text=f"Crawling {platform} data...",
+                                      font=("TkDefaultFont", 11))
+        self.status_label.pack(side=tk.LEFT, padx=10)
+
+        # The same analysis has been done recently: its data is shown and its PDF files
+        # are copied from the result cache.
+        key = self.result_cache.key(self.platforms[platform], from_date, to_date,
+                                    graphs=GRAPHS, developer_error=None)
+        cached = self.result_cache.get(key)
+        if cached is not None and \
+                self.result_cache.copy_charts(cached[1], "Storage/PDF_Files", chart_names()):
+            self.progress = None
+            self.status_label.config(text="Shown from the result cache.")
+            self.visulize_data(*cached[0], export=False)
+            return
+        progress.result_key = (key, to_date)
+
+        self.cancel_button = ttk.Button(self.status_frame, text="Cancel", command=progress.cancel)
+        self.cancel_button.pack(side=tk.LEFT)
+
+        thread = threading.Thread(target=self.run_analysis,
+                                  args=(from_date, to_date, platform, progress, messages),
+                                  daemon=True)
+        thread.start()
+        self.root.after(100, self.poll_analysis, progress, messages)
+
+    def run_analysis(self, from_date, to_date, platform, progress, messages):
+        """
+        Summary:
+            This function runs in the background thread. It must not use any widget; everything
+            that has to be shown is put into the messages queue instead, also an unexpected
+            error (e.g. a locked cache or a full disk), so the window does not wait forever.
+        Args:
+            from_date (str): The start date of the time period.
+            to_date (str): The end date of the time period.
+            platform (str): The platform chosen by the user.
+            progress (CrawlProgress): The progress of this analysis.
+            messages (queue.Queue): The queue read by poll_analysis().
+        """
+        try:
+            reviews = CodeReviewData(cache=ChangeCache("Storage/cache.db"),
+                                     store=ReviewStore("Storage/reviews"), platforms=self.platforms)
+            returned_data = reviews.analyze(from_date, to_date, platform, progress=progress,
+                                            partial=lambda data: messages.put(("partial", data)))
+        except Exception as error:
+            messages.put(("error", f"{type(error).__name__}: {error}"))
+            return
+        messages.put(("done", returned_data))
+
+    def poll_analysis(self, progress, messages):
+        """
+        Summary:
+            This function reads the messages sent by the background thread and updates the
+            window. Only the latest progress and the latest partial data are shown.
+        Args:
+            progress (CrawlProgress): The progress of the analysis being polled.
+            messages (queue.Queue): The queue filled by run_analysis().
+        """
+        # A newer analysis has been started, this one has been cancelled.
+        if progress is not self.progress:
+            return
+        latest = {}
+        while True:
+            try:
+                kind, value = messages.get_nowait()
+            except queue.Empty:
+                break
+            latest[kind] = value
+
+        if "error" in latest:
+            self.progress = None
+            self.status_frame.destroy()
+            self.show_error("Error!", latest["error"] + "\nPlease try again!")
+            return
+        if "done" in latest:
+            self.finish_analysis(progress, latest["done"])
+            return
+        if "progress" in latest:
+            self.status_label.config(text=latest["progress"])
+        if "partial" in latest and latest["partial"][0]:
+            self.visulize_data(*latest["partial"], export=False)
+        self.root.after(100, self.poll_analysis, progress, messages)
+
+    def finish_analysis(self, progress, returned_data):
+        """
+        Summary:
+            This function shows the result of an analysis when the background thread is done.
+        Args:
+            progress (CrawlProgress): The progress of the analysis.
+            returned_data (list or int): The data returned by CodeReviewData.analyze().
+        """
+        self.progress = None
+        self.cancel_button.destroy()
+        if returned_data == 0:
+            self.status_frame.destroy()
+            self.show_error("Error!", "APIError: There was an issue with the API. Please try again!")
+        elif not returned_data[0]:
+            self.status_frame.destroy()
+            self.show_error("No reviews!", "There are no reviews in this time period.")
+        elif progress.cancelled:
+            self.status_label.config(text="Cancelled. Showing the reviews crawled so far: "
+                                          + self.progress_text(progress))
+            self.visulize_data(*returned_data, export=False)
+        else:
+            elapsed = time.monotonic() - progress.started
+            self.status_label.config(text=f"Done in {elapsed:.0f} s. "
+                                          + self.progress_text(progress))
+            key, to_date = progress.result_key
+            self.visulize_data(*returned_data, exported=lambda paths: self.result_cache.put(
+                key, returned_data, to_date, paths))
+
+    def progress_text(self, progress):
+        """
+        Summary:
+            This function describes the progress of a crawl.
+        Args:
+            progress (CrawlProgress): The progress of the crawl.
+        Returns:
+            text (str)
+        """
+        eta = progress.eta()
+        if eta is None:
+            eta_text = "estimating..."
+        else:
+            eta_text = f"{int(eta) // 60}m {int(eta) % 60:02d}s"
+        return (f"Pages fetched: {progress.pages}   Changes: {progress.changes}   "
+                f"Windows: {progress.windows_done}/{progress.windows_total}   ETA: {eta_text}")
+
+    def show_error(self, tab_text, message):
+        """
+        Summary:
+            This function shows an error message in the middle of the application.
+        Args:
+            tab_text (str): The text of the tab of the message.
+            message (str): The error message.
+        """
+        self.clear_results()
+        notebook = ttk.Notebook(self.root, width=1400, height=800)
+        notebook.place(relx=0.5, rely=0.5, anchor="center")
+        error_msg = ttk.Frame(notebook)
+        notebook.add(error_msg, text=tab_text)
+        the_message = ttk.Label(self.root,
+                                text=message,
+                                font=("TkDefaultFont", 20, "bold"),
+                                foreground="grey")
+        the_message.place(relx=0.5, rely=0.5, anchor="center")
+        self.results = [notebook, the_message]
+
+    def clear_results(self):
+        """
+        Summary:
+            This function removes the graphs or the error message shown before.
+        """
+        for widget in self.results:
+            widget.destroy()
+        self.results = []
+        self.tabs = []
+        self.charts = []
+        self.figures = []
+        self.canvases = []
+        self.drawn = set()
+
+    def visulize_data(self, rev_opened, rev_closed, dev_per_month, latency=None, export=True,
+                      exported=None):
         """
             Summary:
                 This function validates the format of the dates being entered buy the user.
@@ -415,155 +467,79 @@ class GerritDataAnalyzer:
                 dev_per_month (dict): The dev_per_month (developers per month) is a ditionary that
                                     contains months ("YYYY-MM") as keys and the number of active
                                     developers in the month as values.
+                latency (dict, optional): Defaults to None. The time to merge, turnaround,
+                                    backlog per day and reviews merged per project
+                                    (see gda.latency), shown in their own tabs.
+                export (bool, optional): Defaults to True. If False, the graphs are only shown
+                                    and not exported, which is used for partial results.
+                exported (callable, optional): Defaults to None. Called by the exporting
+                                    thread with the paths of the PDF files.
         """
 
-        # The Gerrit REST API start fom the end date and then makes it way to the start date.
-        # This is why we have to reverse the keys and values in these dictionaries.
-        rev_opened_timestamp = list(rev_opened.keys())
-        rev_opened_number = list(rev_opened.values())
-        rev_opened_timestamp.reverse()
-        rev_opened_number.reverse()
-
-        rev_closed_timestamp = list(rev_closed.keys())
-        rev_closed_number = list(rev_closed.values())
-        rev_closed_timestamp.reverse()
-        rev_closed_number.reverse()
-
-        month = list(dev_per_month.keys())
-        devs = list(dev_per_month.values())
-        month.reverse()
-        devs.reverse()
-
-        # Creating a notebook in the middle of the application that can be used to plece the
-        # graphs on
-        notebook = ttk.Notebook(self.root, width=1400, height=800)
-        notebook.place(relx=0.5, rely=0.5, anchor="center")
-
-        # Creating a tab for each of the graph
-        reviews_opened_and_closed_tab = ttk.Frame(notebook)
-        active_developers_tab = ttk.Frame(notebook)
-        reviews_opened = ttk.Frame(notebook)
-        reviews_closed = ttk.Frame(notebook)
-
-        # Adding these tabs on the notebook
-        notebook.add(reviews_opened_and_closed_tab, text="Review Opened and Closed: ")
-        notebook.add(reviews_opened, text="Reviews Opened: ")
-        notebook.add(reviews_closed, text="Reviews Closed: ")
-        notebook.add(active_developers_tab, text="Active developers per month: ")
-
-        # Creating the graph using the create_graph() function and then exporting each graph as
-        # a PDF file in the Storage/PDF_Files directory
-        fig = self.create_graph(rev_opened_timestamp, rev_opened_number,
-                                reviews_opened_and_closed_tab, "blue",
-                                "Review Closed AND Opened", rev_closed_timestamp,
-                                rev_closed_number)
-        fig.savefig("Storage/PDF_Files/Rev_opened_closed.pdf")
-        fig = self.create_graph(rev_opened_timestamp, rev_opened_number, reviews_opened,
-                                "blue", "Review Opened")
-        fig.savefig("Storage/PDF_Files/Rev_opened.pdf")
-        fig = self.create_graph(rev_closed_timestamp, rev_closed_number, reviews_closed,
-                                "red", "Reviews Closed")
-        fig.savefig("Storage/PDF_Files/Rev_closed.pdf")
-        fig = self.create_graph(month, devs, active_developers_tab,"blue",
-                                "Developers per month", pie_chart=1)
-        fig.savefig("Storage/PDF_Files/Dev_per_month.pdf")
-
-    def create_graph(self, x1_labels, y1_labels, tab, color, title, x2_labels=None, y2_labels=None, pie_chart=None):
+        # Only the tab shown is drawn; the other tabs are drawn when they are selected.
+        # The notebook already shown, e.g. of partial results, is kept with its tab.
+        if not self.tabs:
+            # Creating a notebook in the middle of the application that can be used to plece
+            # the graphs on, and an empty tab for each of the graph.
+            self.clear_results()
+            notebook = ttk.Notebook(self.root, width=1400, height=800)
+            notebook.place(relx=0.5, rely=0.5, anchor="center")
+            self.results = [notebook]
+            for text, _ in CHARTS:
+                tab = ttk.Frame(notebook)
+                notebook.add(tab, text=text)
+                self.tabs.append(tab)
+            self.figures = [None] * len(CHARTS)
+            self.canvases = [None] * len(CHARTS)
+            notebook.bind("<<NotebookTabChanged>>",
+                          lambda event: self.draw_tab(event.widget.index("current")))
+        self.charts = chart_args(rev_opened, rev_closed, dev_per_month, latency)
+        self.drawn = set()
+        self.draw_tab(self.results[0].index("current"))
+
+        # The graphs are exported as PDF files in the Storage/PDF_Files directory by a
+        # background thread, which draws its own figures with the Agg backend.
+        if export:
+            export_in_background(rev_opened, rev_closed, dev_per_month, latency, done=exported)
+
+    def draw_tab(self, index):
         """
         Summary:
-            This function creates a graph. The type of the graph is base on the args sent
-            to the function. The function creates two different types of graphs, plot or
-            pie char. If the pie_chart is None, then it means the the function is ceating
-            just a plot. But if the pie_chart is not None then, the function creates a pie chart. 
-            The function can also create a plot for two types of data
-            (reviews opened + reviews closed in the same plot). This only works if x2_labels and y2_labels is
-            not None.
+            This function draws the graph of a tab with the latest data, if it is not drawn
+            yet. The figure and the canvas of the tab are created the first time, and are
+            then drawn again on new data.
         Args:
-            x1_labels (list): This is a list that contains all the labels for the x axis. These labels
-                        are dates in this format: "YYYY-MM-DD"
-            y1_labels (list): This is a list than contains all the labels for the y axis. These labels
-                        are integers. 
-            tab (ttk.Frame): This indicates in which tab should the graph be placed. 
-            color (str): This indicates the color of the plot
-            title (str): This indictes the title of the graph
-            x2_labels (list, optional): Defaults to None. This is a list that contains all the labels
-                                for the x axis. These labels are dates in this format: "YYYY-MM-DD"
-            y2_labels (list, optional): Defaults to None. This is a list than contains all the labels for 
-                                the y axis. These labels are integers. 
-            pie_chart (int, optional): Defaults to None. This is use to indicate if the graphs
-                                        is a plot or a pie chart.
-        Returns:
-            plt.Figure
+            index (int): The index of the tab in CHARTS.
         """
-        plt.style.use('classic')
-        fig = plt.Figure(figsize=(12, 6), dpi=100)
-        ax = fig.add_subplot(111)
-        ax.set_title(title)
-
-        ############### Two graphs in one plot ##################
-        if x2_labels is not None and y2_labels is not None and pie_chart is None:
-            ax.plot(x1_labels, y1_labels, color="blue", label="Reviews Opened")
-            ax.plot(x2_labels, y2_labels, color="red", label="Reviews Closed")
-            ax.legend()
-            ax.grid(which='major', axis='both', linestyle='--', linewidth=1,
-                    color='#cfcfcf', alpha=0.2)
-            ax.axvline(x=0, color='black', linestyle='-', linewidth=1)
-            ax.set_facecolor('#a6a4a4')
-
-        ################ Developers per month #####################
-        elif pie_chart is not None:
-            total_active_developers = sum(y1_labels)
-            percentages = [(developers / total_active_developers) * 100 for developers in y1_labels]
-            labels = x1_labels
-            sizes = percentages
-
-            colors = [(0.12156862745098039, 0.4666666666666667, 0.7058823529411765, 1.0),
-                      (0.6823529411764706, 0.7803921568627451, 0.9098039215686274, 1.0),
-                      (1.0, 0.7333333333333333, 0.47058823529411764, 1.0),
-                      (0.596078431372549, 0.8745098039215686, 0.5411764705882353, 1.0),
-                      (1.0, 0.596078431372549, 0.5882352941176471, 1.0),
-                      (0.7725490196078432, 0.6901960784313725, 0.8352941176470589, 1.0),
-                      (0.5490196078431373, 0.33725490196078434, 0.29411764705882354, 1.0),
-                      (0.8901960784313725, 0.4666666666666667, 0.7607843137254902, 1.0),
-                      (0.4980392156862745, 0.4980392156862745, 0.4980392156862745, 1.0),
-                      (0.7372549019607844, 0.7411764705882353, 0.13333333333333333, 1.0),
-                      (0.09019607843137255, 0.7450980392156863, 0.8117647058823529, 1.0),
-                      (0.6196078431372549, 0.8549019607843137, 0.8980392156862745, 1.0)]
-
-            _, _, autopcts = ax.pie(sizes, colors=colors, labels=labels, startangle=90,
-                            autopct=lambda pct: f'{pct:.1f}% ({int(round(pct*total_active_developers/100))})',
-                            textprops={'fontsize': 14})
-
-            ax.set_title(f'Total Active Developers: {total_active_developers}', fontsize=20)
-            for autopct in autopcts:
-                autopct.set_fontsize(14)
-
-        ################## Just one graph #########################
+        if index in self.drawn or index >= len(self.charts):
+            return
+        self.drawn.add(index)
+        if self.canvases[index] is None:
+            self.figures[index] = create_chart(self.charts[index])
+            self.canvases[index] = self.show_graph(self.figures[index], self.tabs[index])
         else:
-            max_y_value = max(y1_labels)
-            if max_y_value < 50:
-                ax.set_ylim(0, max_y_value + 1)
-            ax.plot(x1_labels, y1_labels, color=color, label="Reviews Opened")
-            ax.grid(which='major', axis='both', linestyle='--', linewidth=1,
-                    color='#cfcfcf', alpha=0.2)
-            ax.axvline(x=0, color='black', linestyle='-', linewidth=1)
-            ax.set_facecolor('#a6a4a4')
-
-        ################# Rotate the x labels ####################
-        if len(x1_labels) > 12:
-            fig.subplots_adjust(left=0.05, right=0.95, bottom=0.15, top=0.9, wspace=0.4, hspace=0.4)
-            ax.tick_params(axis='x', labelrotation=90)
-        else:
-            fig.subplots_adjust(left=0.05, right=0.95, bottom=0.1, top=0.9, wspace=0.4, hspace=0.4)
-
-        ax.spines['top'].set_color('#7d7a7a')
-        ax.spines['right'].set_color('#7d7a7a')
+            create_chart(self.charts[index], fig=self.figures[index])
+            # The zoom history of the toolbar belongs to the axes drawn before.
+            self.canvases[index].toolbar.update()
+            self.canvases[index].draw_idle()
 
+    def show_graph(self, fig, tab):
+        """
+        Summary:
+            This function places a graph created by create_chart() on a tab, with the
+            matplotlib toolbar to zoom and pan the graph.
+        Args:
+            fig (matplotlib.figure.Figure): The graph.
+            tab (ttk.Frame): This indicates in which tab should the graph be placed.
+        Returns:
+            canvas (FigureCanvasTkAgg): The canvas of the graph.
+        """
         canvas = FigureCanvasTkAgg(fig, master=tab)
+        toolbar = NavigationToolbar2Tk(canvas, tab, pack_toolbar=False)
+        toolbar.pack(side=tk.BOTTOM, fill=tk.X)
         canvas.draw()
         canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-
-        return fig
+        return canvas
 
 
 if __name__ == "__main__":